@@ -0,0 +1,173 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, time as dtime, timedelta
+
+# Thứ theo datetime.weekday(): 0 = thứ hai ... 6 = chủ nhật
+DAY_NAMES = ("T2", "T3", "T4", "T5", "T6", "T7", "CN")
+ALL_DAYS = frozenset(range(7))
+DAY_PRESETS = {
+    "daily": ALL_DAYS,
+    "weekdays": frozenset(range(5)),
+    "weekends": frozenset({5, 6}),
+}
+_DAY_ALIASES = {
+    **{name: i for i, name in enumerate(("mon", "tue", "wed", "thu", "fri", "sat", "sun"))},
+    **{name.lower(): i for i, name in enumerate(DAY_NAMES)},
+}
+
+
+def parse_time(text):
+    """'8:30' / '08:30' -> minute of day, ValueError if invalid"""
+    hour, minute = map(int, text.split(":"))
+    if not (0 <= hour <= 23 and 0 <= minute <= 59):
+        raise ValueError(f"invalid time: {text}")
+    return hour * 60 + minute
+
+
+def parse_days(text):
+    """Cron-like day spec -> frozenset of weekdays, ValueError if invalid.
+
+    Accepts daily, weekdays, weekends, or a comma list of days and ranges
+    in English or Vietnamese: mon,wed,fri / mon-fri / t2-t6,cn.
+    """
+    text = text.strip().lower()
+    if text in DAY_PRESETS:
+        return DAY_PRESETS[text]
+    days = set()
+    for part in text.split(","):
+        first, _, last = part.strip().partition("-")
+        if first not in _DAY_ALIASES or (last and last not in _DAY_ALIASES):
+            raise ValueError(f"invalid days: {text}")
+        start = _DAY_ALIASES[first]
+        end = _DAY_ALIASES[last] if last else start
+        # mon-fri, hoặc vòng qua cuối tuần: sat-mon
+        days.update((start + i) % 7 for i in range((end - start) % 7 + 1))
+    return frozenset(days)
+
+
+def format_days(days):
+    """'hằng ngày', 'T2–T6', 'T2, T4, T6'..."""
+    if days == ALL_DAYS:
+        return "hằng ngày"
+    ordered = sorted(days)
+    runs = []
+    for day in ordered:
+        if runs and runs[-1][1] == day - 1:
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return ", ".join(
+        DAY_NAMES[a] if a == b else f"{DAY_NAMES[a]}–{DAY_NAMES[b]}"
+        for a, b in runs
+    )
+
+
+class ScheduleEntry:
+    """One auto-collect time of a group and the job_queue job firing it"""
+    __slots__ = ("minute", "days", "job")
+
+    def __init__(self, minute, days=ALL_DAYS):
+        self.minute = minute
+        self.days = frozenset(days)
+        self.job = None  # Tạo lại sau mỗi lần khởi động, không lưu
+
+    @property
+    def time_str(self):
+        return f"{self.minute // 60:02d}:{self.minute % 60:02d}"
+
+    @property
+    def label(self):
+        if self.days == ALL_DAYS:
+            return self.time_str
+        return f"{self.time_str} ({format_days(self.days)})"
+
+    def job_days(self):
+        """Days for JobQueue.run_daily, which counts 0 = sunday"""
+        return tuple(sorted((day + 1) % 7 for day in self.days))
+
+    def to_dict(self):
+        return {"time": self.time_str, "days": sorted(self.days)}
+
+
+class AutoSchedule:
+    """Auto-collect times of one group, keyed by time of day.
+
+    Besides the entries, a sorted list of minutes is kept per weekday, so
+    the next fire time is a bisect in today's list, then the first entry
+    of the following days: O(log n) whatever the number of times.
+    """
+
+    def __init__(self):
+        self._entries = {}  # minute -> ScheduleEntry
+        self._by_day = [[] for _ in range(7)]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        """Entries by time of day"""
+        return iter([self._entries[m] for m in sorted(self._entries)])
+
+    def __contains__(self, minute):
+        return minute in self._entries
+
+    def add(self, minute, days=ALL_DAYS):
+        """Add a time; raises ValueError if it already exists or has no day"""
+        if minute in self._entries:
+            raise ValueError(f"{minute} already scheduled")
+        if not days:
+            raise ValueError("no day selected")
+        entry = ScheduleEntry(minute, days)
+        self._entries[minute] = entry
+        for day in entry.days:
+            insort(self._by_day[day], minute)
+        return entry
+
+    def remove(self, minute):
+        """Remove a time, returns its entry (job still to cancel) or None"""
+        entry = self._entries.pop(minute, None)
+        if entry is not None:
+            for day in entry.days:
+                minutes = self._by_day[day]
+                del minutes[bisect_left(minutes, minute)]
+        return entry
+
+    def clear(self):
+        """Remove every time, returns the removed entries"""
+        entries = list(self._entries.values())
+        self._entries.clear()
+        for minutes in self._by_day:
+            minutes.clear()
+        return entries
+
+    def next_run(self, now, tz):
+        """Next fire time strictly after now, as an aware datetime in tz, or None"""
+        if not self._entries:
+            return None
+        local = now.astimezone(tz)
+        current = local.hour * 60 + local.minute
+        # Hôm nay sau giờ hiện tại, rồi tới 7 ngày sau (cùng thứ, sớm hơn giờ hiện tại)
+        for offset in range(8):
+            minutes = self._by_day[(local.weekday() + offset) % 7]
+            i = bisect_right(minutes, current) if offset == 0 else 0
+            if i < len(minutes):
+                naive = datetime.combine(
+                    local.date() + timedelta(days=offset),
+                    dtime(minutes[i] // 60, minutes[i] % 60)
+                )
+                # pytz cần localize, zoneinfo thì gắn tzinfo là đủ
+                localize = getattr(tz, "localize", None)
+                return localize(naive) if localize else naive.replace(tzinfo=tz)
+        return None
+
+    def to_list(self):
+        return [entry.to_dict() for entry in self]
+
+    def from_list(self, items):
+        """Load saved entries; plain 'HH:MM' strings are the old daily format"""
+        self.clear()
+        for item in items:
+            if isinstance(item, str):
+                item = {"time": item}
+            minute = parse_time(item["time"])
+            if minute not in self._entries:
+                self.add(minute, item.get("days", ALL_DAYS))
@@ -0,0 +1,121 @@
+"""Sequential vs concurrent update processing, against the fake Bot API.
+
+Every group gets /startcollect, then more users post links than MAX_USERS
+allows, so each collect is finished by the MAX_USERS-th link while the
+rest are still arriving. Updates go through the Application's own
+update_queue, so PTB's concurrent_updates setting is what is measured.
+After each run the invariants are checked: no group above MAX_USERS and
+exactly one result message per group.
+
+    python benchmarks/bench_concurrency.py --groups 50 --latency 0.05
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import subprocess
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from telegram import Update
+
+from fake_bot_api import FakeBotAPI
+from load_test import make_update
+
+
+async def run(args):
+    os.chdir(tempfile.mkdtemp(prefix="bot-concurrency-"))
+    os.environ.setdefault("BOT_TOKEN", "1:fake")
+    import bot
+    from outbox import Outbox
+
+    for handler in bot.log_listener.handlers:
+        handler.setLevel("WARNING")
+    bot.MAX_USERS = args.max_users
+    # Chỉ đo xử lý update, không đo giới hạn tốc độ của Telegram
+    bot.outbox = Outbox(global_rate=10**6, chat_rate=10**6, group_rate_per_minute=10**8)
+
+    api = FakeBotAPI(latency=args.latency, seed=1)
+    await api.start()
+    bot.history.open()
+    app = bot.build_application(os.environ["BOT_TOKEN"], api.base_url, concurrent_updates=args.concurrent)
+    await app.initialize()
+    await app.start()
+
+    groups = [-1001000000000 - i for i in range(args.groups)]
+    ids = iter(range(1, 10**9))
+    phases = {
+        "startcollect": [make_update(next(ids), g, bot.OWNER_ID, "/startcollect", True) for g in groups],
+        "links": [
+            make_update(next(ids), g, i * 1000 + u + 1, f"https://x.com/u{u}/status/{i * 1000 + u + 1}")
+            for u in range(args.users)
+            for i, g in enumerate(groups)
+        ],
+    }
+
+    timings = {}
+    for name, raws in phases.items():
+        started = time.perf_counter()
+        for raw in raws:
+            await app.update_queue.put(Update.de_json(raw, app.bot))
+        await app.update_queue.join()
+        timings[name] = time.perf_counter() - started
+
+    await bot.outbox.drain(10)
+    results = {}
+    for _, method, params in api.log:
+        if method == "sendMessage" and "KẾT QUẢ" in params.get("text", ""):
+            results[params["chat_id"]] = results.get(params["chat_id"], 0) + 1
+    report = {
+        "concurrent_updates": args.concurrent,
+        "seconds": {name: round(t, 3) for name, t in timings.items()},
+        "updates_per_second": round(len(phases["links"]) / timings["links"], 1),
+        "max_users_seen": max(len(s.submissions.users) for s in bot.sessions),
+        "groups_over_limit": sum(len(s.submissions.users) > args.max_users for s in bot.sessions),
+        "groups_without_result": args.groups - len(results),
+        "duplicate_results": sum(count - 1 for count in results.values()),
+    }
+
+    await app.stop()
+    await app.shutdown()
+    await bot.state_store.close()
+    await asyncio.to_thread(bot.history.close)
+    await api.stop()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, default=50)
+    parser.add_argument("--users", type=int, default=30, help="users posting per group")
+    parser.add_argument("--max-users", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake Bot API latency, seconds")
+    parser.add_argument("--concurrent", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.concurrent is not None:
+        print(json.dumps(asyncio.run(run(args))))
+        return
+
+    # Mỗi chế độ chạy ở process riêng: bot.py giữ state ở cấp module
+    for concurrent in (1, 64):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), *sys.argv[1:], "--concurrent", str(concurrent)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        report = json.loads(output.strip().splitlines()[-1])
+        seconds = report["seconds"]
+        print(
+            f"concurrent_updates={concurrent:<3} startcollect={seconds['startcollect']:7.2f}s "
+            f"links={seconds['links']:7.2f}s ({report['updates_per_second']:,.0f}/s)  "
+            f"max users={report['max_users_seen']}  over limit={report['groups_over_limit']}  "
+            f"missing results={report['groups_without_result']}  duplicate results={report['duplicate_results']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
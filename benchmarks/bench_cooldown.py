@@ -0,0 +1,83 @@
+"""Memory/speed of the cooldown tracker vs the old defaultdict(datetime).
+
+Simulates 1,000,000 distinct users, each posting once, spread evenly over
+SIM_SECONDS of fake time.
+
+    python benchmarks/bench_cooldown.py
+"""
+import os
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cooldown import CooldownTracker
+
+USERS = 1_000_000
+SIM_SECONDS = 600
+COOLDOWN = 30
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def bench_tracker():
+    clock = FakeClock()
+    tracemalloc.start()
+    tracker = CooldownTracker(COOLDOWN, clock=clock)
+    step = SIM_SECONDS / USERS
+    started = time.perf_counter()
+    for user_id in range(USERS):
+        clock.now = user_id * step
+        if not tracker.remaining(user_id):
+            tracker.hit(user_id)
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "entries": len(tracker),
+        "current_mb": current / 2**20,
+        "peak_mb": peak / 2**20,
+        "ns_per_op": elapsed / USERS * 1e9,
+    }
+
+
+def bench_defaultdict():
+    tracemalloc.start()
+    user_cooldown = defaultdict(lambda: datetime.min)
+    now = datetime.now()
+    started = time.perf_counter()
+    for user_id in range(USERS):
+        if (now - user_cooldown[user_id]).total_seconds() >= COOLDOWN:
+            user_cooldown[user_id] = now
+    elapsed = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "entries": len(user_cooldown),
+        "current_mb": current / 2**20,
+        "peak_mb": peak / 2**20,
+        "ns_per_op": elapsed / USERS * 1e9,
+    }
+
+
+def main():
+    print(f"{USERS:,} distinct users over {SIM_SECONDS}s, cooldown {COOLDOWN}s")
+    for name, bench in (("CooldownTracker", bench_tracker), ("defaultdict(datetime)", bench_defaultdict)):
+        r = bench()
+        print(
+            f"{name:<22} entries={r['entries']:>9,}  current={r['current_mb']:7.1f} MB  "
+            f"peak={r['peak_mb']:7.1f} MB  {r['ns_per_op']:6.0f} ns/op"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Tweet enrichment against the fake lookup endpoint.
+
+Submits status ids the way collect_link does, with some resubmitted, and
+reports how long submit() takes (it must never wait), lookup throughput,
+and whether every id was fetched exactly once over a few pooled
+connections with the right deleted/author result.
+
+    python benchmarks/bench_enrichment.py --ids 2000 --workers 8 --latency 0.05
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from enrichment import TweetEnricher
+from fake_tweet_api import FakeTweetAPI
+
+
+async def run(args):
+    api = FakeTweetAPI(latency=args.latency, deleted_rate=args.deleted_rate, seed=args.seed)
+    await api.start()
+    enricher = TweetEnricher(api.url_template, workers=args.workers, queue_size=args.queue_size)
+    await enricher.start()
+
+    rng = random.Random(args.seed)
+    ids = [10**18 + i for i in range(args.ids)]
+    submissions = ids + rng.sample(ids, int(len(ids) * args.resubmit_rate))
+    rng.shuffle(submissions)
+
+    started = time.perf_counter()
+    submit_seconds = 0.0
+    for i, status_id in enumerate(submissions):
+        t = time.perf_counter()
+        enricher.submit(status_id, api.author(status_id))
+        submit_seconds += time.perf_counter() - t
+        if i % 100 == 99:
+            await asyncio.sleep(0)  # như các update khác chen vào giữa
+    await enricher.join()
+    elapsed = time.perf_counter() - started
+
+    # Gửi lại sau khi đã tra xong: phải lấy từ cache
+    for status_id in ids[:100]:
+        enricher.submit(status_id)
+    await enricher.join()
+
+    looked_up = [enricher.get(status_id) for status_id in ids]
+    wrong = sum(
+        info is None or info.deleted != api.is_deleted(info.status_id)
+        or (not info.deleted and info.author != api.author(info.status_id))
+        for info in looked_up
+    )
+    print(f"{len(submissions):,} submissions ({len(ids):,} distinct) in {elapsed:.2f}s – "
+          f"{len(ids) / elapsed:,.0f} lookups/s with {args.workers} workers")
+    print(f"submit(): {submit_seconds / len(submissions) * 1e6:.1f} µs average")
+    print(f"endpoint lookups: {sum(api.lookups.values()):,}, ids fetched more than once: "
+          f"{sum(n > 1 for n in api.lookups.values())}, connections: {api.connections}")
+    print(f"results: {dict(enricher.results)}, wrong or missing: {wrong}")
+
+    await enricher.stop()
+    await api.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ids", type=int, default=2000)
+    parser.add_argument("--resubmit-rate", type=float, default=0.3, help="share of ids submitted twice")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--queue-size", type=int, default=10**6)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake endpoint latency, seconds")
+    parser.add_argument("--deleted-rate", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
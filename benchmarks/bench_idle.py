@@ -0,0 +1,112 @@
+"""Cost of ordinary chat messages: catch-all collect_link handler vs filtered.
+
+Before, every text message matched MessageHandler(TEXT & ~COMMAND) and ran
+collect_link, which looked the group up, checked the cooldown and ran the
+tweet regex before returning. Now the handler's filter rejects messages
+from groups without an active collect, and messages without a url /
+text_link entity to x.com or twitter.com, before any callback runs.
+Each message kind is pushed through Application.process_update, the
+dispatch path every update takes; "no handler" is the same Application
+without collect_link, the floor left by the command handlers.
+
+    python benchmarks/bench_idle.py --messages 20000
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from telegram import Update
+from telegram.ext import MessageHandler, filters
+
+from fake_bot_api import FakeBotAPI
+from load_test import make_update
+
+CHATTER = "hôm nay ai rảnh không, tối nay đi ăn lẩu nhé mọi người 😄"
+
+
+def legacy_handler(bot):
+    """The handler as it was registered, with collect_link's early returns"""
+    from tweets import parse_tweet_link
+
+    async def collect_link(update, context):
+        session = bot.sessions.get(update.effective_chat.id)
+        if session is None or not session.active:
+            return
+        if bot.user_cooldown.remaining(update.effective_user.id) > 0:
+            return
+        if parse_tweet_link(update.message.text or "") is None:
+            return
+    return MessageHandler(filters.TEXT & ~filters.COMMAND, bot.timed(collect_link))
+
+
+async def measure(app, updates, rounds):
+    for update in updates[:100]:
+        await app.process_update(update)  # làm nóng
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for update in updates:
+            await app.process_update(update)
+    return (time.perf_counter() - started) / (rounds * len(updates))
+
+
+async def run(args):
+    os.chdir(tempfile.mkdtemp(prefix="bot-idle-"))
+    os.environ.setdefault("BOT_TOKEN", "1:fake")
+    import bot
+
+    for handler in bot.log_listener.handlers:
+        handler.setLevel("WARNING")
+    idle_group, active_group = -1001000000001, -1001000000002
+    bot.sessions.get_or_create(idle_group)
+    bot.sessions.get_or_create(active_group).start_collect()
+
+    def updates(chat_id, text):
+        return [
+            Update.de_json(make_update(i + 1, chat_id, 10**6 + i, text), None)
+            for i in range(args.messages)
+        ]
+    kinds = {
+        "idle group, chatter": updates(idle_group, CHATTER),
+        "idle group, other link": updates(idle_group, f"{CHATTER} https://youtu.be/dQw4w9WgXcQ"),
+        "active collect, chatter": updates(active_group, CHATTER),
+        "active collect, other link": updates(active_group, f"{CHATTER} https://youtu.be/dQw4w9WgXcQ"),
+    }
+
+    api = FakeBotAPI()
+    await api.start()
+    filtered = bot.build_application(os.environ["BOT_TOKEN"], api.base_url)
+    legacy = bot.build_application(os.environ["BOT_TOKEN"], api.base_url)
+    legacy.handlers[0][-1] = legacy_handler(bot)
+    floor = bot.build_application(os.environ["BOT_TOKEN"], api.base_url)
+    floor.handlers[0].pop()
+    for app in (filtered, legacy, floor):
+        await app.initialize()
+    print(f"{'message':<28}{'catch-all':>12}{'filtered':>12}{'no handler':>12}")
+    for kind, batch in kinds.items():
+        before = await measure(legacy, batch, args.rounds)
+        after = await measure(filtered, batch, args.rounds)
+        base = await measure(floor, batch, args.rounds)
+        print(f"{kind:<28}{before * 1e6:9.2f} µs{after * 1e6:9.2f} µs{base * 1e6:9.2f} µs   "
+              f"collect_link cost {(before - base) * 1e6:.2f} -> {(after - base) * 1e6:.2f} µs")
+    for app in (filtered, legacy, floor):
+        await app.shutdown()
+    bot.sessions.get(active_group).stop_collect()
+    await bot.state_store.close()
+    await api.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=3)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Seen-tweets filter: memory, lookup cost and measured false-positive rate.
+
+Adds links spread over the filter's window of days (or over --spread
+days, to overflow the per-day capacity), then checks that every one of
+them is found and how many never-seen ids are reported as seen. Also
+times writing and reloading the file.
+
+    python benchmarks/bench_seen_tweets.py --links 1000000 --days 7 --capacity 200000
+    python benchmarks/bench_seen_tweets.py --links 300000 --spread 1   # 6x capacity in one day
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bloom import SeenTweets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--links", type=int, default=350_000, help="links added over the window")
+    parser.add_argument("--groups", type=int, default=50)
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--spread", type=int, help="days the links are spread over (default: --days)")
+    parser.add_argument("--capacity", type=int, default=50_000, help="links per day the filter is sized for")
+    parser.add_argument("--error-rate", type=float, default=0.001)
+    parser.add_argument("--probes", type=int, default=200_000, help="never-seen ids looked up")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    now = [1_700_000_000.0]
+    seen = SeenTweets(args.days, args.capacity, args.error_rate, clock=lambda: now[0])
+    groups = [-1001000000000 - i for i in range(args.groups)]
+    links = [(rng.choice(groups), rng.getrandbits(62)) for _ in range(args.links)]
+
+    started = time.perf_counter()
+    per_day = len(links) // (args.spread or args.days) + 1
+    for i, (group, status_id) in enumerate(links):
+        if i and i % per_day == 0:
+            now[0] += 86400
+        seen.add(group, status_id)
+    add_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    missing = sum(key not in seen for key in links)
+    hit_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    false_positives = sum((rng.choice(groups), rng.getrandbits(62)) in seen for _ in range(args.probes))
+    miss_seconds = time.perf_counter() - started
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bot-seen-"), "seen_tweets.bloom")
+    started = time.perf_counter()
+    seen.save(path)
+    save_seconds = time.perf_counter() - started
+    reloaded = SeenTweets(args.days, args.capacity, args.error_rate, clock=lambda: now[0])
+    started = time.perf_counter()
+    reloaded.load(path)
+    load_seconds = time.perf_counter() - started
+    reload_missing = sum(key not in reloaded for key in links[:10_000])
+
+    print(f"{len(links):,} links over {args.spread or args.days} days in {seen.nbytes / 1024:,.0f} KB, "
+          f"{seen.filters} filters ({seen.nbytes * 8 / len(links):.1f} bits/link)")
+    print(f"add {add_seconds / len(links) * 1e6:.2f} µs, lookup hit {hit_seconds / len(links) * 1e6:.2f} µs, "
+          f"lookup miss {miss_seconds / args.probes * 1e6:.2f} µs")
+    print(f"false negatives: {missing}, false positives: {false_positives}/{args.probes:,} "
+          f"({false_positives / args.probes:.4%}, target {args.error_rate:.4%})")
+    print(f"file {os.path.getsize(path) / 1024:,.0f} KB: save {save_seconds * 1e3:.1f} ms, "
+          f"load {load_seconds * 1e3:.1f} ms, missing after reload: {reload_missing}")
+
+    # Qua hết cửa sổ: mọi link cũ phải bị quên
+    now[0] += 86400 * args.days
+    print(f"after {args.days} more days: {sum(key in seen for key in links[:10_000])} of 10,000 still seen")
+
+
+if __name__ == "__main__":
+    main()
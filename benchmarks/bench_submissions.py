@@ -0,0 +1,118 @@
+"""Memory of an active collect at 100k links: formatted strings vs Submissions.
+
+The old state kept every link as a formatted "n. name\\nurl" string, a
+separate set of user ids and of status ids, and the result packer kept an
+escaped copy of every entry. Submissions keeps ids and timestamps in typed
+arrays, names and handles interned, and the packer only keeps page breaks.
+Both are filled with the same links and measured with tracemalloc; the
+result pages they produce are compared.
+
+    python benchmarks/bench_submissions.py --links 100000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from render import SummaryPacker, escape_markdown
+from tweets import TweetLink
+from submissions import Submissions
+
+HEADER_RESERVE = 120
+CONTINUATION = "*TIẾP THEO\\.\\.\\.*\n\n"
+
+
+class LegacyPacker(SummaryPacker):
+    """The packer as it was: keeps every escaped entry until pages() joins them"""
+
+    def clear(self):
+        super().clear()
+        self._entries = []
+
+    def add(self, entry):
+        super().add(entry)
+        self._entries.append(entry)
+
+    def pages(self, header, entries=None):
+        return super().pages(header, self._entries)
+
+
+def make_links(n, seed):
+    rng = random.Random(seed)
+    links = []
+    for i in range(n):
+        user_id = rng.randrange(10**9, 8 * 10**9)
+        username = f"user_{rng.randrange(10**6)}" if rng.random() < 0.8 else None
+        first_name = f"Người dùng {i}"
+        handle = username.lower() if username and rng.random() < 0.7 else f"author{rng.randrange(5000)}"
+        links.append((user_id, rng.randrange(10**18, 2 * 10**18), username, first_name, handle))
+    return links
+
+
+def fill_legacy(links):
+    users, status_ids, entries = set(), set(), []
+    packer = LegacyPacker(HEADER_RESERVE, CONTINUATION)
+    for user_id, status_id, username, first_name, handle in links:
+        users.add(user_id)
+        status_ids.add(status_id)
+        name = f"@{username}" if username else first_name
+        tweet = TweetLink(sys.intern(handle.lower()), status_id)  # như parse_tweet_link
+        entry = f"{len(entries) + 1}. {name}\n{tweet.url}"
+        entries.append(entry)
+        packer.add(escape_markdown(entry))
+    return (users, status_ids, entries, packer), lambda: packer.pages("H")
+
+
+def fill_submissions(links):
+    submissions = Submissions()
+    packer = SummaryPacker(HEADER_RESERVE, CONTINUATION)
+    now = time.time()
+    for user_id, status_id, username, first_name, handle in links:
+        name = f"@{username}" if username else first_name
+        tweet = TweetLink(sys.intern(handle.lower()), status_id)
+        submissions.add(user_id, tweet.status_id, name, tweet.handle, now)
+        packer.add(escape_markdown(submissions[-1].entry))
+    return (submissions, packer), lambda: packer.pages(
+        "H", [escape_markdown(entry) for entry in submissions.entries()]
+    )
+
+
+def measure(fill, links):
+    tracemalloc.start()
+    started = time.perf_counter()
+    kept, render = fill(links)
+    add_seconds = time.perf_counter() - started
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    started = time.perf_counter()
+    pages = render()
+    render_seconds = time.perf_counter() - started
+    return kept, size, add_seconds, render_seconds, pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--links", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    links = make_links(args.links, args.seed)
+    results = {}
+    for name, fill in (("strings", fill_legacy), ("submissions", fill_submissions)):
+        kept, size, add_seconds, render_seconds, pages = measure(fill, links)
+        results[name] = (size, pages)
+        print(f"{name:<12} {size / 2**20:7.2f} MiB ({size / len(links):6.1f} B/link)  "
+              f"add {add_seconds / len(links) * 1e6:5.2f} µs/link  "
+              f"result pages {render_seconds * 1e3:7.1f} ms ({len(pages)} pages)")
+        del kept
+    old, new = results["strings"][0], results["submissions"][0]
+    print(f"saved {(old - new) / 2**20:.2f} MiB ({1 - new / old:.0%}), "
+          f"same result pages: {results['strings'][1] == results['submissions'][1]}")
+
+
+if __name__ == "__main__":
+    main()
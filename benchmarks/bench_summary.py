@@ -0,0 +1,78 @@
+"""Summary rendering for a 10k-link collect: old finish-time chunking vs SummaryPacker.
+
+The old code joined every link at the end and sent fixed chunks of 10 links,
+which can exceed Telegram's 4096-character limit. The packer does its work
+as links arrive, so finish_collect only has to join the entries at the
+page breaks it already found and prepend the header.
+
+    python benchmarks/bench_summary.py
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from render import SummaryPacker, telegram_length, TELEGRAM_MAX_LENGTH
+
+LINKS = 10_000
+HEADER = "📊 **KẾT QUẢ COLLECT**\n\n👥 Số người tham gia: {0}\n📎 Số link thu được: {0}\n\n**DANH SÁCH LINK:**\n\n"
+CONTINUATION = "**TIẾP THEO...**\n\n"
+
+
+def make_entries(n, long_tail=False):
+    rng = random.Random(42)
+    entries = []
+    for i in range(n):
+        name = f"@user_{rng.randrange(10**6)}"
+        text = f"https://x.com/{name[1:]}/status/{rng.randrange(10**18, 10**19)}"
+        if long_tail and rng.random() < 0.5:
+            # Tin nhắn cũ lưu nguyên văn, có thể rất dài
+            text += " " + "lorem ipsum " * rng.randrange(20, 60)
+        entries.append(f"{i + 1}. {name}\n{text}")
+    return entries
+
+
+def legacy_pages(entries):
+    header = HEADER.format(len(entries))
+    links_text = "\n\n".join(entries)
+    if len(links_text) <= 4000:
+        return [header + links_text]
+    chunks = [entries[i:i + 10] for i in range(0, len(entries), 10)]
+    return [header + "\n\n".join(chunks[0])] + [CONTINUATION + "\n\n".join(c) for c in chunks[1:]]
+
+
+def packer_pages(entries):
+    packer = SummaryPacker(telegram_length(HEADER.format(10**9)), CONTINUATION)
+    started = time.perf_counter()
+    for entry in entries:
+        packer.add(entry)
+    added = time.perf_counter() - started
+    started = time.perf_counter()
+    pages = packer.pages(HEADER.format(len(entries)), entries)
+    return pages, added, time.perf_counter() - started
+
+
+def report(name, pages, finish_seconds, add_seconds=None):
+    too_long = sum(telegram_length(p) > TELEGRAM_MAX_LENGTH for p in pages)
+    fill = sum(telegram_length(p) for p in pages) / (len(pages) * TELEGRAM_MAX_LENGTH)
+    line = f"{name:<8} pages={len(pages):>5}  over_limit={too_long:>4}  fill={fill:6.1%}  finish={finish_seconds * 1e3:7.2f} ms"
+    if add_seconds is not None:
+        line += f"  add={add_seconds / LINKS * 1e6:5.2f} us/link"
+    print(line)
+
+
+def main():
+    for long_tail in (False, True):
+        entries = make_entries(LINKS, long_tail)
+        print(f"{LINKS:,} links, {'half long raw messages' if long_tail else 'canonical URLs'}")
+        started = time.perf_counter()
+        pages = legacy_pages(entries)
+        report("legacy", pages, time.perf_counter() - started)
+        pages, added, finish = packer_pages(entries)
+        report("packer", pages, finish, added)
+
+
+if __name__ == "__main__":
+    main()
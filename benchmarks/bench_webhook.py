@@ -0,0 +1,172 @@
+"""Webhook mode driven end to end by a local HTTP client.
+
+Starts a WebhookServer on a free local port, sends it one request per
+status it can answer (200, 400, 403, 404, 405, 413) and checks the status
+line and that only the accepted update reached update_queue. Then posts
+--updates updates over --connections keep-alive connections and reports
+the rate. Exits with status 1 if any check fails.
+
+    python benchmarks/bench_webhook.py --updates 5000 --connections 4
+"""
+import os
+import sys
+import json
+import time
+import types
+import asyncio
+import logging
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from webhook import WebhookServer, SECRET_HEADER, MAX_BODY
+from load_test import make_update
+
+PATH = "/telegram"
+SECRET = "s3cret"
+
+
+def request(method, path, body=b"", secret=SECRET, length=None, keep_alive=True):
+    headers = [f"{method} {path} HTTP/1.1", "Host: 127.0.0.1"]
+    if secret is not None:
+        headers.append(f"{SECRET_HEADER}: {secret}")
+    headers.append(f"Content-Length: {len(body) if length is None else length}")
+    headers.append("Content-Type: application/json")
+    if not keep_alive:
+        headers.append("Connection: close")
+    return ("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body
+
+
+async def read_response(reader):
+    """(status, connection header) of one response, or (None, None) if the server closed"""
+    status_line = await reader.readline()
+    if not status_line:
+        return None, None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length:
+        await reader.readexactly(length)
+    return int(status_line.split()[1]), headers.get("connection")
+
+
+async def send_one(port, data):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write(data)
+        await writer.drain()
+        return (await read_response(reader))[0]
+    finally:
+        writer.close()
+
+
+async def check_statuses(server, queue):
+    update = json.dumps(make_update(1, -1001, 42, "https://x.com/a/status/1")).encode()
+    cases = [
+        ("valid update", request("POST", PATH, update), 200),
+        ("query string on path", request("POST", PATH + "?x=1", update), 200),
+        ("wrong secret", request("POST", PATH, update, secret="nope"), 403),
+        ("no secret", request("POST", PATH, update, secret=None), 403),
+        ("wrong path", request("POST", "/other", update), 404),
+        ("GET", request("GET", PATH), 405),
+        ("body too large", request("POST", PATH, length=MAX_BODY + 1), 413),
+        ("non-numeric Content-Length", request("POST", PATH, update, length="abc"), 400),
+        ("negative Content-Length", request("POST", PATH, update, length=-1), 400),
+        ("invalid JSON", request("POST", PATH, b"{not json"), 400),
+        ("not an update", request("POST", PATH, b"[1, 2]"), 400),
+        ("bad request line", b"GARBAGE\r\n\r\n", 400),
+    ]
+    failed = 0
+    for name, data, expected in cases:
+        status = await send_one(server.port, data)
+        ok = status == expected
+        failed += not ok
+        print(f"{name:<30} expected {expected}, got {status}{'' if ok else '  FAIL'}")
+    accepted = queue.qsize()
+    if accepted != 2:
+        failed += 1
+        print(f"updates queued: expected 2, got {accepted}  FAIL")
+    while not queue.empty():
+        queue.get_nowait()
+    return failed
+
+
+async def check_keep_alive(server):
+    """A rejected request whose body was not read must not leave the connection open"""
+    update = json.dumps(make_update(1, -1001, 42, "hi")).encode()
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+    try:
+        writer.write(request("POST", PATH, update) + request("POST", "/other", update))
+        await writer.drain()
+        first = await read_response(reader)
+        second = await read_response(reader)
+    finally:
+        writer.close()
+    ok = first == (200, "keep-alive") and second == (404, "close")
+    print(f"{'keep-alive, then 404 with body':<30} got {first}, {second}{'' if ok else '  FAIL'}")
+    return not ok
+
+
+async def post_updates(port, count, offset):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        for i in range(count):
+            body = json.dumps(make_update(offset + i, -1001, 42 + i, f"tin {i}")).encode()
+            writer.write(request("POST", PATH, body))
+            await writer.drain()
+            status, _ = await read_response(reader)
+            if status != 200:
+                return i
+        return count
+    finally:
+        writer.close()
+
+
+async def run(args):
+    logging.getLogger("webhook").setLevel(logging.ERROR)  # mỗi request bị từ chối đều log warning
+    queue = asyncio.Queue()
+    app = types.SimpleNamespace(bot=None, update_queue=queue)  # server chỉ dùng hai thuộc tính này
+    server = WebhookServer(app, "127.0.0.1", 0, PATH, SECRET)
+    await server.start()
+    try:
+        failed = await check_statuses(server, queue)
+        failed += await check_keep_alive(server)
+        while not queue.empty():
+            queue.get_nowait()
+
+        per_connection = args.updates // args.connections
+        started = time.perf_counter()
+        sent = await asyncio.gather(*(
+            post_updates(server.port, per_connection, 1 + c * per_connection) for c in range(args.connections)
+        ))
+        elapsed = time.perf_counter() - started
+        total = per_connection * args.connections
+        if sum(sent) != total or queue.qsize() != total:
+            failed += 1
+            print(f"throughput run: {sum(sent)} accepted, {queue.qsize()} queued of {total}  FAIL")
+        print(f"\n{total} updates over {args.connections} keep-alive connections: "
+              f"{elapsed:.2f}s ({total / elapsed:.0f} updates/s)")
+    finally:
+        await server.stop()
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--connections", type=int, default=4)
+    failed = asyncio.run(run(parser.parse_args()))
+    if failed:
+        print(f"\n{failed} checks failed")
+        sys.exit(1)
+    print("All checks passed")
+
+
+if __name__ == "__main__":
+    main()
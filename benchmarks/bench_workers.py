@@ -0,0 +1,159 @@
+"""Multi-process mode (WORKERS > 1) with a worker killed mid-collect.
+
+Starts bot.py as a dispatcher with WORKERS workers against the fake Bot
+API (long polling), starts a collect in every group, then posts more links
+than MAX_USERS allows. Halfway through, one worker gets SIGKILL; the
+dispatcher restarts it and replays the updates it had not acknowledged.
+Checks that every group gets one result listing exactly the first
+MAX_USERS links it was sent, in order, and that a /broadcast the owner
+sends in a private chat reaches every group, whichever worker owns it.
+
+    python benchmarks/bench_workers.py --workers 4 --groups 16 --users 30
+"""
+import os
+import re
+import sys
+import time
+import signal
+import asyncio
+import argparse
+import tempfile
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from shards import shard_of
+from fake_bot_api import FakeBotAPI
+from load_test import make_update
+
+OWNER_ID = 2006042636
+MAX_USERS = 20
+STATUS_RE = re.compile(r"status/(\d+)")
+
+
+def worker_pids(dispatcher_pid):
+    """WORKER_INDEX -> pid of the dispatcher's children"""
+    pids = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            if ppid != dispatcher_pid:
+                continue
+            with open(f"/proc/{name}/environ", "rb") as f:
+                env = dict(item.split(b"=", 1) for item in f.read().split(b"\0") if b"=" in item)
+        except (OSError, IndexError, ValueError):
+            continue
+        if b"WORKER_INDEX" in env:
+            pids[int(env[b"WORKER_INDEX"])] = int(name)
+    return pids
+
+
+async def wait_for(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.1)
+    return True
+
+
+def results(api):
+    """chat_id -> status ids listed in the result messages, and number of results"""
+    links, counts = defaultdict(list), defaultdict(int)
+    in_result = set()
+    for _, method, params in api.log:
+        if method != "sendMessage":
+            continue
+        chat_id, text = int(params["chat_id"]), params.get("text", "")
+        if "KẾT QUẢ" in text:
+            counts[chat_id] += 1
+            in_result.add(chat_id)
+        if chat_id in in_result:
+            links[chat_id] += map(int, STATUS_RE.findall(text))
+    return links, counts
+
+
+async def run(args):
+    api = FakeBotAPI(latency=args.latency, seed=1)
+    await api.start()
+    workdir = tempfile.mkdtemp(prefix="bot-workers-")
+    env = {
+        **os.environ, "BOT_TOKEN": "1:fake", "BOT_API_URL": api.base_url,
+        "WORKERS": str(args.workers), "LIVE_BOARD": "1",  # không trả lời từng link, tránh giới hạn 20 tin/phút
+    }
+    env.pop("WORKER_INDEX", None)
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(ROOT, "bot.py"), cwd=workdir, env=env,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL  # log đã có trong logs/
+    )
+
+    groups = [-1001000000000 - i for i in range(args.groups)]
+    started = time.perf_counter()
+    for g in groups:
+        api.push_update(make_update(0, g, OWNER_ID, "/startcollect", True))
+    started_groups = lambda: {int(p["chat_id"]) for _, m, p in api.log if m == "sendMessage"}
+    if not await wait_for(lambda: started_groups() >= set(groups), args.timeout):
+        print("collects did not start")
+
+    sent = defaultdict(list)  # group -> status ids theo thứ tự gửi
+    links = [(u, i, g) for u in range(args.users) for i, g in enumerate(groups)]
+    half = len(links) // 2
+    for n, (u, i, g) in enumerate(links):
+        if n == half:
+            await asyncio.sleep(args.kill_after)
+            victim = shard_of(groups[0], args.workers)
+            pid = worker_pids(proc.pid).get(victim)
+            if pid:
+                os.kill(pid, signal.SIGKILL)
+                print(f"killed worker {victim} (pid {pid}) after {half} of {len(links)} links")
+        # Cooldown tính theo user trên mọi group: mỗi group một tập user riêng
+        user_id = (i + 1) * 1000 + u
+        status_id = 10**18 + user_id
+        sent[g].append(status_id)
+        api.push_update(make_update(0, g, user_id, f"https://x.com/u{u}/status/{status_id}"))
+
+    done = await wait_for(lambda: len(results(api)[1]) >= len(groups), args.timeout)
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(1)  # kết quả trùng (nếu có) đến muộn
+
+    dm = make_update(0, OWNER_ID, OWNER_ID, "/broadcast kiểm tra", True)
+    dm["message"]["chat"]["type"] = "private"
+    api.push_update(dm)
+    broadcast_groups = lambda: {
+        int(p["chat_id"]) for _, m, p in api.log if m == "sendMessage" and "THÔNG BÁO" in p.get("text", "")
+    }
+    await wait_for(lambda: broadcast_groups() >= set(groups), 10)
+    proc.send_signal(signal.SIGTERM)
+    returncode = await proc.wait()
+
+    listed, counts = results(api)
+    wrong = [g for g in groups if listed.get(g) != sent[g][:MAX_USERS]]
+    print(f"{args.workers} workers, {len(groups)} groups, {len(links)} links: "
+          f"{'all results' if done else 'TIMED OUT'} in {elapsed:.1f}s, dispatcher exit code {returncode}")
+    print(f"groups without result: {len(groups) - len(counts)}, duplicate results: "
+          f"{sum(c - 1 for c in counts.values())}, results not listing the first {MAX_USERS} links in order: {len(wrong)}")
+    with open(os.path.join(workdir, "logs", "bot.log"), encoding="utf-8") as f:
+        restarts = sum("restarting with" in line for line in f)
+    print(f"private-chat /broadcast reached {len(broadcast_groups() & set(groups))} of {len(groups)} groups")
+    print(f"worker restarts: {restarts}, logs in {workdir}/logs")
+    await api.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--groups", type=int, default=16)
+    parser.add_argument("--users", type=int, default=30, help="users posting per group")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake Bot API latency, seconds")
+    parser.add_argument("--kill-after", type=float, default=0.5, help="seconds into the second half")
+    parser.add_argument("--timeout", type=float, default=60)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
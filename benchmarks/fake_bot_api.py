@@ -0,0 +1,195 @@
+"""Local stand-in for the Telegram Bot API, for load tests without Telegram.
+
+Answers POST /bot<token>/<method> the way the real API does for the calls the
+bot makes, records every call, and can inject latency and 429 errors. Point a
+bot at it with BOT_API_URL=http://127.0.0.1:8081/bot, or use it in-process:
+updates given to push_update() are served by getUpdates (long polling).
+
+    api = FakeBotAPI(latency=0.02, error_rate=0.01)
+    await api.start()
+    ...
+    print(api.calls)
+
+    python benchmarks/fake_bot_api.py --port 8081 --latency 0.05 --error-rate 0.02
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+import itertools
+from collections import Counter
+from urllib.parse import parse_qsl
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Fake Bot", "username": "fake_bot"}
+
+
+class FakeBotAPI:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, retry_after=1, seed=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.calls = Counter()    # method -> số lần gọi (kể cả bị 429)
+        self.limited = Counter()  # method -> số lần trả 429
+        self.log = []             # (time, method, params) của mọi call
+        self._message_ids = itertools.count(1)
+        self._updates = []  # update dict chưa được xác nhận qua offset
+        self._update_ids = itertools.count(1)
+        self._new_update = asyncio.Event()
+        self._server = None
+        self._writers = set()
+        self._handlers = set()
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/bot"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            self._new_update.set()  # getUpdates đang chờ trả lời ngay
+            # Đợi handler thấy EOF và tự kết thúc, không để asyncio.run huỷ giữa chừng
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    def reset(self):
+        self.calls.clear()
+        self.limited.clear()
+        self.log.clear()
+
+    def push_update(self, update):
+        """Queue an update dict for getUpdates; update_id is assigned here"""
+        update = {**update, "update_id": next(self._update_ids)}
+        self._updates.append(update)
+        self._new_update.set()
+        return update["update_id"]
+
+    async def _get_updates(self, params):
+        offset = int(params.get("offset") or 0)
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), float(params.get("timeout") or 0))
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:int(params.get("limit") or 100)]
+
+    # ---------------- HTTP ----------------
+    async def _handle(self, reader, writer):
+        self._writers.add(writer)
+        self._handlers.add(asyncio.current_task())
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, target, _ = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                body = await reader.readexactly(length) if length else b""
+
+                method = target.rsplit("/", 1)[-1]
+                params = self._parse(headers.get("content-type", ""), body)
+                status, payload = await self._call(method, params)
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+    @staticmethod
+    def _parse(content_type, body):
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            return dict(parse_qsl(body.decode()))
+        if content_type.startswith("application/json"):
+            return json.loads(body or b"{}")
+        return {}  # multipart (sendDocument): chỉ cần đếm
+
+    # ---------------- Bot API ----------------
+    async def _call(self, method, params):
+        if method == "getUpdates":
+            return 200, {"ok": True, "result": await self._get_updates(params)}
+        self.calls[method] += 1
+        self.log.append((time.monotonic(), method, params))
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self.random.random() * self.jitter)
+        if method != "getMe" and self.random.random() < self.error_rate:
+            self.limited[method] += 1
+            return 429, {
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }
+        return 200, {"ok": True, "result": self._result(method, params)}
+
+    def _result(self, method, params):
+        if method == "getMe":
+            return BOT_USER
+        if method in ("sendMessage", "editMessageText", "sendDocument"):
+            chat_id = int(params.get("chat_id", 0))
+            message_id = int(params.get("message_id") or next(self._message_ids))
+            return {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "supergroup" if chat_id < 0 else "private"},
+                "from": BOT_USER,
+                "text": params.get("text", ""),
+            }
+        return True  # pin/unpin, setWebhook, deleteWebhook...
+
+
+async def _serve(args):
+    api = FakeBotAPI(args.host, args.port, args.latency, args.jitter, args.error_rate, args.retry_after)
+    await api.start()
+    print(f"Fake Bot API on {api.base_url}")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            if api.calls:
+                print(dict(api.calls), "429:", dict(api.limited))
+    finally:
+        await api.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Local stand-in for the tweet lookup endpoint used by the enrichment stage.
+
+Answers GET /tweet-result?id=<status_id> in the syndication API's shape
+({"id_str": ..., "user": {"screen_name": ...}}), or 404 for deleted tweets,
+and counts lookups per id. Point the bot at it with
+ENRICH_URL='http://127.0.0.1:8082/tweet-result?id={status_id}', or use it
+in-process:
+
+    api = FakeTweetAPI(latency=0.05, deleted_rate=0.1)
+    await api.start()
+    enricher = TweetEnricher(api.url_template)
+
+    python benchmarks/fake_tweet_api.py --port 8082 --latency 0.05
+"""
+import json
+import random
+import asyncio
+import argparse
+from collections import Counter
+from urllib.parse import urlsplit, parse_qsl
+
+
+class FakeTweetAPI:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, deleted_rate=0.0, error_rate=0.0, seed=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.deleted_rate = deleted_rate
+        self.error_rate = error_rate
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.lookups = Counter()  # status id -> số lần bị hỏi
+        self.connections = 0
+        self._server = None
+        self._writers = set()
+        self._handlers = set()
+
+    @property
+    def url_template(self):
+        return f"http://{self.host}:{self.port}/tweet-result?id={{status_id}}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._writers):
+                writer.close()
+            # Đợi handler thấy EOF và tự kết thúc, không để asyncio.run huỷ giữa chừng
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    def author(self, status_id):
+        return f"user{status_id % 1000}"
+
+    def is_deleted(self, status_id):
+        # Cố định theo id: hỏi lại vẫn cùng kết quả
+        return random.Random(f"{self.seed}-{status_id}").random() < self.deleted_rate
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        self._writers.add(writer)
+        self._handlers.add(asyncio.current_task())
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, target, _ = request_line.decode("latin-1").split()
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass  # bỏ qua header, GET không có body
+
+                status, payload = await self._lookup(target)
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+    async def _lookup(self, target):
+        url = urlsplit(target)
+        params = dict(parse_qsl(url.query))
+        if url.path != "/tweet-result" or not params.get("id", "").isdigit():
+            return 404, {}
+        status_id = int(params["id"])
+        self.lookups[status_id] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.random.random() < self.error_rate:
+            return 503, {}
+        if self.is_deleted(status_id):
+            return 404, {}
+        return 200, {"id_str": str(status_id), "user": {"screen_name": self.author(status_id)}}
+
+
+async def _serve(args):
+    api = FakeTweetAPI(args.host, args.port, args.latency, args.deleted_rate, args.error_rate)
+    await api.start()
+    print(f"Fake tweet API on {api.url_template}")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            if api.lookups:
+                print(f"{sum(api.lookups.values())} lookups, {len(api.lookups)} ids, {api.connections} connections")
+    finally:
+        await api.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every lookup")
+    parser.add_argument("--deleted-rate", type=float, default=0.0, help="share of ids answered with 404")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of lookups answered with 503")
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
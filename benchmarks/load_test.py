@@ -0,0 +1,231 @@
+"""Load test of the bot's handlers against the fake Bot API.
+
+Drives the real Application (handlers, outbox, history, job queue) with
+synthetic updates: thousands of users posting tweet links across many
+groups, plus duplicate links, cooldown violations and /status spam. Every
+active collect is then finished. Reports handler throughput and latency per
+update kind, and the outbound calls the fake API saw.
+
+    python benchmarks/load_test.py --groups 50 --users 2000 --latency 0.02 --error-rate 0.01
+
+Runs in a temporary directory, so state, history and logs do not touch the
+working tree. The outbox keeps Telegram's rate limits unless --no-rate-limit
+is given, so with many replies per group finish_collect latency mostly
+measures time spent queued behind the group limit.
+"""
+import os
+import sys
+import re
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from telegram import Update
+from telegram.ext import CallbackContext
+
+from fake_bot_api import FakeBotAPI
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+
+# Gần đúng cách Telegram nhận ra link trong tin nhắn (có hoặc không có scheme)
+URL_RE = re.compile(r"(?:https?://)?(?:[\w-]+\.)+[a-z]{2,}(?:/[^\s]*)?", re.IGNORECASE)
+
+
+def utf16_len(text):
+    return len(text.encode("utf-16-le")) // 2
+
+
+def make_update(update_id, chat_id, user_id, text, command=False):
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": chat_id, "type": "supergroup"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}", "username": f"user{user_id}"},
+        "text": text,
+    }
+    entities = []
+    if command:
+        entities.append({"type": "bot_command", "offset": 0, "length": len(text.split()[0])})
+    for match in URL_RE.finditer(text):
+        entities.append({
+            "type": "url", "offset": utf16_len(text[:match.start()]), "length": utf16_len(match.group())
+        })
+    if entities:
+        message["entities"] = entities
+    return {"update_id": update_id, "message": message}
+
+
+def make_events(args, owner_id):
+    """Return (kind, raw update) in the order they are processed"""
+    rng = random.Random(args.seed)
+    groups = [-1001000000000 - i for i in range(args.groups)]
+    ids = iter(range(1, 10**9))
+    start = [("startcollect", make_update(next(ids), g, owner_id, "/startcollect", True)) for g in groups]
+
+    events = []
+    for user_id in range(1, args.users + 1):
+        group = rng.choice(groups)
+        status_id = 10**18 + user_id
+        link = f"https://x.com/user{user_id}/status/{status_id}"
+        events.append(("link", make_update(next(ids), group, user_id, f"xem nè {link}")))
+        if rng.random() < args.repeat_rate:
+            # Gửi lại ngay: dính cooldown
+            events.append(("cooldown", make_update(next(ids), group, user_id, link)))
+        if rng.random() < args.duplicate_rate:
+            # Người khác gửi trùng tweet
+            events.append(("duplicate", make_update(next(ids), group, user_id + 10**7, link.replace("x.com", "twitter.com"))))
+        if rng.random() < args.status_rate:
+            events.append(("status", make_update(next(ids), group, user_id, "/status", True)))
+        if rng.random() < args.chatter_rate:
+            events.append(("chatter", make_update(next(ids), group, user_id, "gm gm, hôm nay collect mấy giờ?")))
+    rng.shuffle(events)
+    return start, events
+
+
+async def run(args):
+    workdir = tempfile.mkdtemp(prefix="bot-load-")
+    os.chdir(workdir)
+    os.makedirs("logs")
+    os.environ.setdefault("BOT_TOKEN", "1:fake")
+
+    # bot.py mở logs/bot.log và file state theo thư mục hiện tại lúc import
+    import bot
+    from outbox import Outbox
+
+    # Log vẫn ghi file như thật, chỉ tắt phần in ra console
+    for handler in bot.log_listener.handlers:
+        if not isinstance(handler, logging.FileHandler):
+            handler.setLevel(logging.WARNING)
+    bot.MAX_USERS = args.max_users
+    if args.no_rate_limit:
+        bot.outbox = Outbox(global_rate=10**6, chat_rate=10**6, group_rate_per_minute=10**8)
+
+    api = FakeBotAPI(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                     retry_after=args.retry_after, seed=args.seed)
+    await api.start()
+
+    bot.history.open()
+    app = bot.build_application(os.environ["BOT_TOKEN"], api.base_url)
+    await app.initialize()
+    await app.start()
+
+    start, events = make_events(args, bot.OWNER_ID)
+    latencies = defaultdict(list)
+
+    async def process(kind, raw):
+        update = Update.de_json(raw, app.bot)
+        started = time.perf_counter()
+        await app.process_update(update)
+        latencies[kind].append(time.perf_counter() - started)
+
+    for kind, raw in start:
+        await process(kind, raw)
+
+    queue = iter(events)
+
+    async def worker():
+        for kind, raw in queue:
+            await process(kind, raw)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    elapsed = time.perf_counter() - started
+
+    # Mỗi group kết thúc bằng job riêng, nên chạy đồng thời như thật
+    async def finish(session):
+        t = time.perf_counter()
+        await bot.finish_collect(CallbackContext(app), session)
+        latencies["finish_collect"].append(time.perf_counter() - t)
+
+    await asyncio.gather(*[finish(session) for session in bot.sessions.active_sessions()])
+
+    # Cho outbox gửi nốt trong thời gian cho phép
+    deadline = time.monotonic() + args.drain
+    while len(bot.outbox) and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    pending = len(bot.outbox)
+
+    report = {
+        "events": len(events),
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(events) / elapsed, 1),
+        "handlers": {
+            kind: {
+                "count": len(values),
+                "p50_ms": round(percentile(sorted(values), 0.50) * 1e3, 3),
+                "p99_ms": round(percentile(sorted(values), 0.99) * 1e3, 3),
+                "max_ms": round(max(values) * 1e3, 3),
+            }
+            for kind, values in sorted(latencies.items())
+        },
+        "api_calls": dict(api.calls),
+        "api_429": dict(api.limited),
+        "outbox_calls": dict(bot.outbox.calls),
+        "outbox_failures": dict(bot.outbox.failures),
+        "outbox_pending": pending,
+    }
+
+    await bot.outbox.close()
+    await app.stop()
+    await app.shutdown()
+    await bot.state_store.close()
+    await asyncio.to_thread(bot.history.close)
+    await api.stop()
+    return report
+
+
+def print_report(report):
+    print(f"{report['events']:,} updates in {report['seconds']:.2f}s – {report['throughput']:,.0f} updates/s")
+    print(f"{'handler':<16}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for kind, row in report["handlers"].items():
+        print(f"{kind:<16}{row['count']:>8}{row['p50_ms']:>10.3f}{row['p99_ms']:>10.3f}{row['max_ms']:>10.3f}")
+    print("Bot API calls:", report["api_calls"])
+    if report["api_429"]:
+        print("429 answers:  ", report["api_429"])
+    print("Outbox calls: ", report["outbox_calls"], "failures:", report["outbox_failures"],
+          "still queued:", report["outbox_pending"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--max-users", type=int, default=10**6, help="MAX_USERS per collect")
+    parser.add_argument("--concurrency", type=int, default=32, help="updates processed at once")
+    parser.add_argument("--repeat-rate", type=float, default=0.3, help="users who post again at once")
+    parser.add_argument("--duplicate-rate", type=float, default=0.05, help="links reposted by someone else")
+    parser.add_argument("--status-rate", type=float, default=0.2, help="users who spam /status")
+    parser.add_argument("--chatter-rate", type=float, default=0.5, help="plain messages without links")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--no-rate-limit", action="store_true", help="lift the outbox's Telegram limits")
+    parser.add_argument("--drain", type=float, default=5.0, help="seconds to let the outbox flush")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
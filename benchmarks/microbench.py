@@ -0,0 +1,415 @@
+"""Microbenchmarks of the bot's hot functions, with JSON baselines.
+
+Times the tweet regex on chat text, escape_markdown, create_progress_bar,
+format_time, the result pages finish_collect builds for 10 to 10k links,
+saving and loading a large state, and the whole collect_link path
+(filters, handler, history, seen filter) with the outbox replaced by a
+stub that sends nothing. Each benchmark reports the best of --repeat runs,
+per call.
+
+    python benchmarks/microbench.py                                   # print
+    python benchmarks/microbench.py --save benchmarks/baseline.json   # new baseline
+    python benchmarks/microbench.py --compare benchmarks/baseline.json --threshold 0.25
+    python benchmarks/microbench.py --only summary --only regex
+
+--compare exits with status 1 when a benchmark is slower than its baseline
+by more than the threshold (a benchmark may carry a wider one of its own,
+e.g. anything that fsyncs). Baselines are machine-specific: record one on
+the machine that runs the comparison.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import fnmatch
+import argparse
+import platform
+import tempfile
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from telegram import Update
+
+from fake_bot_api import FakeBotAPI
+from load_test import make_update
+
+CHAT_TEXTS = [
+    "gm gm, hôm nay collect mấy giờ vậy mọi người?",
+    "ok để tối mình gửi link nha 😄",
+    "xem nè https://x.com/elonmusk/status/1790000000000000000?s=20 ủng hộ mình với",
+    "https://twitter.com/Some_User/status/1780000000000000001/photo/1",
+    "link youtube nè https://youtu.be/dQw4w9WgXcQ không phải tweet đâu",
+    "mobile.twitter.com/abc/statuses/1770000000000000002 cũ quá rồi",
+    "ai biết cách tính điểm leaderboard không, mình thấy streak bị reset",
+    "fox.com/news/status/123 không phải x.com đâu nha",
+]
+NAMES = ["@user_123", "Nguyễn Văn A", "@crypto*king", "[admin] Bob", "@a_b_c_d_e_f"]
+
+BENCHMARKS = {}  # name -> (setup, number hoặc None để tự chọn, threshold riêng hoặc None)
+
+
+def benchmark(name, number=None, threshold=None):
+    """Register setup(ctx) -> callable (sync or async) timed per call"""
+    def register(setup):
+        BENCHMARKS[name] = (setup, number, threshold)
+        return setup
+    return register
+
+
+class NullOutbox:
+    """Outbox stand-in: accepts every send and completes it at once"""
+
+    def __init__(self):
+        self.sent = 0
+
+    def __len__(self):
+        return 0
+
+    def submit(self, chat_id, method, /, *args, priority=0, **kwargs):
+        self.sent += 1
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(None)
+        return future
+
+    async def drain(self, timeout):
+        pass
+
+    async def close(self):
+        pass
+
+
+def fill_session(bot, session, links, seed=1):
+    rng = random.Random(seed)
+    now = time.time()
+    for i in range(links):
+        session.add_submission(
+            10**6 + i, 10**18 + rng.randrange(10**17), rng.choice(NAMES), f"author{rng.randrange(5000)}", now
+        )
+
+
+def reset_sessions(bot):
+    bot.sessions.from_dict({"groups": []})
+
+
+# ================= PURE FUNCTIONS ==========
+@benchmark("regex.parse_tweet_link")
+def _(ctx):
+    from tweets import parse_tweet_link
+    texts = CHAT_TEXTS
+
+    def run():
+        for text in texts:
+            parse_tweet_link(text)
+    return run
+
+
+@benchmark("regex.tweet_regex_search")
+def _(ctx):
+    from tweets import TWEET_REGEX
+    search = TWEET_REGEX.search
+    texts = CHAT_TEXTS
+
+    def run():
+        for text in texts:
+            search(text)
+    return run
+
+
+@benchmark("regex.entity_prefilter")
+def _(ctx):
+    from tweets import has_tweet_entity
+    messages = [Update.de_json(make_update(1, -1, 1, text), None).message for text in CHAT_TEXTS]
+    pairs = [(m.text, m.entities) for m in messages]
+
+    def run():
+        for text, entities in pairs:
+            has_tweet_entity(text, entities)
+    return run
+
+
+@benchmark("render.escape_markdown")
+def _(ctx):
+    from render import escape_markdown
+    texts = CHAT_TEXTS + NAMES
+
+    def run():
+        for text in texts:
+            escape_markdown(text)
+    return run
+
+
+@benchmark("render.create_progress_bar")
+def _(ctx):
+    create_progress_bar = ctx.bot.create_progress_bar
+
+    def run():
+        for percentage in (0, 12.5, 50, 99.9, 100):
+            create_progress_bar(percentage)
+    return run
+
+
+@benchmark("render.format_time")
+def _(ctx):
+    format_time = ctx.bot.format_time
+
+    def run():
+        for seconds in (0, 59, 61, 3599, 3600, 86399):
+            format_time(seconds)
+    return run
+
+
+def _summary(links):
+    def setup(ctx):
+        bot = ctx.bot
+        session = bot.BotState(-1)
+        fill_session(bot, session, links)
+        return lambda: bot.summary_pages(session)
+    return setup
+
+
+for _links in (10, 100, 1000, 10000):
+    benchmark(f"summary.pages_{_links}")(_summary(_links))
+
+
+# ================= STATE ===================
+STATE_GROUPS = 50
+STATE_LINKS = 1000
+
+
+def _large_state(bot):
+    reset_sessions(bot)
+    for i in range(STATE_GROUPS):
+        session = bot.sessions.get_or_create(-1002000000000 - i)
+        session.start_collect()
+        fill_session(bot, session, STATE_LINKS, seed=i)
+
+
+@benchmark("state.serialize")
+def _(ctx):
+    # Encode lại mọi group (chạy ở thread ghi)
+    store = ctx.bot.state_store
+    _large_state(ctx.bot)
+
+    def run():
+        store.invalidate()
+        store._serialize(store._snapshot())
+    return run
+
+
+@benchmark("state.snapshot_one_group")
+def _(ctx):
+    # Phần chạy trên event loop khi một group nhận link
+    store = ctx.bot.state_store
+    _large_state(ctx.bot)
+    group = next(iter(ctx.bot.sessions)).group_id
+
+    def run():
+        store.invalidate(group)
+        store._snapshot()
+    return run
+
+
+@benchmark("state.save", threshold=1.0)  # có fsync, dao động theo disk
+def _(ctx):
+    store = ctx.bot.state_store
+    _large_state(ctx.bot)
+
+    def run():
+        store.invalidate()
+        store.flush_sync()
+    return run
+
+
+@benchmark("state.save_one_group", threshold=1.0)
+def _(ctx):
+    store = ctx.bot.state_store
+    _large_state(ctx.bot)
+    group = next(iter(ctx.bot.sessions)).group_id
+    store.invalidate()
+    store.flush_sync()
+
+    def run():
+        store.invalidate(group)
+        store.flush_sync()
+    return run
+
+
+@benchmark("state.load")
+def _(ctx):
+    bot = ctx.bot
+    _large_state(bot)
+    bot.state_store.invalidate()
+    bot.state_store.flush_sync()
+    return bot.load_state
+
+
+# ================= HANDLERS ================
+@benchmark("handler.collect_link", number=2000)
+def _(ctx):
+    bot = ctx.bot
+    reset_sessions(bot)
+    group = -1003000000000
+    bot.sessions.get_or_create(group).start_collect()
+    bot.MAX_USERS = 10**9  # không kết thúc giữa chừng
+    count = ctx.args.repeat * 2000 + 200
+    updates = iter([
+        Update.de_json(make_update(
+            i + 1, group, 10**7 + i, f"xem nè https://x.com/u{i % 977}/status/{10**18 + i}?s=20"
+        ), ctx.app.bot)
+        for i in range(count)
+    ])
+    process_update = ctx.app.process_update
+    return lambda: process_update(next(updates))
+
+
+@benchmark("handler.idle_chatter")
+def _(ctx):
+    bot = ctx.bot
+    reset_sessions(bot)
+    update = Update.de_json(make_update(1, -1004000000000, 42, CHAT_TEXTS[0]), ctx.app.bot)
+    process_update = ctx.app.process_update
+    return lambda: process_update(update)
+
+
+# ================= RUNNER ==================
+async def time_call(fn, number, is_async):
+    if is_async:
+        started = time.perf_counter()
+        for _ in range(number):
+            await fn()
+        return time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return time.perf_counter() - started
+
+
+async def measure(fn, number, args):
+    # Gọi thử một lần: callable trả coroutine thì đo bằng await
+    first = fn()
+    is_async = asyncio.iscoroutine(first)
+    if is_async:
+        await first
+    if number is None:
+        # Tăng gấp đôi đến khi một lần đo dài ít nhất --min-time
+        number = 1
+        while await time_call(fn, number, is_async) < args.min_time:
+            number *= 2
+    else:
+        await time_call(fn, min(number, 100), is_async)  # làm nóng
+    runs = [await time_call(fn, number, is_async) / number for _ in range(args.repeat)]
+    return min(runs), number
+
+
+class Context:
+    def __init__(self, bot, app, args):
+        self.bot = bot
+        self.app = app
+        self.args = args
+
+
+async def run(args):
+    os.chdir(tempfile.mkdtemp(prefix="bot-microbench-"))
+    os.environ.setdefault("BOT_TOKEN", "1:fake")
+    import bot
+
+    for handler in bot.log_listener.handlers:
+        handler.setLevel("WARNING")
+    bot.outbox = NullOutbox()
+    api = FakeBotAPI()  # chỉ để initialize() gọi getMe
+    await api.start()
+    bot.history.open()
+    app = bot.build_application(os.environ["BOT_TOKEN"], api.base_url)
+    await app.initialize()
+    ctx = Context(bot, app, args)
+
+    results = {}
+    max_users = bot.MAX_USERS
+    for name, (setup, number, threshold) in BENCHMARKS.items():
+        if args.only and not any(fnmatch.fnmatch(name, f"*{pattern}*") for pattern in args.only):
+            continue
+        fn = setup(ctx)
+        seconds, number = await measure(fn, number, args)
+        results[name] = {"seconds": seconds, "number": number, "repeat": args.repeat}
+        if threshold is not None:
+            results[name]["threshold"] = threshold
+        print(f"{name:<30}{format_seconds(seconds):>12}  ({number} calls x {args.repeat})", flush=True)
+        bot.MAX_USERS = max_users
+
+    reset_sessions(bot)
+    await app.shutdown()
+    await bot.state_store.close()
+    await asyncio.to_thread(bot.history.close)
+    await api.stop()
+    return results
+
+
+def format_seconds(seconds):
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    if seconds >= 1e-6:
+        return f"{seconds * 1e6:.2f} µs"
+    return f"{seconds * 1e9:.0f} ns"
+
+
+def compare(results, baseline, threshold):
+    """Print the comparison; returns the names that regressed"""
+    regressed = []
+    print(f"\n{'benchmark':<30}{'baseline':>12}{'now':>12}{'change':>10}")
+    for name, result in results.items():
+        old = baseline["results"].get(name)
+        if old is None:
+            print(f"{name:<30}{'-':>12}{format_seconds(result['seconds']):>12}{'new':>10}")
+            continue
+        change = result["seconds"] / old["seconds"] - 1
+        limit = max(threshold, old.get("threshold", 0))
+        flag = ""
+        if change > limit:
+            regressed.append(name)
+            flag = f"  REGRESSION (> {limit:+.0%})"
+        print(f"{name:<30}{format_seconds(old['seconds']):>12}{format_seconds(result['seconds']):>12}"
+              f"{change:>+10.1%}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", action="append", help="run benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds per timed run, at least")
+    parser.add_argument("--save", metavar="PATH", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    args = parser.parse_args()
+    # run() chạy trong thư mục tạm
+    args.save = args.save and os.path.abspath(args.save)
+    args.compare = args.compare and os.path.abspath(args.compare)
+
+    results = asyncio.run(run(args))
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({
+                "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "machine": platform.platform(),
+                "results": results,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {args.save}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressed = compare(results, baseline, args.threshold)
+        if regressed:
+            print(f"\n{len(regressed)} benchmarks regressed: {', '.join(regressed)}")
+            sys.exit(1)
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
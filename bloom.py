@@ -0,0 +1,194 @@
+import os
+import math
+import time
+import struct
+import hashlib
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"BLM2"
+_HEADER = struct.Struct("<4sIIIq")  # magic, days, số bit mỗi filter, số hàm hash, ngày mới nhất
+_COUNT = struct.Struct("<I")
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over a bytearray"""
+    __slots__ = ("num_bits", "num_hashes", "bits", "count")
+
+    def __init__(self, num_bits, num_hashes, bits=None, count=0):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bytearray((num_bits + 7) // 8) if bits is None else bits
+        self.count = count  # số key đã thêm
+
+    @staticmethod
+    def optimal(capacity, error_rate):
+        """(num_bits, num_hashes) for capacity items at error_rate false positives"""
+        num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        return num_bits, num_hashes
+
+    def probes(self, h1, h2):
+        """(byte index, bit mask) of the k bits for one key, by double hashing"""
+        m = self.num_bits
+        return [(pos >> 3, 1 << (pos & 7)) for pos in ((h1 + i * h2) % m for i in range(self.num_hashes))]
+
+    def add_probes(self, probes):
+        bits = self.bits
+        for index, mask in probes:
+            bits[index] |= mask
+        self.count += 1
+
+    def contains_probes(self, probes):
+        bits = self.bits
+        for index, mask in probes:
+            if not bits[index] & mask:
+                return False
+        return True
+
+    def clear(self):
+        self.bits[:] = bytes(len(self.bits))
+        self.count = 0
+
+
+def _hash_key(group_id, status_id):
+    digest = hashlib.blake2b(struct.pack("<qQ", group_id, status_id), digest_size=16).digest()
+    h1, h2 = struct.unpack("<QQ", digest)
+    return h1, h2 | 1  # h2 lẻ để k vị trí không trùng nhau
+
+
+class SeenTweets:
+    """Status ids accepted per group over the last `days` days.
+
+    Each day has its own Bloom filters, used as a ring: the oldest day is
+    cleared when a new day starts. A day starts with one filter sized for
+    capacity_per_day links at error_rate / days, so a lookup across the
+    window stays within error_rate. A day with more links than that gets
+    another filter of the same size each time the last one is full, instead
+    of overfilling it: memory grows by one filter per extra
+    capacity_per_day links, and the false-positive rate grows with the
+    number of filters (linearly) rather than collapsing. A lookup is a
+    handful of bit tests per filter; false positives are possible, false
+    negatives are not.
+    """
+
+    def __init__(self, days=7, capacity_per_day=50_000, error_rate=0.001, clock=time.time):
+        self.days = days
+        self.capacity = capacity_per_day
+        self.clock = clock
+        self.num_bits, self.num_hashes = BloomFilter.optimal(capacity_per_day, error_rate / days)
+        self._buckets = [[self._new_filter()] for _ in range(days)]  # mỗi ngày một danh sách filter
+        self._day = self._today()  # ngày của bucket mới nhất
+        self.added = 0
+
+    def _new_filter(self):
+        return BloomFilter(self.num_bits, self.num_hashes)
+
+    def __contains__(self, key):
+        """key = (group_id, status_id)"""
+        self._rotate()
+        # Mọi filter cùng kích thước nên chỉ tính vị trí bit một lần
+        probes = self._buckets[0][0].probes(*_hash_key(*key))
+        return any(f.contains_probes(probes) for bucket in self._buckets for f in bucket)
+
+    @property
+    def nbytes(self):
+        return sum(len(f.bits) for bucket in self._buckets for f in bucket)
+
+    @property
+    def filters(self):
+        """Number of filters in the window, days when every day stayed within capacity"""
+        return sum(len(bucket) for bucket in self._buckets)
+
+    def add(self, group_id, status_id):
+        self._rotate()
+        bucket = self._buckets[self._day % self.days]
+        current = bucket[-1]
+        if current.count >= self.capacity:
+            current = self._new_filter()
+            bucket.append(current)
+            logger.warning(
+                f"Seen tweets: more than {self.capacity * (len(bucket) - 1)} links today, "
+                f"added filter {len(bucket)} for the day ({len(current.bits) // 1024} KB)"
+            )
+        current.add_probes(current.probes(*_hash_key(group_id, status_id)))
+        self.added += 1
+
+    def _today(self):
+        return int(self.clock() // 86400)
+
+    def _rotate(self):
+        today = self._today()
+        if today <= self._day:
+            return
+        # Xoá các bucket của những ngày đã ra khỏi cửa sổ, bỏ filter thêm
+        for day in range(max(self._day + 1, today - self.days + 1), today + 1):
+            bucket = self._buckets[day % self.days]
+            del bucket[1:]
+            bucket[0].clear()
+        self._day = today
+
+    # ---------------- file ----------------
+    def to_bytes(self):
+        """Header, then per day: number of filters, then count and bits of each"""
+        parts = [_HEADER.pack(MAGIC, self.days, self.num_bits, self.num_hashes, self._day)]
+        for bucket in self._buckets:
+            parts.append(_COUNT.pack(len(bucket)))
+            for f in bucket:
+                parts.append(_COUNT.pack(f.count))
+                parts.append(bytes(f.bits))
+        return b"".join(parts)
+
+    def load_bytes(self, data):
+        """Restore from to_bytes(); ValueError if the sizes do not match this filter"""
+        magic, days, num_bits, num_hashes, day = _HEADER.unpack_from(data)
+        if magic != MAGIC or (days, num_bits, num_hashes) != (
+            self.days, self.num_bits, self.num_hashes
+        ):
+            raise ValueError("filter file was written with different settings")
+        size = (num_bits + 7) // 8
+        offset = _HEADER.size
+
+        def read(length):
+            nonlocal offset
+            if offset + length > len(data):
+                raise ValueError("truncated filter file")
+            offset += length
+            return data[offset - length:offset]
+
+        buckets = []
+        for _ in range(days):
+            (filters,) = _COUNT.unpack(read(_COUNT.size))
+            if not filters:
+                raise ValueError("day without a filter in filter file")
+            bucket = []
+            for _ in range(filters):
+                (count,) = _COUNT.unpack(read(_COUNT.size))
+                bucket.append(BloomFilter(num_bits, num_hashes, bytearray(read(size)), count))
+            buckets.append(bucket)
+        if offset != len(data):
+            raise ValueError("filter file has trailing data")
+        self._buckets = buckets
+        self._day = day
+        self._rotate()
+
+    def save(self, path, data=None):
+        """Atomically write to_bytes() (or data, a snapshot of it) to path"""
+        data = self.to_bytes() if data is None else data
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".seen.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def load(self, path):
+        with open(path, "rb") as f:
+            self.load_bytes(f.read())
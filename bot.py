@@ -1,12 +1,39 @@
-import re
+import math
 import time
+import sys
 import json
 import asyncio
 import logging
-from datetime import time as dtime, datetime, timedelta
-from collections import defaultdict
+import signal
+import secrets
+import warnings
+import functools
+import contextvars
+import tempfile
+from datetime import time as dtime, datetime
 import pytz
+from apscheduler.jobstores.base import JobLookupError  # đi kèm extra python-telegram-bot[job-queue]
 from telegram import Update
+from telegram.warnings import PTBUserWarning
+from history import CollectHistory
+from cooldown import CooldownTracker
+from autoschedule import AutoSchedule, ALL_DAYS, parse_time, parse_days, format_days
+from tweets import has_tweet_entity, parse_entity_tweet_link
+from submissions import Submissions
+from enrichment import TweetEnricher
+from bloom import SeenTweets
+from outbox import Outbox, GLOBAL_RATE, PRIORITY_RESULT, PRIORITY_NORMAL, PRIORITY_REPLY
+from webhook import WebhookServer, serve_webhook, is_loopback
+from shards import (
+    ChatOrderedUpdateProcessor, Dispatcher, GroupStateDB, AckTracker, ALL_WORKERS, open_stdin,
+    install_stop_signals
+)
+from metrics import REGISTRY, MetricsServer
+from log_setup import setup_logging, bind_log_context, reset_log_context
+from exporter import FORMATS, write_export, export_filename
+from render import (
+    SummaryPacker, Template, telegram_length, escape_markdown, prepare_markdown
+)
 from telegram.ext import (
     ApplicationBuilder,
     ContextTypes,
@@ -17,86 +44,215 @@ from telegram.ext import (
 import os
 
 # ================= LOGGING =================
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+# WORKERS > 1: bot.py chạy làm dispatcher và tự bật WORKERS process con,
+# mỗi process con có WORKER_INDEX và chỉ xử lý các group của mình
+WORKERS = int(os.getenv("WORKERS", "1"))
+WORKER_INDEX = int(os.environ["WORKER_INDEX"]) if os.getenv("WORKER_INDEX") else None
+LOG_FILE = "logs/bot.log" if WORKER_INDEX is None else f"logs/bot.worker{WORKER_INDEX}.log"
+LOG_JSON = os.getenv("LOG_FORMAT") == "json"  # Mỗi dòng một object JSON, có chat_id/user_id/handler
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 14  # số file cũ giữ lại, nén gzip
+LOG_ROTATE_INTERVAL = 24 * 3600  # giây, xoay file ít nhất mỗi ngày
+
+# Ghi log ở thread riêng qua queue, handler không bao giờ chờ disk
+log_listener = setup_logging(
+    LOG_FILE,
     level=logging.INFO,
-    handlers=[
-        logging.FileHandler('logs/bot.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
+    json_format=LOG_JSON,
+    max_bytes=LOG_MAX_BYTES,
+    backup_count=LOG_BACKUP_COUNT,
+    interval=LOG_ROTATE_INTERVAL
 )
 logger = logging.getLogger(__name__)
 
 # ================= CONFIG =================
 TOKEN = os.getenv("BOT_TOKEN")
+BOT_API_URL = os.getenv("BOT_API_URL")  # vd. http://127.0.0.1:8081/bot để chạy với Bot API giả
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0")) or None  # Bật /metrics (Prometheus) khi có
+if METRICS_PORT and WORKER_INDEX is not None:
+    METRICS_PORT += WORKER_INDEX + 1  # worker i dùng cổng METRICS_PORT + i + 1
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
 OWNER_ID = 2006042636
 MAX_USERS = 20
 COLLECT_DURATION = 3600  # 1 giờ
 STATE_FILE = "bot_state.json"
+STATE_SAVE_DELAY = 2  # giây, gom các lần save_state liên tiếp thành một lần ghi
+STATE_DB = "bot_state.db"  # state dùng chung của các worker (WORKERS > 1), mỗi group một dòng
+WORKER_STOP_TIMEOUT = 30  # giây, chờ worker tự dừng trước khi kill
+WORKER_RESTART_DELAY = 1  # giây
+HISTORY_DB = "collect_history.db"
+HISTORY_FLUSH_INTERVAL = 1.0  # giây, gom các lần ghi lịch sử thành một transaction
 TIMEZONE = pytz.timezone("Asia/Ho_Chi_Minh")
 USER_COOLDOWN = 30  # giây
-
-TWEET_REGEX = re.compile(
-    r"https?:\/\/(x|twitter)\.com\/\w+\/status\/\d+"
-)
+SESSION_IDLE_TTL = 24 * 3600  # giây, group không dùng sẽ bị xoá khỏi bộ nhớ
+SESSION_SWEEP_INTERVAL = 600  # giây
+CONCURRENT_UPDATES = 64  # số update xử lý cùng lúc, 1 = tuần tự
+SHUTDOWN_DRAIN_TIMEOUT = 10  # giây, chờ gửi nốt tin trong outbox khi tắt bot
+LIVE_BOARD = os.getenv("LIVE_BOARD") == "1"  # Sửa tin ghim thay vì trả lời từng link
+BOARD_EDIT_INTERVAL = 5  # giây, tối đa một lần sửa bảng mỗi khoảng này
+BOARD_RECENT = 5  # số người gửi gần nhất hiển thị trên bảng
+WEBHOOK = os.getenv("WEBHOOK") == "1"  # Nhận update qua webhook thay vì long polling
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # URL công khai, bỏ trống nếu đã setWebhook bên ngoài
+# Mặc định chỉ nghe local (sau reverse proxy); địa chỉ khác bắt buộc có secret
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+ALLOWED_UPDATES = [Update.MESSAGE]  # Bot chỉ xử lý tin nhắn và lệnh
+# Tra cứu tác giả / tweet đã xoá sau khi nhận link, vd.
+# https://cdn.syndication.twimg.com/tweet-result?id={status_id}&token=0
+ENRICH_URL = os.getenv("ENRICH_URL")
+ENRICH_WORKERS = 4
+ENRICH_QUEUE_SIZE = 1000  # đầy thì bỏ qua, không bao giờ làm chậm collect_link
+ENRICH_TIMEOUT = 5  # giây
+ENRICH_CACHE_SIZE = 10000
+ENRICH_CACHE_TTL = 6 * 3600  # giây
+SEEN_DEDUPE = os.getenv("SEEN_DEDUPE", "1") == "1"  # Từ chối tweet đã gửi ở các lần collect trước
+SEEN_FILE = "seen_tweets.bloom" if WORKER_INDEX is None else f"seen_tweets.worker{WORKER_INDEX}.bloom"
+SEEN_DAYS = 7  # nhớ tweet đã gửi trong bấy nhiêu ngày
+# Số link mỗi ngày mà vẫn giữ được tỉ lệ báo nhầm. Vượt quá thì ngày đó có thêm
+# một filter cùng cỡ (~112 KB) cho mỗi SEEN_CAPACITY_PER_DAY link nữa, tỉ lệ báo
+# nhầm tăng theo số filter thay vì tăng vọt
+SEEN_CAPACITY_PER_DAY = 50000
+SEEN_ERROR_RATE = 0.001  # tỉ lệ báo nhầm một tweet mới là đã gửi
+SEEN_SAVE_INTERVAL = 300  # giây
 # ==========================================
 
 # ================= STATE CLASS =============
+def cancel_job(job):
+    """Remove a job_queue job if it has not run yet, always returns None"""
+    if job is not None:
+        try:
+            job.schedule_removal()
+        except JobLookupError:
+            pass  # Job đã chạy rồi
+    return None
+
 class BotState:
-    def __init__(self):
-        self.group_id = None
+    """Collect state of a single group"""
+    __slots__ = (
+        "group_id", "active", "start_time", "end_time", "submissions", "summary",
+        "schedule", "finish_job", "pinned_message_id", "result_message_id",
+        "board_message_id", "board_job", "board_text", "board_edited_at",
+        "last_collect_stats", "last_used", "run_id", "lock",
+    )
+
+    def __init__(self, group_id=None):
+        self.group_id = group_id
         self.active = False
         self.start_time = 0
         self.end_time = 0
-        self.users = set()
-        self.links = []
-        self.auto_times = []
-        self.jobs = []
+        self.submissions = Submissions()  # Link đã nhận trong lần collect này, kèm user / status id
+        self.summary = SummaryPacker(SUMMARY_HEADER_RESERVE, SUMMARY_CONTINUATION)  # Trang kết quả dựng dần
+        self.schedule = AutoSchedule()  # Lịch auto collect theo giờ, mỗi giờ một job
+        self.finish_job = None  # Job run_once kết thúc collect đúng end_time
         self.pinned_message_id = None
         self.result_message_id = None  # Thêm ID tin nhắn kết quả
+        self.board_message_id = None  # Tin bắt đầu collect, dùng làm bảng live
+        self.board_job = None
+        self.board_text = None
+        self.board_edited_at = 0
         self.last_collect_stats = {
             "timestamp": 0,
             "user_count": 0,
             "link_count": 0
         }
-        self.bot_start_time = time.time()
+        self.last_used = time.time()
+        self.run_id = None  # ID của lần collect trong lịch sử SQLite
+        # Tuần tự hoá start/stop/finish của group. Nhận link thì không cần:
+        # đoạn kiểm tra-rồi-thêm không có await nên đã atomic trên event loop
+        self.lock = asyncio.Lock()
     
     def to_dict(self):
-        return {
+        data = {
             "group_id": self.group_id,
-            "auto_times": self.auto_times,
+            "auto_schedule": self.schedule.to_list(),
             "last_collect_stats": self.last_collect_stats,
-            "bot_start_time": self.bot_start_time
         }
+        if self.active:
+            # Lưu cả collect đang chạy để restart thì chạy tiếp đúng end_time
+            data["collect"] = {
+                "start_time": self.start_time,
+                "end_time": self.end_time,
+                "submissions": self.submissions.to_dict(),
+                "pinned_message_id": self.pinned_message_id,
+                "board_message_id": self.board_message_id,
+                "run_id": self.run_id,
+            }
+        return data
     
     def from_dict(self, data):
         self.group_id = data.get("group_id")
-        self.auto_times = data.get("auto_times", [])
+        # File cũ lưu auto_times: danh sách "HH:MM" chạy hằng ngày
+        self.schedule.from_list(data.get("auto_schedule", data.get("auto_times", [])))
         self.last_collect_stats = data.get("last_collect_stats", {
             "timestamp": 0,
             "user_count": 0,
             "link_count": 0
         })
-        self.bot_start_time = data.get("bot_start_time", time.time())
+        
+        collect = data.get("collect")
+        if collect:
+            self.active = True
+            self.start_time = collect["start_time"]
+            self.end_time = collect["end_time"]
+            self.submissions.from_dict(collect["submissions"])
+            self.summary.clear()
+            for entry in self.submissions.entries():
+                self.summary.add(escape_markdown(entry))
+            self.pinned_message_id = collect.get("pinned_message_id")
+            self.board_message_id = collect.get("board_message_id")
+            self.run_id = collect.get("run_id")
+    
+    def touch(self):
+        self.last_used = time.time()
+    
+    def is_idle(self, now, ttl):
+        """Idle = không collect, không có lịch auto và lâu không dùng"""
+        return not self.active and not self.schedule and now - self.last_used >= ttl
+    
+    def add_submission(self, user_id, status_id, name, handle, created_at):
+        """Record an accepted link; returns its position (from 1)"""
+        position = self.submissions.add(user_id, status_id, name, handle, created_at)
+        # Chỉ đo để xếp trang kết quả, chữ được dựng lại lúc kết thúc
+        self.summary.add(escape_markdown(self.submissions[-1].entry))
+        return position
     
     def reset_collect(self):
-        self.users.clear()
-        self.links.clear()
+        self.submissions.clear()
+        self.summary.clear()
     
-    def start_collect(self, duration=COLLECT_DURATION):
+    def start_collect(self, duration=COLLECT_DURATION, start_time=None):
         self.active = True
-        self.start_time = time.time()
+        self.start_time = start_time or time.time()
         self.end_time = self.start_time + duration
+        self.board_message_id = None
+        self.board_text = None
         self.reset_collect()
-        logger.info(f"Collect started. End time: {datetime.fromtimestamp(self.end_time).strftime('%H:%M:%S')}")
+        logger.info(f"Collect started in group {self.group_id}. End time: {datetime.fromtimestamp(self.end_time).strftime('%H:%M:%S')}")
+    
+    def cancel_finish_job(self):
+        self.finish_job = cancel_job(self.finish_job)
+    
+    def cancel_board_job(self):
+        self.board_job = cancel_job(self.board_job)
     
     def stop_collect(self):
+        self.cancel_finish_job()
+        self.cancel_board_job()
         if self.active:
             self.last_collect_stats = {
                 "timestamp": time.time(),
-                "user_count": len(self.users),
-                "link_count": len(self.links)
+                "user_count": len(self.submissions.users),
+                "link_count": len(self.submissions)
             }
+            if self.run_id is not None:
+                history.finish_run(
+                    self.run_id,
+                    self.last_collect_stats["timestamp"],
+                    self.last_collect_stats["user_count"],
+                    self.last_collect_stats["link_count"]
+                )
         self.active = False
     
     def get_remaining_time(self):
@@ -106,63 +262,443 @@ class BotState:
         return remaining
     
     def get_progress_percentage(self):
-        return min(100, (len(self.users) / MAX_USERS) * 100) if MAX_USERS > 0 else 0
+        return min(100, (len(self.submissions.users) / MAX_USERS) * 100) if MAX_USERS > 0 else 0
+
+class SessionRegistry:
+    """BotState của từng group, tra cứu O(1) theo chat id"""
+    def __init__(self, idle_ttl=SESSION_IDLE_TTL):
+        self._sessions = {}
+        # Group bị xoá khỏi bộ nhớ vẫn giữ dict đã lưu (đăng ký, thống kê lần
+        # trước) để ghi lại vào state file và nạp lại khi group dùng tới
+        self._evicted = {}
+        self.idle_ttl = idle_ttl
+        self.bot_start_time = time.time()
+    
+    def __len__(self):
+        return len(self._sessions)
+    
+    def __iter__(self):
+        return iter(list(self._sessions.values()))
+    
+    def _restore(self, chat_id):
+        data = self._evicted.pop(chat_id, None)
+        if data is None:
+            return None
+        state = BotState()
+        state.from_dict(data)
+        self._sessions[chat_id] = state
+        logger.debug(f"Group restored from evicted state: {chat_id}")
+        return state
+    
+    def get(self, chat_id):
+        """Return the group's session, or None if the group is not registered"""
+        state = self._sessions.get(chat_id) or self._restore(chat_id)
+        if state is not None:
+            state.touch()
+        return state
+    
+    def get_or_create(self, chat_id):
+        state = self._sessions.get(chat_id) or self._restore(chat_id)
+        if state is None:
+            state = BotState(chat_id)
+            self._sessions[chat_id] = state
+            logger.info(f"Group registered: {chat_id}")
+        state.touch()
+        return state
+    
+    def is_active(self, chat_id):
+        """True if the group has a collect running; does not count as using the group"""
+        state = self._sessions.get(chat_id)
+        return state is not None and state.active
+    
+    def group_ids(self):
+        """Every registered group, evicted ones included"""
+        return list(self._sessions) + list(self._evicted)
+    
+    def active_sessions(self):
+        return [s for s in self._sessions.values() if s.active]
+    
+    def evict_idle(self, now=None):
+        """Drop idle sessions from memory, return number of evicted groups.
+
+        Only the BotState is freed: the persisted dict is kept, so the group
+        stays in the state file and comes back on its next get().
+        """
+        now = now or time.time()
+        idle = [cid for cid, s in self._sessions.items() if s.is_idle(now, self.idle_ttl)]
+        for cid in idle:
+            self._evicted[cid] = self._sessions.pop(cid).to_dict()
+        return len(idle)
     
     def get_bot_uptime(self):
         return int(time.time() - self.bot_start_time)
     
-    def should_finish(self):
-        """Check if collect should finish"""
-        if not self.active:
-            return False
-        
-        current_time = time.time()
-        
-        # Check time limit
-        if current_time >= self.end_time:
-            logger.info("Time limit reached - should finish")
-            return True
-        
-        # Check user limit
-        if len(self.users) >= MAX_USERS:
-            logger.info(f"User limit reached ({len(self.users)}/{MAX_USERS}) - should finish")
-            return True
-        
-        return False
+    def group_dicts(self, group_ids=None):
+        """Persisted dicts of the given groups (default: all), evicted ones included"""
+        if group_ids is None:
+            return [s.to_dict() for s in self._sessions.values()] + list(self._evicted.values())
+        dicts = []
+        for group_id in group_ids:
+            state = self._sessions.get(group_id)
+            data = state.to_dict() if state is not None else self._evicted.get(group_id)
+            if data is not None:
+                dicts.append(data)
+        return dicts
+    
+    def to_dict(self):
+        return {
+            "groups": self.group_dicts(),
+            "bot_start_time": self.bot_start_time
+        }
+    
+    def from_dict(self, data):
+        self._sessions.clear()
+        self._evicted.clear()
+        # File cũ chỉ có một group ở top-level
+        groups = data.get("groups")
+        if groups is None:
+            groups = [data] if data.get("group_id") is not None else []
+        for group in groups:
+            state = BotState()
+            state.from_dict(group)
+            self._sessions[state.group_id] = state
+        self.bot_start_time = data.get("bot_start_time", time.time())
 
 # ================= GLOBALS =================
-session = BotState()
-user_cooldown = defaultdict(lambda: datetime.min)
+sessions = SessionRegistry()
+user_cooldown = CooldownTracker(USER_COOLDOWN)
+history = CollectHistory(HISTORY_DB, HISTORY_FLUSH_INTERVAL)
+outbox = Outbox(global_rate=GLOBAL_RATE / max(WORKERS, 1))  # giới hạn toàn bot chia đều cho các worker
+seen_tweets = SeenTweets(SEEN_DAYS, SEEN_CAPACITY_PER_DAY, SEEN_ERROR_RATE)  # ~790 KB với cấu hình trên
+# ==========================================
+
+# ================= ENRICHMENT ==============
+def on_tweet_info(info, handle):
+    if info.deleted:
+        logger.warning(f"Tweet {info.status_id} (submitted as @{handle}) does not exist or was deleted")
+    elif info.author and handle and info.author != handle:
+        logger.info(f"Tweet {info.status_id} was submitted as @{handle} but is by @{info.author}")
+
+enricher = TweetEnricher(
+    ENRICH_URL,
+    workers=ENRICH_WORKERS,
+    queue_size=ENRICH_QUEUE_SIZE,
+    timeout=ENRICH_TIMEOUT,
+    cache_size=ENRICH_CACHE_SIZE,
+    cache_ttl=ENRICH_CACHE_TTL,
+    on_result=on_tweet_info
+)
+# ==========================================
+
+# ================= METRICS =================
+HANDLER_SECONDS = REGISTRY.histogram("bot_handler_seconds", "Time spent in a handler", ["handler"])
+SUBMISSIONS = REGISTRY.counter(
+    "bot_link_submissions_total", "Messages seen by collect_link during a collect, by result", ["result"]
+)
+# Lấy sẵn child để đường nóng chỉ còn một phép cộng
+SUBMIT_ACCEPTED = SUBMISSIONS.labels("accepted")
+SUBMIT_COOLDOWN = SUBMISSIONS.labels("cooldown")
+SUBMIT_NO_LINK = SUBMISSIONS.labels("no_link")
+SUBMIT_DUPLICATE_USER = SUBMISSIONS.labels("duplicate_user")
+SUBMIT_DUPLICATE_TWEET = SUBMISSIONS.labels("duplicate_tweet")
+SUBMIT_SEEN_BEFORE = SUBMISSIONS.labels("seen_before")
+STATE_SAVE_SECONDS = REGISTRY.histogram("bot_state_save_seconds", "Time to write the state file")
+# Các giá trị dưới đây chỉ được đọc khi scrape
+REGISTRY.callback(
+    "bot_api_calls_total", "Bot API calls made through the outbox", lambda: dict(outbox.calls),
+    ["method"], "counter"
+)
+REGISTRY.callback(
+    "bot_api_failures_total", "Failed Bot API calls, retries included", lambda: dict(outbox.failures),
+    ["method"], "counter"
+)
+REGISTRY.callback("bot_outbox_pending", "Calls queued or in flight", lambda: len(outbox))
+REGISTRY.callback("bot_active_collects", "Groups with a running collect", lambda: len(sessions.active_sessions()))
+REGISTRY.callback("bot_groups", "Groups kept in memory", lambda: len(sessions))
+REGISTRY.callback("bot_cooldown_users", "Users currently on cooldown", lambda: len(user_cooldown))
+REGISTRY.callback(
+    "bot_enrich_lookups_total", "Tweet lookups, by result", lambda: dict(enricher.results),
+    ["result"], "counter"
+)
+REGISTRY.callback("bot_seen_tweets_bytes", "Memory used by the seen-tweets filter", lambda: seen_tweets.nbytes)
+REGISTRY.callback(
+    "bot_seen_tweets_filters", "Bloom filters in the seen-tweets window, above SEEN_DAYS when a day overflowed",
+    lambda: seen_tweets.filters
+)
+REGISTRY.callback("bot_enrich_pending", "Tweet lookups queued or in flight", lambda: len(enricher))
+metrics_server = MetricsServer(REGISTRY, METRICS_LISTEN, METRICS_PORT or 0)
+
+def timed(func):
+    """Record the handler's run time in bot_handler_seconds and tag its log lines"""
+    histogram = HANDLER_SECONDS.labels(func.__name__)
+    
+    name = func.__name__
+    
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        update = args[0] if args and isinstance(args[0], Update) else None
+        if update is not None:
+            token = bind_log_context(
+                handler=name,
+                chat_id=update.effective_chat.id if update.effective_chat else None,
+                user_id=update.effective_user.id if update.effective_user else None
+            )
+        else:
+            token = bind_log_context(handler=name)
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            histogram.observe(time.perf_counter() - started)
+            reset_log_context(token)
+    return wrapper
 # ==========================================
 
 # ================= STORAGE =================
-def save_state():
-    try:
-        with open(STATE_FILE, "w", encoding='utf-8') as f:
-            json.dump(session.to_dict(), f, indent=2)
+class StateStore:
+    """Gom các thay đổi state thành một lần ghi, ghi atomic ngoài event loop.
+
+    Each group is encoded to JSON on its own and the text is kept, so a
+    write only re-encodes the groups marked since the last one. The event
+    loop just takes their dicts; encoding and the write run in a thread.
+    """
+    def __init__(self, path, registry, delay=STATE_SAVE_DELAY):
+        self.path = path
+        self.registry = registry
+        self.delay = delay
+        self.dirty = False
+        self.taken = 0  # số snapshot đã chụp
+        self.written = 0  # snapshot mới nhất đã ghi xong
+        self.on_written = None  # gọi sau mỗi lần ghi thành công
+        self._changed = set()  # group đã đổi từ lần chụp trước
+        self._changed_all = True  # chụp lại mọi group (lần đầu, sau lỗi, thay đổi không rõ group)
+        self._encoded = {}  # group_id -> JSON đã ghi
+        self._task = None
+        self._lock = asyncio.Lock()
+    
+    def invalidate(self, group_id=None):
+        """Record a change of one group (None: of anything) without scheduling a write"""
+        if group_id is None:
+            self._changed_all = True
+        else:
+            self._changed.add(group_id)
+        self.dirty = True
+    
+    def mark_dirty(self, group_id=None):
+        self.invalidate(group_id)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Chưa có event loop (lúc khởi động), ghi luôn
+            self.flush_sync()
+            return
+        
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._flush_later(), context=contextvars.Context())
+    
+    async def _flush_later(self):
+        # save_state() trong lúc đang ghi thấy task này chưa xong nên không tạo task mới,
+        # và ghi lỗi thì phải thử lại: còn dirty thì ghi thêm lần nữa
+        while True:
+            await asyncio.sleep(self.delay)
+            await self.flush()
+            if not self.dirty:
+                return
+    
+    async def flush(self):
+        """Write pending changes, if any"""
+        async with self._lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            self.taken += 1
+            generation = self.taken
+            # Chụp dict trên event loop để có snapshot nhất quán, encode ở thread
+            snapshot = self._snapshot()
+            try:
+                started = time.perf_counter()
+                await asyncio.to_thread(self._save, snapshot)
+                STATE_SAVE_SECONDS.observe(time.perf_counter() - started)
+                self._mark_written(generation)
+            except Exception as e:
+                self._failed(e)
+    
+    def flush_sync(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        self.taken += 1
+        generation = self.taken
+        try:
+            started = time.perf_counter()
+            self._save(self._snapshot())
+            STATE_SAVE_SECONDS.observe(time.perf_counter() - started)
+            self._mark_written(generation)
+        except Exception as e:
+            self._failed(e)
+    
+    def _failed(self, error):
+        self.dirty = True
+        self._changed_all = True
+        logger.error(f"Failed to save state: {error}")
+    
+    def _mark_written(self, generation):
+        self.written = generation
         logger.debug("State saved successfully")
-    except Exception as e:
-        logger.error(f"Failed to save state: {e}")
+        if self.on_written is not None:
+            self.on_written()
+    
+    async def close(self):
+        """Cancel the pending delayed write and flush now"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        await self.flush()
+    
+    def _snapshot(self):
+        """Dicts of the changed groups (all of them after invalidate(None)); on the event loop"""
+        full = self._changed_all
+        groups = self.registry.group_dicts(None if full else self._changed)
+        self._changed_all = False
+        self._changed = set()
+        return full, groups, self.registry.bot_start_time
+    
+    def _save(self, snapshot):
+        self._write(self._serialize(snapshot))
+    
+    def _serialize(self, snapshot):
+        full, groups, bot_start_time = snapshot
+        if full:
+            self._encoded = {}
+        for group in groups:
+            self._encoded[group["group_id"]] = json.dumps(group)
+        return (
+            f'{{"groups": [{", ".join(self._encoded.values())}], '
+            f'"bot_start_time": {json.dumps(bot_start_time)}}}'
+        )
+    
+    def _write(self, data):
+        # Ghi file tạm rồi rename để crash giữa chừng không làm hỏng file
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".bot_state.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding='utf-8') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+class GroupStateStore(StateStore):
+    """Worker mode: write this worker's changed groups as rows of the shared STATE_DB"""
+    def __init__(self, db, registry, delay=STATE_SAVE_DELAY):
+        super().__init__(db.path, registry, delay)
+        self.db = db
+    
+    def _serialize(self, snapshot):
+        _, groups, _ = snapshot
+        return [(group["group_id"], json.dumps(group)) for group in groups]
+    
+    def _write(self, data):
+        self.db.write(data)
+
+if WORKER_INDEX is None:
+    state_store = StateStore(STATE_FILE, sessions)
+else:
+    state_store = GroupStateStore(GroupStateDB(STATE_DB), sessions)
+
+def save_state(session=None):
+    """Mark state dirty (only session's group if given); the write happens later, off the event loop"""
+    state_store.mark_dirty(session.group_id if session is not None else None)
 
 def load_state():
     try:
-        if os.path.exists(STATE_FILE):
+        if WORKER_INDEX is not None:
+            groups = state_store.db.load(WORKERS, WORKER_INDEX)
+            sessions.from_dict({"groups": groups})
+            logger.info(f"State loaded: {len(groups)} groups of worker {WORKER_INDEX}/{WORKERS}")
+        elif os.path.exists(STATE_FILE):
             with open(STATE_FILE, "r", encoding='utf-8') as f:
                 data = json.load(f)
-                session.from_dict(data)
+                sessions.from_dict(data)
             logger.info("State loaded successfully")
         else:
             logger.info("No state file found, starting fresh")
     except Exception as e:
         logger.error(f"Failed to load state: {e}")
+
+seen_saved_count = 0  # seen_tweets.added lúc ghi file gần nhất
+
+async def save_seen_tweets():
+    """Write the seen-tweets filter if links were added since the last write"""
+    global seen_saved_count
+    if not SEEN_DEDUPE or seen_tweets.added == seen_saved_count:
+        return
+    added = seen_tweets.added
+    # Chụp bytes trên event loop, ghi file ở thread
+    data = seen_tweets.to_bytes()
+    try:
+        await asyncio.to_thread(seen_tweets.save, SEEN_FILE, data)
+        seen_saved_count = added
+        logger.debug(f"Seen tweets saved ({len(data)} bytes)")
+    except Exception as e:
+        logger.error(f"Failed to save seen tweets: {e}")
+
+def load_seen_tweets():
+    if not SEEN_DEDUPE or not os.path.exists(SEEN_FILE):
+        return
+    try:
+        seen_tweets.load(SEEN_FILE)
+        logger.info(
+            f"Seen tweets loaded: last {SEEN_DAYS} days, {seen_tweets.filters} filters, {seen_tweets.nbytes // 1024} KB"
+        )
+    except Exception as e:
+        # Sai cấu hình hoặc file hỏng: bắt đầu lại từ đầu, chỉ mất khả năng chặn tweet cũ
+        logger.error(f"Failed to load seen tweets, starting empty: {e}")
 # ==========================================
 
 # ================= HELPERS =================
 def is_owner(update: Update) -> bool:
     return update.effective_user.id == OWNER_ID
 
-def is_valid_group(update: Update) -> bool:
-    return session.group_id is None or update.effective_chat.id == session.group_id
+def resolve_session(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Session cho lệnh admin: group hiện tại, tham số <chat_id>, hoặc group duy nhất"""
+    session = sessions.get(update.effective_chat.id)
+    if session is not None:
+        return session
+    
+    if context.args:
+        try:
+            return sessions.get(int(context.args[0]))
+        except ValueError:
+            return None
+    
+    group_ids = sessions.group_ids()
+    if len(group_ids) == 1:
+        return sessions.get(group_ids[0])
+    return None
+
+def reply(update: Update, text: str, priority: int = PRIORITY_REPLY, **kwargs):
+    """Queue a reply to the update's message, returns a future with the sent message"""
+    return outbox.submit(
+        update.effective_chat.id, update.message.reply_text, text, priority=priority, **kwargs
+    )
+
+def reply_markdown(update: Update, text: str, priority: int = PRIORITY_REPLY):
+    """Queue a MarkdownV2 reply, validated locally so it is sent exactly once"""
+    text, parse_mode = prepare_markdown(text)
+    return reply(update, text, priority=priority, parse_mode=parse_mode)
+
+def send_markdown(context: ContextTypes.DEFAULT_TYPE, chat_id: int, text: str, priority: int = PRIORITY_NORMAL, **kwargs):
+    text, parse_mode = prepare_markdown(text)
+    return outbox.submit(
+        chat_id, context.bot.send_message, chat_id, text,
+        parse_mode=parse_mode, priority=priority, **kwargs
+    )
+
+def notify_owner(context: ContextTypes.DEFAULT_TYPE, text: str):
+    return outbox.submit(OWNER_ID, context.bot.send_message, OWNER_ID, text)
 
 def create_progress_bar(percentage, length=10):
     filled = int(percentage / 100 * length)
@@ -180,65 +716,130 @@ def format_time(seconds):
     else:
         return f"{secs}s"
 
-def escape_markdown(text: str) -> str:
-    """Escape special Markdown characters"""
-    escape_chars = r'_*[]()~`>#+-=|{}.!'
-    for char in escape_chars:
-        text = text.replace(char, f'\\{char}')
-    return text
+SUMMARY_HEADER = Template(
+    "📊 **KẾT QUẢ COLLECT**\n\n"
+    "👥 Số người tham gia: {user_count}\n"
+    "📎 Số link thu được: {link_count}\n\n"
+    "**DANH SÁCH LINK:**\n\n"
+)
+SUMMARY_HEADER_RESERVE = telegram_length(SUMMARY_HEADER.render(user_count=10**9, link_count=10**9))
+SUMMARY_CONTINUATION = Template("**TIẾP THEO...**\n\n").render()
+
+def summary_header(user_count, link_count):
+    return SUMMARY_HEADER.render(user_count=user_count, link_count=link_count)
+
+def summary_pages(session: BotState) -> list:
+    """Result pages: entries rendered now and joined at the page breaks found while collecting"""
+    entries = [escape_markdown(entry) for entry in session.submissions.entries()]
+    header = summary_header(len(session.submissions.users), len(session.submissions))
+    return session.summary.pages(header, entries)
 # ==========================================
 
 # ================= BACKGROUND TASK =========
-async def background_checker(context: ContextTypes.DEFAULT_TYPE):
-    """Background task to check if collect should finish"""
-    while True:
-        try:
-            if session.active and session.should_finish():
-                logger.info("Background checker triggered finish_collect")
-                await finish_collect(context)
-                break
-            
-            # Check every 10 seconds
-            await asyncio.sleep(10)
-            
-        except Exception as e:
-            logger.error(f"Error in background checker: {e}")
-            await asyncio.sleep(30)
+def schedule_finish(job_queue, session: BotState):
+    """Schedule finish_collect exactly at end_time on the shared job queue"""
+    session.cancel_finish_job()
+    # Hết giờ trong lúc bot tắt: kết thúc ngay (ngày giờ quá khứ sẽ bị APScheduler bỏ qua)
+    when = datetime.fromtimestamp(session.end_time, tz=TIMEZONE) if session.end_time > time.time() else 0
+    session.finish_job = job_queue.run_once(
+        finish_collect_job,
+        when=when,
+        chat_id=session.group_id,
+        name=f"finish_collect_{session.group_id}"
+    )
+
+async def finish_collect_job(context: ContextTypes.DEFAULT_TYPE):
+    session = sessions.get(context.job.chat_id)
+    if session is None or session.finish_job is not context.job:
+        return
+    
+    session.finish_job = None  # Job đang chạy, không cần huỷ nữa
+    logger.info(f"Deadline reached in group {session.group_id}, triggering finish_collect")
+    await finish_collect(context, session)
+
+def schedule_board_update(context: ContextTypes.DEFAULT_TYPE, session: BotState):
+    """Debounce live board edits: at most one edit every BOARD_EDIT_INTERVAL"""
+    if session.board_job is not None or session.board_message_id is None:
+        return
+    delay = max(0, session.board_edited_at + BOARD_EDIT_INTERVAL - time.time())
+    session.board_job = context.job_queue.run_once(
+        update_board_job,
+        when=delay,
+        chat_id=session.group_id,
+        name=f"live_board_{session.group_id}"
+    )
+
+async def update_board_job(context: ContextTypes.DEFAULT_TYPE):
+    session = sessions.get(context.job.chat_id)
+    if session is None or session.board_job is not context.job:
+        return
+    
+    session.board_job = None
+    if not session.active:
+        return
+    
+    text = render_board(session)
+    if text == session.board_text:
+        return  # Telegram báo lỗi nếu nội dung không đổi
+    session.board_text = text
+    session.board_edited_at = time.time()
+    text, parse_mode = prepare_markdown(text)
+    outbox.submit(
+        session.group_id, context.bot.edit_message_text,
+        text,
+        chat_id=session.group_id,
+        message_id=session.board_message_id,
+        parse_mode=parse_mode,
+        priority=PRIORITY_NORMAL
+    )
+
+async def evict_idle_sessions(context: ContextTypes.DEFAULT_TYPE):
+    """Periodic job: drop sessions of idle groups from memory"""
+    evicted = sessions.evict_idle()
+    if evicted:
+        logger.info(f"Evicted {evicted} idle sessions, {len(sessions)} remaining")
+
+async def save_seen_tweets_job(context: ContextTypes.DEFAULT_TYPE):
+    await save_seen_tweets()
 # ==========================================
 
 # ================= /start ==================
+START_TEXT = Template(
+    "🤖 **Bot Collect Link Tweet**\n\n"
+    "📌 Thu thập link tweet trong group\n"
+    "⏱ Chạy thủ công hoặc tự động theo giờ\n\n"
+    "📊 **Lệnh công khai:**\n"
+    "/status – xem trạng thái\n"
+    "/leaderboard [links|runs|streak] – bảng xếp hạng\n"
+    "/mystats – thống kê của bạn\n"
+    "/help – hướng dẫn sử dụng\n"
+).render()
+
+START_ADMIN_TEXT = Template(
+    "\n👑 **Lệnh Admin:**\n"
+    "/startcollect – bắt đầu collect\n"
+    "/stopcollect – dừng collect\n"
+    "/autocollect HH:MM [weekdays] – thêm auto collect\n"
+    "/autocollect remove HH:MM – xóa auto collect\n"
+    "/autocollect off – tắt tất cả auto\n"
+    "/stats – thống kê\n"
+    "/broadcast – gửi thông báo\n"
+    "/export [txt|csv|jsonl] [gz] – xuất links\n"
+).render()
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        msg = (
-            "🤖 **Bot Collect Link Tweet**\n\n"
-            "📌 Thu thập link tweet trong group\n"
-            "⏱ Chạy thủ công hoặc tự động theo giờ\n\n"
-            "📊 **Lệnh công khai:**\n"
-            "/status – xem trạng thái\n"
-            "/help – hướng dẫn sử dụng\n"
-        )
-
+        msg = START_TEXT
         if is_owner(update):
-            msg += (
-                "\n👑 **Lệnh Admin:**\n"
-                "/startcollect – bắt đầu collect\n"
-                "/stopcollect – dừng collect\n"
-                "/autocollect HH:MM – thêm auto collect\n"
-                "/autocollect remove HH:MM – xóa auto collect\n"
-                "/autocollect off – tắt tất cả auto\n"
-                "/stats – thống kê\n"
-                "/broadcast – gửi thông báo\n"
-                "/export – xuất links\n"
-            )
+            msg += START_ADMIN_TEXT
 
-        await update.message.reply_text(msg, parse_mode='Markdown')
+        reply_markdown(update, msg)
         logger.info(f"Start command from {update.effective_user.id}")
     except Exception as e:
         logger.error(f"Error in start command: {e}")
 
 # ================= /help ===================
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    help_text = """
+HELP_TEXT = Template("""
 📖 **HƯỚNG DẪN SỬ DỤNG**
 
 **1. Gửi link tweet:**
@@ -248,6 +849,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 **2. Lệnh công khai:**
    /status - Xem trạng thái collect hiện tại
+   /leaderboard - Bảng xếp hạng người tham gia
+   /mystats - Thống kê của bạn (trả lời tin của ai để xem người đó)
 
 **3. Admin commands:**
    Xem /start để biết đầy đủ lệnh admin
@@ -256,461 +859,540 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 - Bot chỉ hoạt động trong group được set
 - Collect tự động kết thúc sau 1 giờ hoặc khi đủ 20 người
 - Kết quả sẽ tự động được gửi và ghim sau khi kết thúc
-"""
-    await update.message.reply_text(help_text)
+""").render()
+
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    reply_markdown(update, HELP_TEXT)
 
 # ================= CORE START ==============
-async def start_collect_core(context: ContextTypes.DEFAULT_TYPE):
+BOARD_TEMPLATE = Template(
+    "🚀 **BẮT ĐẦU COLLECT LINK TWEET**\n\n"
+    "⏱ Thời gian: {hours} giờ (kết thúc lúc {end_time})\n"
+    "👥 Số người tối đa: {max_users}\n"
+    "📎 Gửi link tweet hợp lệ!\n"
+    "📊 /status – Xem trạng thái\n"
+    "⏳ Cooldown: {cooldown}s giữa các lần gửi\n\n"
+    "✅ Tự động tổng hợp sau {hours}h hoặc khi đủ {max_users} người"
+)
+BOARD_PROGRESS_TEMPLATE = Template(
+    "\n\n📊 Tiến độ: {user_count}/{max_users}\n"
+    "{progress_bar} {progress:.0f}%"
+)
+BOARD_RECENT_TEMPLATE = Template("\n\n🆕 Mới nhất:\n{recent}")
+
+def render_board(session: BotState) -> str:
+    """Tin bắt đầu collect; ở chế độ LIVE_BOARD kèm tiến độ và người gửi gần nhất"""
+    text = BOARD_TEMPLATE.render(
+        hours=COLLECT_DURATION // 3600,
+        end_time=datetime.fromtimestamp(session.end_time).strftime('%H:%M:%S'),
+        max_users=MAX_USERS,
+        cooldown=USER_COOLDOWN
+    )
+    if not LIVE_BOARD:
+        return text
+    
+    progress = session.get_progress_percentage()
+    text += BOARD_PROGRESS_TEMPLATE.render(
+        user_count=len(session.submissions.users),
+        max_users=MAX_USERS,
+        progress_bar=create_progress_bar(progress),
+        progress=progress
+    )
+    recent = session.submissions.recent(BOARD_RECENT)
+    if recent:
+        text += BOARD_RECENT_TEMPLATE.render(
+            recent="\n".join(f"{item.position}. {item.name}" for item in recent)
+        )
+    return text
+
+async def start_collect_core(context: ContextTypes.DEFAULT_TYPE, chat_id: int):
+    session = sessions.get(chat_id)
     try:
-        if session.active:
-            logger.warning("Collect already active")
-            return
-        
-        if not session.group_id:
-            logger.warning("No group set")
+        if session is None:
+            logger.warning(f"Group {chat_id} is not registered")
             return
         
-        session.start_collect()
-        
-        end_time_str = datetime.fromtimestamp(session.end_time).strftime('%H:%M:%S')
-        
-        msg = await context.bot.send_message(
-            chat_id=session.group_id,
-            text=(
-                "🚀 **BẮT ĐẦU COLLECT LINK TWEET**\n\n"
-                f"⏱ Thời gian: {COLLECT_DURATION//3600} giờ (kết thúc lúc {end_time_str})\n"
-                f"👥 Số người tối đa: {MAX_USERS}\n"
-                f"📎 Gửi link tweet hợp lệ!\n"
-                f"📊 /status – Xem trạng thái\n"
-                f"⏳ Cooldown: {USER_COOLDOWN}s giữa các lần gửi\n\n"
-                f"✅ Tự động tổng hợp sau {COLLECT_DURATION//3600}h hoặc khi đủ {MAX_USERS} người"
-            ),
-            parse_mode='Markdown'
-        )
-        
-        try:
-            await context.bot.pin_chat_message(session.group_id, msg.message_id)
-            session.pinned_message_id = msg.message_id
-            logger.info(f"Message pinned: {msg.message_id}")
-        except Exception as e:
-            logger.error(f"Failed to pin message: {e}")
-            # Notify owner about pin error
+        async with session.lock:
+            if session.active:
+                logger.warning(f"Collect already active in group {chat_id}")
+                return
+            
+            # Tạo run trong lịch sử trước khi mở collect, để link đầu tiên đã có run_id
+            start_time = time.time()
             try:
-                await context.bot.send_message(
-                    OWNER_ID,
+                run_id = await history.start_run(session.group_id, start_time, start_time + COLLECT_DURATION)
+            except Exception as e:
+                run_id = None
+                logger.error(f"Failed to record collect run: {e}")
+            
+            session.start_collect(start_time=start_time)
+            session.run_id = run_id
+            schedule_finish(context.job_queue, session)
+            
+            end_time_str = datetime.fromtimestamp(session.end_time).strftime('%H:%M:%S')
+            
+            session.board_text = render_board(session)
+            msg = await send_markdown(context, session.group_id, session.board_text)
+            session.board_message_id = msg.message_id
+            session.board_edited_at = time.time()
+            
+            try:
+                await outbox.submit(
+                    session.group_id, context.bot.pin_chat_message,
+                    session.group_id, msg.message_id, priority=PRIORITY_RESULT
+                )
+                session.pinned_message_id = msg.message_id
+                logger.info(f"Message pinned: {msg.message_id}")
+            except Exception as e:
+                logger.error(f"Failed to pin message: {e}")
+                # Notify owner about pin error
+                notify_owner(
+                    context,
                     f"⚠️ Không thể ghim tin nhắn trong group {session.group_id}\n"
                     f"Lỗi: {e}\n"
                     f"Có thể bot cần quyền 'Ghim tin nhắn'."
                 )
-            except:
-                pass
-        
-        # Start background checker
-        asyncio.create_task(background_checker(context))
-        
-        logger.info(f"Collect started in group {session.group_id}. Will finish at {end_time_str}")
+            
+            save_state(session)
+            logger.info(f"Collect started in group {session.group_id}. Will finish at {end_time_str}")
         
     except Exception as e:
         logger.error(f"Error in start_collect_core: {e}")
         # Notify owner about error
-        try:
-            await context.bot.send_message(
-                OWNER_ID,
-                f"❌ Lỗi khi bắt đầu collect: {e}"
-            )
-        except:
-            pass
+        notify_owner(context, f"❌ Lỗi khi bắt đầu collect: {e}")
 
 # ================= /startcollect ===========
 async def startcollect(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_owner(update):
         return
     
-    if session.group_id is None:
-        session.group_id = update.effective_chat.id
-        save_state()
-        logger.info(f"Group set to: {session.group_id}")
-    
-    if not is_valid_group(update):
-        await update.message.reply_text("❌ Bot chỉ hoạt động trong group đã được set")
+    if update.effective_chat.type not in ["group", "supergroup"]:
+        reply(update, "⚠️ Lệnh này chỉ dùng trong group")
         return
     
+    chat_id = update.effective_chat.id
+    if sessions.get(chat_id) is None:
+        save_state(sessions.get_or_create(chat_id))
+    session = sessions.get(chat_id)
+    
     if session.active:
-        await update.message.reply_text("⚠️ Đã có collect đang chạy")
+        reply(update, "⚠️ Đã có collect đang chạy")
         return
     
-    await start_collect_core(context)
-    await update.message.reply_text("✅ Collect đã bắt đầu!")
+    await start_collect_core(context, chat_id)
+    reply(update, "✅ Collect đã bắt đầu!")
 
 # ================= /stopcollect ============
 async def stopcollect(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_owner(update):
         return
     
-    if not session.active:
-        await update.message.reply_text("⚠️ Không có collect đang chạy.")
+    session = sessions.get(update.effective_chat.id)
+    if session is None or not session.active:
+        reply(update, "⚠️ Không có collect đang chạy.")
         return
     
-    # Unpin message trước khi dừng
-    if session.pinned_message_id:
-        try:
-            await context.bot.unpin_chat_message(
-                session.group_id,
-                session.pinned_message_id
-            )
-            logger.info(f"Unpinned message: {session.pinned_message_id}")
-        except Exception as e:
-            logger.error(f"Failed to unpin message: {e}")
-    
+    # Dừng trước await đầu tiên để không link nào lọt vào nữa
     session.stop_collect()
+    save_state(session)  # Bỏ collect khỏi state file, restart không chạy tiếp collect đã dừng
+    
+    async with session.lock:
+        # Đọc trong lock: auto collect có thể vẫn đang gửi và ghim tin bắt đầu,
+        # đọc trước đó sẽ gỡ ghim tin của lần collect trước
+        pinned_message_id = session.pinned_message_id
+        if pinned_message_id:
+            try:
+                await outbox.submit(
+                    session.group_id, context.bot.unpin_chat_message,
+                    session.group_id, pinned_message_id, priority=PRIORITY_RESULT
+                )
+                logger.info(f"Unpinned message: {pinned_message_id}")
+            except Exception as e:
+                logger.error(f"Failed to unpin message: {e}")
     
-    await context.bot.send_message(
-        session.group_id,
-        "⛔ Collect đã bị dừng bởi admin"
+    outbox.submit(
+        session.group_id, context.bot.send_message,
+        session.group_id, "⛔ Collect đã bị dừng bởi admin"
     )
-    await update.message.reply_text("✅ Collect đã dừng")
-    logger.info("Collect stopped by admin")
+    reply(update, "✅ Collect đã dừng")
+    logger.info(f"Collect stopped by admin in group {session.group_id}")
 
 # ================= /autocollect ============
+AUTOCOLLECT_USAGE_TEXT = Template(
+    "❌ **Sai cú pháp**\n\n"
+    "✅ /autocollect HH:MM [ngày]\n"
+    "🗑 /autocollect remove HH:MM\n"
+    "🛑 /autocollect off\n"
+    "📋 /autocollect list\n\n"
+    "📆 Ngày: daily (mặc định), weekdays, weekends, mon,wed,fri, t2-t6..."
+).render()
+AUTOCOLLECT_LIST_TEMPLATE = Template("📅 **LỊCH AUTO COLLECT**\n\n{times_list}\n\n⏰ Lần tới: {next_time}")
+
+def format_schedule(session: BotState) -> str:
+    return "\n".join(f"• {entry.time_str} – {format_days(entry.days)}" for entry in session.schedule)
+
+def format_next_auto(session: BotState) -> str:
+    next_run = session.schedule.next_run(datetime.now(TIMEZONE), TIMEZONE)
+    return next_run.strftime('%H:%M %d/%m') if next_run else "N/A"
+
 async def autocollect(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_owner(update):
         return
     
-    if session.group_id is None:
-        session.group_id = update.effective_chat.id
+    if update.effective_chat.type not in ["group", "supergroup"]:
+        reply(update, "⚠️ Lệnh này chỉ dùng trong group")
+        return
+    
+    session = sessions.get_or_create(update.effective_chat.id)
     
     text = update.message.text or ""
     args = text.split()[1:]
     
     if not args:
-        await update.message.reply_text(
-            "❌ **Sai cú pháp**\n\n"
-            "✅ /autocollect HH:MM\n"
-            "🗑 /autocollect remove HH:MM\n"
-            "🛑 /autocollect off\n"
-            "📋 /autocollect list",
-            parse_mode='Markdown'
-        )
+        reply_markdown(update, AUTOCOLLECT_USAGE_TEXT)
         return
     
     cmd = args[0]
     
     # ------------------ LIST ------------------
     if cmd == "list":
-        if not session.auto_times:
-            await update.message.reply_text("📭 Chưa có lịch auto collect nào")
+        if not session.schedule:
+            reply(update, "📭 Chưa có lịch auto collect nào")
         else:
-            times_list = "\n".join([f"• {t}" for t in session.auto_times])
-            await update.message.reply_text(
-                f"📅 **LỊCH AUTO COLLECT**\n\n{times_list}"
-            )
+            reply_markdown(update, AUTOCOLLECT_LIST_TEMPLATE.render(
+                times_list=format_schedule(session),
+                next_time=format_next_auto(session)
+            ))
         return
     
     # ------------------ OFF ------------------
     if cmd == "off":
-        count = len(session.jobs)
-        for job in session.jobs:
-            job.schedule_removal()
-        session.jobs.clear()
-        session.auto_times.clear()
-        save_state()
+        entries = session.schedule.clear()
+        for entry in entries:
+            entry.job = cancel_job(entry.job)
+        save_state(session)
         
-        await update.message.reply_text(f"🛑 Đã tắt {count} auto collect")
-        logger.info(f"All auto collects disabled: {count} jobs removed")
+        reply(update, f"🛑 Đã tắt {len(entries)} auto collect")
+        logger.info(f"All auto collects disabled: {len(entries)} jobs removed")
         return
     
     # ------------------ REMOVE ------------------
     if cmd == "remove" and len(args) == 2:
-        time_str = args[1]
-        if time_str not in session.auto_times:
-            await update.message.reply_text("⚠️ Không tìm thấy giờ này")
+        try:
+            minute = parse_time(args[1])
+        except ValueError:
+            reply(update, "❌ Sai định dạng HH:MM (ví dụ: 08:30)")
             return
         
-        try:
-            index = session.auto_times.index(time_str)
-            if index < len(session.jobs):
-                session.jobs[index].schedule_removal()
-            session.jobs.pop(index)
-            session.auto_times.pop(index)
-            save_state()
-            
-            await update.message.reply_text(f"🗑 Đã xoá auto collect lúc {time_str}")
-            logger.info(f"Auto collect removed: {time_str}")
-        except Exception as e:
-            logger.error(f"Error removing auto collect: {e}")
-            await update.message.reply_text("❌ Lỗi khi xoá auto collect")
+        entry = session.schedule.remove(minute)
+        if entry is None:
+            reply(update, "⚠️ Không tìm thấy giờ này")
+            return
+        
+        entry.job = cancel_job(entry.job)
+        save_state(session)
+        
+        reply(update, f"🗑 Đã xoá auto collect lúc {entry.time_str}")
+        logger.info(f"Auto collect removed: {entry.time_str} (group {session.group_id})")
         return
     
     # ------------------ ADD ------------------
     try:
-        hour, minute = map(int, cmd.split(":"))
-        if not (0 <= hour <= 23 and 0 <= minute <= 59):
-            raise ValueError
-        time_str = f"{hour:02d}:{minute:02d}"
-    except:
-        await update.message.reply_text("❌ Sai định dạng HH:MM (ví dụ: 08:30)")
+        minute = parse_time(cmd)
+    except ValueError:
+        reply(update, "❌ Sai định dạng HH:MM (ví dụ: 08:30)")
         return
     
-    if time_str in session.auto_times:
-        await update.message.reply_text("⚠️ Giờ này đã tồn tại")
+    try:
+        days = parse_days("".join(args[1:])) if len(args) > 1 else ALL_DAYS
+    except ValueError:
+        reply(update, "❌ Sai ngày (ví dụ: weekdays, weekends, mon,wed,fri, t2-t6)")
         return
     
-    async def auto_collect_job(context: ContextTypes.DEFAULT_TYPE):
-        logger.info(f"Auto collect triggered at {time_str}")
-        await start_collect_core(context)
+    if minute in session.schedule:
+        reply(update, "⚠️ Giờ này đã tồn tại")
+        return
     
     try:
-        job = context.application.job_queue.run_daily(
-            auto_collect_job,
-            time=dtime(hour=hour, minute=minute, tzinfo=TIMEZONE)
-        )
+        entry = session.schedule.add(minute, days)
+        schedule_auto_jobs(context.application.job_queue, session)
+        save_state(session)
         
-        session.jobs.append(job)
-        session.auto_times.append(time_str)
-        save_state()
-        
-        await update.message.reply_text(f"✅ Đã thêm auto collect lúc {time_str}")
-        logger.info(f"Auto collect added: {time_str}")
+        reply(update, f"✅ Đã thêm auto collect lúc {entry.time_str} ({format_days(entry.days)})")
+        logger.info(f"Auto collect added: {entry.label} (group {session.group_id})")
     except Exception as e:
         logger.error(f"Error adding auto collect: {e}")
-        await update.message.reply_text("❌ Lỗi khi thêm auto collect")
+        reply(update, "❌ Lỗi khi thêm auto collect")
+
+# days ở đây đã theo quy ước cron (0 = chủ nhật), xem ScheduleEntry.job_days
+warnings.filterwarnings("ignore", message="Prior to v20.0 the `days` parameter", category=PTBUserWarning)
+
+def schedule_auto_jobs(job_queue, session: BotState):
+    """Create the job_queue jobs missing from the group's schedule, return how many.
+
+    Entries that already have a job are left alone, so this is cheap to call
+    after every change and at startup.
+    """
+    created = 0
+    for entry in session.schedule:
+        if entry.job is not None:
+            continue
+        entry.job = job_queue.run_daily(
+            auto_collect_job,
+            time=dtime(hour=entry.minute // 60, minute=entry.minute % 60, tzinfo=TIMEZONE),
+            days=entry.job_days(),
+            chat_id=session.group_id,
+            data=entry.time_str,
+            name=f"auto_collect_{session.group_id}_{entry.time_str}"
+        )
+        created += 1
+    return created
+
+async def auto_collect_job(context: ContextTypes.DEFAULT_TYPE):
+    logger.info(f"Auto collect triggered at {context.job.data} in group {context.job.chat_id}")
+    await start_collect_core(context, context.job.chat_id)
 
 # ================= COLLECT LINK ============
+CONFIRM_TEMPLATE = Template(
+    "✅ **Đã ghi nhận!**\n\n"
+    "👤 Bạn là người thứ {user_count}\n"
+    "📊 Tiến độ: {user_count}/{max_users}\n"
+    "{progress_bar} {progress:.0f}%"
+)
+
+class CollectingChat(filters.MessageFilter):
+    """Messages from groups with an active collect: one dict lookup"""
+    __slots__ = ()
+    
+    def filter(self, message):
+        return sessions.is_active(message.chat_id)
+
+class HasTweetLink(filters.MessageFilter):
+    """Messages with a url / text_link entity pointing to x.com or twitter.com"""
+    __slots__ = ()
+    
+    def filter(self, message):
+        return has_tweet_entity(message.text, message.entities)
+
+# Xét từ rẻ đến đắt: tin nhắn ở group không collect bị loại trước khi
+# tạo context hay gọi handler, tin không có link tweet bị loại trước regex
+COLLECT_LINK_FILTER = CollectingChat() & filters.TEXT & ~filters.COMMAND & HasTweetLink()
+
 async def collect_link(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        if not session.active:
-            return
-        if update.effective_chat.id != session.group_id:
+        session = sessions.get(update.effective_chat.id)
+        if session is None or not session.active:
             return
         
         user = update.effective_user
-        now = datetime.now()
         
         # Check cooldown
-        if now - user_cooldown[user.id] < timedelta(seconds=USER_COOLDOWN):
-            remaining = USER_COOLDOWN - (now - user_cooldown[user.id]).seconds
-            await update.message.reply_text(
+        remaining = user_cooldown.remaining(user.id)
+        if remaining > 0:
+            SUBMIT_COOLDOWN.inc()
+            remaining = math.ceil(remaining)
+            reply(
+                update,
                 f"⏳ Vui lòng đợi {remaining} giây trước khi gửi link tiếp theo"
             )
             return
         
-        text = update.message.text or ""
-        if not TWEET_REGEX.search(text):
+        tweet = parse_entity_tweet_link(update.message.text, update.message.entities)
+        if tweet is None:
+            SUBMIT_NO_LINK.inc()
             return
         
         # Check if user already submitted
-        if user.id in session.users:
-            await update.message.reply_text("⚠️ Bạn đã gửi link rồi!")
+        if user.id in session.submissions.users:
+            SUBMIT_DUPLICATE_USER.inc()
+            reply(update, "⚠️ Bạn đã gửi link rồi!")
             return
         
-        # Add user and link
-        session.users.add(user.id)
-        user_cooldown[user.id] = now
+        # Check if tweet already submitted (kể cả qua twitter.com, mobile., ?s=20...)
+        if tweet.status_id in session.submissions.status_ids:
+            SUBMIT_DUPLICATE_TWEET.inc()
+            reply(update, "⚠️ Tweet này đã được người khác gửi rồi!")
+            return
+        
+        # Tweet đã được gửi ở các lần collect trước trong group
+        if SEEN_DEDUPE and (session.group_id, tweet.status_id) in seen_tweets:
+            SUBMIT_SEEN_BEFORE.inc()
+            reply(update, f"⚠️ Tweet này đã được gửi trong {SEEN_DAYS} ngày gần đây!")
+            return
         
+        # Add user and link
+        SUBMIT_ACCEPTED.inc()
+        now = time.time()
         name = f"@{user.username}" if user.username else user.first_name
-        # Escape special characters in name
-        escaped_name = escape_markdown(name)
-        session.links.append(f"{len(session.links) + 1}. {escaped_name}\n{text}")
-        
-        # Send confirmation
-        progress = session.get_progress_percentage()
-        progress_bar = create_progress_bar(progress)
-        
-        await update.message.reply_text(
-            f"✅ **Đã ghi nhận!**\n\n"
-            f"👤 Bạn là người thứ {len(session.users)}\n"
-            f"📊 Tiến độ: {len(session.users)}/{MAX_USERS}\n"
-            f"{progress_bar} {progress:.0f}%",
-            parse_mode='Markdown'
-        )
+        position = session.add_submission(user.id, tweet.status_id, name, tweet.handle, now)
+        seen_tweets.add(session.group_id, tweet.status_id)
+        user_cooldown.hit(user.id)
+        
+        save_state(session)
+        if session.run_id is not None:
+            history.record_link(
+                session.run_id, session.group_id, user.id, name,
+                position, tweet.status_id, tweet.url, now
+            )
+            history.record_participation(session.run_id, session.group_id, user.id, name, now)
+        enricher.submit(tweet.status_id, tweet.handle)  # không chờ, bỏ qua nếu tắt
+        
+        if LIVE_BOARD:
+            # Cập nhật bảng ghim thay vì trả lời từng người
+            schedule_board_update(context, session)
+        else:
+            # Send confirmation
+            progress = session.get_progress_percentage()
+            progress_bar = create_progress_bar(progress)
+            
+            reply_markdown(update, CONFIRM_TEMPLATE.render(
+                user_count=len(session.submissions.users),
+                max_users=MAX_USERS,
+                progress_bar=progress_bar,
+                progress=progress
+            ))
         
-        logger.info(f"Link collected from user {user.id} ({name}). Total: {len(session.users)}/{MAX_USERS}")
+        logger.info(f"Link collected from user {user.id} ({name}). Total: {len(session.submissions.users)}/{MAX_USERS}")
         
         # Check if we reached max users
-        if len(session.users) >= MAX_USERS:
-            logger.info(f"Max users reached! Triggering finish_collect")
-            await finish_collect(context)
+        if len(session.submissions.users) >= MAX_USERS:
+            logger.info(f"Max users reached in group {session.group_id}! Triggering finish_collect")
+            await finish_collect(context, session)
         
     except Exception as e:
         logger.error(f"Error in collect_link: {e}")
 
 # ================= FINISH COLLECT ==========
-async def finish_collect(context: ContextTypes.DEFAULT_TYPE):
+EMPTY_SUMMARY_TEXT = Template(
+    "📊 **KẾT QUẢ COLLECT**\n\n"
+    "⛔ Không có link nào được gửi\n"
+    "Có thể do:\n"
+    "• Không có link hợp lệ\n"
+    "• Chưa đủ người tham gia\n"
+    "• Thời gian chưa kết thúc"
+).render()
+
+@timed
+async def finish_collect(context: ContextTypes.DEFAULT_TYPE, session: BotState):
     try:
         if not session.active:
-            logger.warning("finish_collect called but collect is not active")
+            logger.warning(f"finish_collect called but collect is not active in group {session.group_id}")
             return
         
-        logger.info("=== FINISHING COLLECT ===")
-        logger.info(f"Users: {len(session.users)}")
-        logger.info(f"Links: {len(session.links)}")
-        
-        # Unpin message bắt đầu collect trước
-        if session.pinned_message_id:
-            try:
-                await context.bot.unpin_chat_message(
-                    session.group_id,
-                    session.pinned_message_id
-                )
-                logger.info(f"Unpinned start message: {session.pinned_message_id}")
-            except Exception as e:
-                logger.error(f"Failed to unpin start message: {e}")
-        
-        # Stop collect
+        # Nhận việc kết thúc trước await đầu tiên: lần gọi thứ hai (job hết giờ
+        # và link thứ MAX_USERS cùng lúc) sẽ thấy collect đã dừng
+        pinned_message_id = session.pinned_message_id
         session.stop_collect()
         
-        # Prepare summary message
-        if session.links:
-            links_text = "\n\n".join(session.links)
+        async with session.lock:
+            logger.info(f"=== FINISHING COLLECT ({session.group_id}) ===")
+            logger.info(f"Users: {len(session.submissions.users)}")
+            logger.info(f"Links: {len(session.submissions)}")
             
-            # Kiểm tra độ dài tin nhắn
-            if len(links_text) > 4000:
-                # Chia thành nhiều tin nhắn
-                summary_part1 = (
-                    f"📊 **KẾT QUẢ COLLECT**\n\n"
-                    f"👥 Số người tham gia: {len(session.users)}\n"
-                    f"📎 Số link thu được: {len(session.links)}\n\n"
-                    f"**DANH SÁCH LINK:**\n\n"
-                )
-                
-                # Chia links thành các phần nhỏ
-                chunk_size = 10
-                chunks = [session.links[i:i + chunk_size] for i in range(0, len(session.links), chunk_size)]
-                
-                # Gửi phần đầu tiên và pin nó
-                first_chunk_text = "\n\n".join(chunks[0])
-                result_msg = await send_message_safe(
-                    context, 
-                    session.group_id, 
-                    summary_part1 + first_chunk_text
-                )
+            # Unpin message bắt đầu collect trước
+            if pinned_message_id:
+                try:
+                    await outbox.submit(
+                        session.group_id, context.bot.unpin_chat_message,
+                        session.group_id, pinned_message_id, priority=PRIORITY_RESULT
+                    )
+                    logger.info(f"Unpinned start message: {pinned_message_id}")
+                except Exception as e:
+                    logger.error(f"Failed to unpin start message: {e}")
+            
+            # Prepare summary message
+            if session.submissions:
+                # Dựng ở thread riêng: collect đã dừng nên submissions không đổi nữa
+                pages = await asyncio.to_thread(summary_pages, session)
                 
-                # Pin tin nhắn kết quả đầu tiên
+                # Gửi trang đầu tiên và pin nó
+                result_msg = await send_message_safe(context, session.group_id, pages[0])
                 if result_msg:
                     try:
-                        await context.bot.pin_chat_message(session.group_id, result_msg.message_id)
+                        await outbox.submit(
+                            session.group_id, context.bot.pin_chat_message,
+                            session.group_id, result_msg.message_id, priority=PRIORITY_RESULT
+                        )
                         session.result_message_id = result_msg.message_id
                         logger.info(f"Pinned result message: {result_msg.message_id}")
                     except Exception as e:
                         logger.error(f"Failed to pin result message: {e}")
                 
-                # Gửi các phần tiếp theo
-                for i in range(1, len(chunks)):
-                    chunk_text = "\n\n".join(chunks[i])
-                    await send_message_safe(
-                        context,
-                        session.group_id,
-                        f"**TIẾP THEO...**\n\n{chunk_text}"
-                    )
-            else:
-                # Tin nhắn ngắn, gửi một lần
-                summary = (
-                    f"📊 **KẾT QUẢ COLLECT**\n\n"
-                    f"👥 Số người tham gia: {len(session.users)}\n"
-                    f"📎 Số link thu được: {len(session.links)}\n\n"
-                    f"**DANH SÁCH LINK:**\n\n"
-                    + links_text
-                )
+                # Gửi các trang tiếp theo (outbox giữ đúng thứ tự trong chat)
+                await asyncio.gather(*[
+                    send_message_safe(context, session.group_id, page) for page in pages[1:]
+                ])
                 
-                # Gửi và pin tin nhắn kết quả
-                result_msg = await send_message_safe(context, session.group_id, summary)
+                logger.info(f"Sent summary with {len(session.submissions)} links in {len(pages)} messages")
+            else:
+                # Gửi và pin tin nhắn kết quả (kể cả khi không có link)
+                result_msg = await send_message_safe(context, session.group_id, EMPTY_SUMMARY_TEXT)
                 if result_msg:
                     try:
-                        await context.bot.pin_chat_message(session.group_id, result_msg.message_id)
+                        await outbox.submit(
+                            session.group_id, context.bot.pin_chat_message,
+                            session.group_id, result_msg.message_id, priority=PRIORITY_RESULT
+                        )
                         session.result_message_id = result_msg.message_id
                         logger.info(f"Pinned result message: {result_msg.message_id}")
                     except Exception as e:
                         logger.error(f"Failed to pin result message: {e}")
+                
+                logger.info("No links to send")
             
-            logger.info(f"Sent summary with {len(session.links)} links")
-        else:
-            summary = (
-                f"📊 **KẾT QUẢ COLLECT**\n\n"
-                f"⛔ Không có link nào được gửi\n"
-                f"Có thể do:\n"
-                f"• Không có link hợp lệ\n"
-                f"• Chưa đủ người tham gia\n"
-                f"• Thời gian chưa kết thúc"
-            )
-            
-            # Gửi và pin tin nhắn kết quả (kể cả khi không có link)
-            result_msg = await send_message_safe(context, session.group_id, summary)
-            if result_msg:
-                try:
-                    await context.bot.pin_chat_message(session.group_id, result_msg.message_id)
-                    session.result_message_id = result_msg.message_id
-                    logger.info(f"Pinned result message: {result_msg.message_id}")
-                except Exception as e:
-                    logger.error(f"Failed to pin result message: {e}")
-            
-            logger.info("No links to send")
-        
-        # Save stats
-        save_state()
-        logger.info("=== COLLECT FINISHED ===")
+            # Save stats
+            save_state(session)
+            logger.info("=== COLLECT FINISHED ===")
         
     except Exception as e:
         logger.error(f"Error in finish_collect: {e}")
         
         # Try to notify owner
-        try:
-            await context.bot.send_message(
-                OWNER_ID,
-                f"❌ Lỗi khi kết thúc collect: {str(e)}"
-            )
-        except:
-            pass
+        notify_owner(context, f"❌ Lỗi khi kết thúc collect: {str(e)}")
 
-async def send_message_safe(context: ContextTypes.DEFAULT_TYPE, chat_id: int, text: str, max_retries: int = 3):
-    """Send message safely with error handling and return message object"""
-    for attempt in range(max_retries):
-        try:
-            # Try without parse_mode first if there are parse errors
-            if attempt > 0:
-                # On retry, send as plain text
-                msg = await context.bot.send_message(
-                    chat_id,
-                    text,
-                    disable_web_page_preview=True,
-                    parse_mode=None  # Plain text
-                )
-            else:
-                # First attempt with Markdown
-                msg = await context.bot.send_message(
-                    chat_id,
-                    text,
-                    disable_web_page_preview=True,
-                    parse_mode='Markdown'
-                )
-            
-            logger.info(f"Message sent successfully to {chat_id} (attempt {attempt + 1})")
-            return msg
-            
-        except Exception as e:
-            logger.warning(f"Failed to send message to {chat_id} (attempt {attempt + 1}): {e}")
-            
-            if "Can't parse entities" in str(e) and attempt == 0:
-                # Markdown parse error, retry with plain text
-                logger.info("Markdown parse error, retrying with plain text")
-                continue
-                
-            if attempt < max_retries - 1:
-                await asyncio.sleep(2 * (attempt + 1))
-            else:
-                logger.error(f"Failed to send message after {max_retries} attempts: {e}")
-                return None
-    
-    return None
+async def send_message_safe(context: ContextTypes.DEFAULT_TYPE, chat_id: int, text: str, priority: int = PRIORITY_RESULT):
+    """Send a MarkdownV2 message through the outbox, return message object or None on failure"""
+    try:
+        return await send_markdown(context, chat_id, text, priority=priority, disable_web_page_preview=True)
+    except Exception as e:
+        logger.error(f"Failed to send message to {chat_id}: {e}")
+        return None
 
 # ================= /status =================
+STATUS_ACTIVE_TEMPLATE = Template(
+    "🚀 **ĐANG COLLECT**\n\n"
+    "⏳ Thời gian còn: {remaining}\n"
+    "⏰ Kết thúc lúc: {end_time}\n"
+    "👥 Người tham gia: {user_count}/{max_users}\n"
+    "📎 Số link: {link_count}\n"
+    "{progress_bar} {progress:.0f}%\n\n"
+    "⏰ Cooldown: {cooldown}s\n"
+    "📍 Gửi link tweet để tham gia!"
+)
+STATUS_NEXT_AUTO_TEMPLATE = Template("\n\n⏰ Auto tiếp theo: {next_time}")
+STATUS_AUTO_TEMPLATE = Template(
+    "⏰ **AUTO COLLECT**\n\n"
+    "Lịch:\n{times_list}\n"
+    "Lần tới: {next_time}\n\n"
+    "📊 Lần collect trước:\n"
+    "👥 {user_count} người\n"
+    "📎 {link_count} link"
+)
+STATUS_IDLE_TEXT = Template(
+    "📴 **KHÔNG CÓ COLLECT**\n\n"
+    "Bot đang chờ lệnh từ admin\n"
+    "Sử dụng /help để xem hướng dẫn"
+).render()
+
 async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         # Only allow in groups
         if update.effective_chat.type not in ["group", "supergroup"]:
             return
         
-        # Check if it's the correct group
-        if session.group_id is None or update.effective_chat.id != session.group_id:
+        # Check if it's a registered group
+        session = sessions.get(update.effective_chat.id)
+        if session is None:
             return
         
         if session.active:
@@ -721,39 +1403,33 @@ async def status(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # Calculate end time
             end_time = datetime.fromtimestamp(session.end_time).strftime('%H:%M:%S') if session.end_time > 0 else "N/A"
             
-            status_text = (
-                f"🚀 **ĐANG COLLECT**\n\n"
-                f"⏳ Thời gian còn: {format_time(remain)}\n"
-                f"⏰ Kết thúc lúc: {end_time}\n"
-                f"👥 Người tham gia: {len(session.users)}/{MAX_USERS}\n"
-                f"📎 Số link: {len(session.links)}\n"
-                f"{progress_bar} {progress:.0f}%\n\n"
-                f"⏰ Cooldown: {USER_COOLDOWN}s\n"
-                f"📍 Gửi link tweet để tham gia!"
+            status_text = STATUS_ACTIVE_TEMPLATE.render(
+                remaining=format_time(remain),
+                end_time=end_time,
+                user_count=len(session.submissions.users),
+                max_users=MAX_USERS,
+                link_count=len(session.submissions),
+                progress_bar=progress_bar,
+                progress=progress,
+                cooldown=USER_COOLDOWN
             )
             
             # Add next auto collect if available
-            if session.auto_times:
-                status_text += f"\n\n⏰ Auto tiếp theo: {session.auto_times[0]}"
+            if session.schedule:
+                status_text += STATUS_NEXT_AUTO_TEMPLATE.render(next_time=format_next_auto(session))
             
-        elif session.auto_times:
-            times_list = "\n".join([f"• {t}" for t in session.auto_times])
-            status_text = (
-                f"⏰ **AUTO COLLECT**\n\n"
-                f"Lịch hàng ngày:\n{times_list}\n\n"
-                f"📊 Lần collect trước:\n"
-                f"👥 {session.last_collect_stats.get('user_count', 0)} người\n"
-                f"📎 {session.last_collect_stats.get('link_count', 0)} link"
+        elif session.schedule:
+            status_text = STATUS_AUTO_TEMPLATE.render(
+                times_list=format_schedule(session),
+                next_time=format_next_auto(session),
+                user_count=session.last_collect_stats.get('user_count', 0),
+                link_count=session.last_collect_stats.get('link_count', 0)
             )
             
         else:
-            status_text = (
-                "📴 **KHÔNG CÓ COLLECT**\n\n"
-                "Bot đang chờ lệnh từ admin\n"
-                "Sử dụng /help để xem hướng dẫn"
-            )
+            status_text = STATUS_IDLE_TEXT
         
-        await update.message.reply_text(status_text, parse_mode='Markdown')
+        reply_markdown(update, status_text)
         
     except Exception as e:
         logger.error(f"Error in status command: {e}")
@@ -764,15 +1440,33 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     try:
-        # Get bot uptime from session
-        uptime = session.get_bot_uptime()
+        # Get bot uptime from registry
+        uptime = sessions.get_bot_uptime()
+        session = resolve_session(update, context)
+        
+        if session is None:
+            group_ids = sessions.group_ids()
+            groups_list = "\n".join(
+                f"• {group_id} {'🚀' if sessions.is_active(group_id) else '💤'}" for group_id in group_ids
+            ) or "Không có"
+            reply(
+                update,
+                f"📊 THỐNG KÊ BOT{SHARD_LABEL}\n\n"
+                f"• Bot Uptime: {format_time(uptime)}\n"
+                f"• Số group: {len(group_ids)}\n"
+                f"• Đang collect: {len(sessions.active_sessions())}\n\n"
+                f"{groups_list}\n\n"
+                f"/stats <chat_id> – xem chi tiết một group"
+            )
+            return
         
         stats_text = f"""
 📊 **THỐNG KÊ BOT**
 
 🆔 **Thông tin cơ bản:**
 • Owner ID: {OWNER_ID}
-• Group ID: {session.group_id or 'Chưa set'}
+• Group ID: {session.group_id}
+• Số group: {len(sessions.group_ids())}
 • Bot Uptime: {format_time(uptime)}
 
 ⚙️ **Cấu hình:**
@@ -781,8 +1475,8 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
 • Cooldown: {USER_COOLDOWN}s
 
 ⏰ **Auto Collect:**
-• Số lịch: {len(session.auto_times)}
-• Danh sách: {', '.join(session.auto_times) or 'Không có'}
+• Số lịch: {len(session.schedule)}
+• Danh sách: {', '.join(entry.label for entry in session.schedule) or 'Không có'}
 
 📈 **Lần collect gần nhất:**
 • Thời gian: {datetime.fromtimestamp(session.last_collect_stats.get('timestamp', 0)).strftime('%d/%m/%Y %H:%M') if session.last_collect_stats.get('timestamp') else 'N/A'}
@@ -791,138 +1485,493 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 🔄 **Trạng thái hiện tại:**
 • Đang chạy: {'✅' if session.active else '❌'}
-• Số user hiện tại: {len(session.users)}
-• Số link hiện tại: {len(session.links)}
+• Số user hiện tại: {len(session.submissions.users)}
+• Số link hiện tại: {len(session.submissions)}
 """
         
-        await update.message.reply_text(stats_text)
+        runs = await history.recent_runs(session.group_id)
+        if runs:
+            stats_text += "\n📚 **Lịch sử collect:**\n"
+            for run in runs:
+                started = datetime.fromtimestamp(run["start_time"]).strftime('%d/%m/%Y %H:%M')
+                stats_text += f"• #{run['id']} {started} – {run['user_count']} người, {run['link_count']} link\n"
+            stats_text += "/export run <id> – xuất links của một lần collect\n"
+        
+        reply(update, stats_text)
         logger.info(f"Stats requested by {update.effective_user.id}")
         
     except Exception as e:
         logger.error(f"Error in stats command: {e}")
-        await update.message.reply_text(f"❌ Lỗi khi lấy thống kê: {e}")
+        reply(update, f"❌ Lỗi khi lấy thống kê: {e}")
+
+# ================= /leaderboard ============
+LEADERBOARD_TITLES = {"links": "số link", "runs": "số lần tham gia", "streak": "chuỗi dài nhất"}
+LEADERBOARD_SIZE = 10
+LEADERBOARD_TEMPLATE = Template(
+    "🏆 **BẢNG XẾP HẠNG** – {title}\n\n"
+    "{rows}\n\n"
+    "📊 /leaderboard links | runs | streak"
+)
+MYSTATS_TEMPLATE = Template(
+    "👤 **THỐNG KÊ CỦA {name}**\n\n"
+    "🏅 Hạng: {rank}/{total} (theo số link)\n"
+    "📎 Số link: {links}\n"
+    "🔁 Số lần tham gia: {runs_joined}\n"
+    "🔥 Chuỗi hiện tại: {streak} (dài nhất: {best_streak})\n"
+    "🕐 Lần gần nhất: {last_seen}"
+)
+
+def current_streak(session: BotState, row) -> int:
+    """Chuỗi còn tính nếu người đó có mặt ở lần collect gần nhất đã xong (hoặc đang chạy)"""
+    # latest_seq: runs.seq mới nhất của group, là lần đang chạy nếu đang collect
+    latest = row["latest_seq"] or 0
+    if session.active and session.run_id is not None:
+        latest -= 1
+    return row["streak"] if row["last_run_seq"] >= latest else 0
+
+async def leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        if update.effective_chat.type not in ["group", "supergroup"]:
+            return
+        
+        session = sessions.get(update.effective_chat.id)
+        if session is None:
+            return
+        
+        order = context.args[0].lower() if context.args else "links"
+        if order not in LEADERBOARD_TITLES:
+            reply(update, "❌ /leaderboard [links|runs|streak]")
+            return
+        
+        rows = await history.leaderboard(session.group_id, order, LEADERBOARD_SIZE)
+        if not rows:
+            reply(update, "📭 Chưa có ai tham gia collect")
+            return
+        
+        lines = [
+            f"{i}. {row['name']} – {row['links']} link, {row['runs_joined']} lần, "
+            f"chuỗi {current_streak(session, row)} (max {row['best_streak']})"
+            for i, row in enumerate(rows, 1)
+        ]
+        reply_markdown(update, LEADERBOARD_TEMPLATE.render(
+            title=LEADERBOARD_TITLES[order],
+            rows="\n".join(lines)
+        ))
+    except Exception as e:
+        logger.error(f"Error in leaderboard command: {e}")
+
+async def mystats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        if update.effective_chat.type not in ["group", "supergroup"]:
+            return
+        
+        session = sessions.get(update.effective_chat.id)
+        if session is None:
+            return
+        
+        # Trả lời tin của ai thì xem thống kê người đó
+        target = update.message.reply_to_message
+        user = target.from_user if target and target.from_user else update.effective_user
+        row = await history.user_stats(session.group_id, user.id)
+        if row is None:
+            reply(update, "📭 Chưa tham gia collect nào trong group này")
+            return
+        
+        reply_markdown(update, MYSTATS_TEMPLATE.render(
+            name=row["name"],
+            rank=row["rank"],
+            total=row["total"],
+            links=row["links"],
+            runs_joined=row["runs_joined"],
+            streak=current_streak(session, row),
+            best_streak=row["best_streak"],
+            last_seen=datetime.fromtimestamp(row["last_seen"], tz=TIMEZONE).strftime('%d/%m/%Y %H:%M')
+        ))
+    except Exception as e:
+        logger.error(f"Error in mystats command: {e}")
 
 # ================= /broadcast ==============
+BROADCAST_TEMPLATE = Template("📢 **THÔNG BÁO TỪ ADMIN**\n\n{message}")
+
 async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_owner(update):
         return
     
-    if session.group_id is None:
-        await update.message.reply_text("❌ Chưa có group nào được set")
+    # Trong group: chỉ gửi cho group đó, ngoài ra gửi cho tất cả group
+    session = sessions.get(update.effective_chat.id)
+    targets = [session.group_id] if session is not None else sessions.group_ids()
+    if not targets:
+        reply(update, f"❌ Chưa có group nào được set{SHARD_LABEL}")
         return
     
     message = " ".join(context.args)
     if not message:
-        await update.message.reply_text("❌ /broadcast <tin nhắn>")
+        reply(update, "❌ /broadcast <tin nhắn>")
         return
     
     try:
-        escaped_message = escape_markdown(message)
-        await context.bot.send_message(
-            chat_id=session.group_id,
-            text=f"📢 **THÔNG BÁO TỪ ADMIN**\n\n{escaped_message}",
-            parse_mode='Markdown'
-        )
-        await update.message.reply_text("✅ Đã gửi broadcast đến group")
+        text = BROADCAST_TEMPLATE.render(message=message)
+        await asyncio.gather(*[
+            send_markdown(context, group_id, text) for group_id in targets
+        ])
+        reply(update, f"✅ Đã gửi broadcast đến {len(targets)} group{SHARD_LABEL}")
         logger.info(f"Broadcast sent: {message[:50]}...")
     except Exception as e:
         logger.error(f"Error in broadcast: {e}")
-        await update.message.reply_text(f"❌ Lỗi khi gửi broadcast: {e}")
+        reply(update, f"❌ Lỗi khi gửi broadcast: {e}")
 
 # ================= /export =================
+EXPORT_USAGE_TEXT = (
+    "📁 Cách dùng /export:\n"
+    "/export [txt|csv|jsonl] [gz] – lần collect gần nhất của group\n"
+    "/export run <id> hoặc run <id>-<id> – theo lần collect\n"
+    "/export YYYY-MM-DD [YYYY-MM-DD] – theo ngày\n"
+    "Ngoài group thêm <chat_id> để chọn group"
+)
+
+def parse_export_args(args):
+    """Parse /export arguments into a dict of options, raises ValueError on bad input"""
+    options = {"fmt": "txt", "compress": False, "group_id": None, "runs": None, "dates": []}
+    tokens = iter(args)
+    for token in tokens:
+        lowered = token.lower()
+        if lowered in FORMATS:
+            options["fmt"] = lowered
+        elif lowered in ("gz", "gzip"):
+            options["compress"] = True
+        elif lowered == "run":
+            first, _, last = next(tokens, "").partition("-")
+            options["runs"] = (int(first), int(last or first))
+        elif len(token) == 10 and token[4] == "-":
+            options["dates"].append(TIMEZONE.localize(datetime.strptime(token, "%Y-%m-%d")))
+        else:
+            options["group_id"] = int(token)
+    if len(options["dates"]) > 2:
+        raise ValueError("too many dates")
+    return options
+
 async def export(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_owner(update):
         return
     
-    if not session.links:
-        await update.message.reply_text("❌ Không có link để export")
-        return
-    
     try:
-        # Create export content
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        content = f"Bot Export - {timestamp}\n"
-        content += f"Total links: {len(session.links)}\n"
-        content += f"Total users: {len(session.users)}\n"
-        content += "=" * 50 + "\n\n"
-        content += "\n\n".join(session.links)
-        
-        # Save to temporary file
-        filename = f"export_links_{timestamp}.txt"
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(content)
-        
-        # Send file
-        await update.message.reply_document(
-            document=open(filename, "rb"),
-            filename=filename,
-            caption=f"📁 Export {len(session.links)} links"
+        try:
+            options = parse_export_args(context.args)
+        except ValueError:
+            reply(update, EXPORT_USAGE_TEXT)
+            return
+        
+        query = {}
+        session = sessions.get(update.effective_chat.id)
+        if session is None and options["group_id"] is not None:
+            session = sessions.get(options["group_id"])
+        elif session is None and len(sessions.group_ids()) == 1:
+            session = sessions.get(sessions.group_ids()[0])
+        
+        if options["runs"] is not None:
+            query["run_from"], query["run_to"] = options["runs"]
+            label = f"run #{query['run_from']}" + (f"-{query['run_to']}" if query["run_to"] != query["run_from"] else "")
+        else:
+            group_id = session.group_id if session is not None else options["group_id"]
+            if group_id is None:
+                reply(update, "❌ Không xác định được group, thêm <chat_id> vào lệnh")
+                return
+            query["group_id"] = group_id
+            if options["dates"]:
+                first, last = options["dates"][0], options["dates"][-1]
+                query["since"] = first.timestamp()
+                query["until"] = last.timestamp() + 24 * 3600
+                label = f"group {group_id}, {first:%d/%m/%Y} – {last:%d/%m/%Y}"
+            else:
+                # Mặc định: lần collect đang chạy, hoặc lần gần nhất
+                run_id = session.run_id if session is not None else None
+                if run_id is None:
+                    runs = await history.recent_runs(group_id, limit=1)
+                    run_id = runs[0]["id"] if runs else None
+                if run_id is None:
+                    reply(update, "❌ Không có link để export")
+                    return
+                query["run_from"] = query["run_to"] = run_id
+                label = f"run #{run_id}"
+        
+        # Link của lần collect đang chạy có thể còn nằm trong hàng đợi ghi
+        await history.sync()
+        timestamp = datetime.now(TIMEZONE).strftime("%Y%m%d_%H%M%S")
+        buffer, link_count, user_count = await asyncio.to_thread(
+            write_export,
+            history.iter_links(**query),
+            options["fmt"],
+            options["compress"],
+            f"Bot Export - {timestamp} - {label}",
+            TIMEZONE
         )
         
-        # Clean up
-        os.remove(filename)
-        logger.info(f"Export completed: {len(session.links)} links")
+        if not link_count:
+            reply(update, "❌ Không có link để export")
+            return
+        
+        await outbox.submit(
+            update.effective_chat.id, update.message.reply_document,
+            document=buffer,
+            filename=export_filename(options["fmt"], options["compress"], timestamp),
+            caption=f"📁 Export {link_count} links, {user_count} người ({label})"
+        )
+        logger.info(f"Export completed: {link_count} links, {label}, {options['fmt']}")
         
     except Exception as e:
         logger.error(f"Error in export: {e}")
-        await update.message.reply_text(f"❌ Lỗi khi export: {e}")
+        reply(update, f"❌ Lỗi khi export: {e}")
+
+# ================= STARTUP / SHUTDOWN ======
+async def on_startup(app):
+    if METRICS_PORT:
+        await metrics_server.start()
+    if ENRICH_URL:
+        await enricher.start()
+
+async def on_stop(app):
+    """Intake is stopped and running handlers/jobs are done; the bot can still send"""
+    for session in sessions:
+        # Collect đang chạy được lưu lại, timer sẽ được tạo lại lúc khởi động
+        session.cancel_finish_job()
+        session.cancel_board_job()
+    dropped = await outbox.drain(SHUTDOWN_DRAIN_TIMEOUT)
+    if dropped:
+        logger.warning(f"Shutdown: {dropped} outgoing calls not sent within {SHUTDOWN_DRAIN_TIMEOUT}s")
+    save_state()
+    await save_seen_tweets()
+    active = sessions.active_sessions()
+    if active:
+        logger.info(f"Shutdown: {len(active)} active collects saved, they resume on restart")
+
+async def on_shutdown(app):
+    await metrics_server.stop()
+    await enricher.stop()
+    await outbox.close()
+    await state_store.close()
+    await asyncio.to_thread(history.close)
+    logger.info("State and history flushed on shutdown")
 
 # ================= MAIN ====================
+def build_application(token=TOKEN, base_url=BOT_API_URL, concurrent_updates=CONCURRENT_UPDATES):
+    builder = (
+        ApplicationBuilder()
+        .token(token)
+        # Các group chạy song song, update trong một group theo đúng thứ tự đến
+        .concurrent_updates(ChatOrderedUpdateProcessor(concurrent_updates))
+        .post_init(on_startup)
+        .post_stop(on_stop)
+        .post_shutdown(on_shutdown)
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    app = builder.build()
+    
+    # Add handlers
+    app.add_handler(CommandHandler("start", timed(start)))
+    app.add_handler(CommandHandler("help", timed(help_command)))
+    app.add_handler(CommandHandler("startcollect", timed(startcollect)))
+    app.add_handler(CommandHandler("stopcollect", timed(stopcollect)))
+    app.add_handler(CommandHandler("autocollect", timed(autocollect)))
+    app.add_handler(CommandHandler("status", timed(status)))
+    app.add_handler(CommandHandler("stats", timed(stats)))
+    app.add_handler(CommandHandler("broadcast", timed(broadcast)))
+    app.add_handler(CommandHandler("export", timed(export)))
+    app.add_handler(CommandHandler("leaderboard", timed(leaderboard)))
+    app.add_handler(CommandHandler("mystats", timed(mystats)))
+    # Đã xóa lệnh checkperms
+    app.add_handler(MessageHandler(COLLECT_LINK_FILTER, timed(collect_link)))
+    return app
+
+def restore_jobs(app):
+    """Recreate auto collect, finish and periodic jobs from the loaded state"""
+    for session in sessions:
+        try:
+            restored = schedule_auto_jobs(app.job_queue, session)
+            if restored:
+                logger.info(f"Restored {restored} auto collects in group {session.group_id}, next at {format_next_auto(session)}")
+        except Exception as e:
+            logger.error(f"Failed to restore auto collects in group {session.group_id}: {e}")
+    
+    # Resume collects that were running when the bot stopped
+    for session in sessions.active_sessions():
+        schedule_finish(app.job_queue, session)
+        end_time_str = datetime.fromtimestamp(session.end_time).strftime('%H:%M:%S')
+        logger.info(
+            f"Resumed collect in group {session.group_id}: {len(session.submissions.users)} users, "
+            f"finishes at {end_time_str}"
+        )
+    
+    # Evict idle groups periodically
+    app.job_queue.run_repeating(evict_idle_sessions, interval=SESSION_SWEEP_INTERVAL)
+    app.job_queue.run_repeating(save_seen_tweets_job, interval=SEEN_SAVE_INTERVAL)
+
+def check_webhook_config():
+    """Refuse to serve an unauthenticated webhook on a non-loopback address"""
+    if WEBHOOK_SECRET is None and not WEBHOOK_URL and not is_loopback(WEBHOOK_LISTEN):
+        # Ai tới được cổng này cũng gửi được update giả mạo OWNER_ID
+        logger.critical(f"WEBHOOK_SECRET is not set and WEBHOOK_LISTEN={WEBHOOK_LISTEN} is not loopback")
+        raise SystemExit(
+            "WEBHOOK_SECRET (hoặc WEBHOOK_URL để bot tự sinh secret) là bắt buộc khi WEBHOOK_LISTEN "
+            "không phải địa chỉ loopback"
+        )
+
+def make_webhook_server(app):
+    check_webhook_config()
+    secret = WEBHOOK_SECRET
+    if secret is None and WEBHOOK_URL:
+        secret = secrets.token_urlsafe(32)  # Tự đăng ký webhook nên tự sinh secret được
+    elif secret is None:
+        logger.warning(f"WEBHOOK_SECRET is not set, accepting unauthenticated requests on {WEBHOOK_LISTEN} only")
+    return WebhookServer(app, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, secret)
+
+# ================= WORKERS =================
+# Lệnh admin trong chat riêng. Mỗi worker chỉ có group của mình, nên:
+# /broadcast và /stats không kèm group chạy ở mọi worker (mỗi worker trả lời
+# cho phần group của nó); lệnh kèm <chat_id> về worker của group đó
+OWNER_DM_FAN_OUT = {"broadcast", "stats"}
+OWNER_DM_BY_GROUP = {"stats", "status", "export"}
+SHARD_LABEL = f" (worker {WORKER_INDEX + 1}/{WORKERS})" if WORKER_INDEX is not None else ""
+
+def shard_key(update):
+    """Chat id whose worker handles the update, or ALL_WORKERS"""
+    chat = update.effective_chat
+    if chat is None:
+        return None
+    message = update.effective_message
+    user = update.effective_user
+    if (
+        chat.type != "private" or user is None or user.id != OWNER_ID
+        or message is None or not message.text or not message.text.startswith("/")
+    ):
+        return chat.id
+    command, *args = message.text.split()
+    command = command[1:].split("@", 1)[0].lower()
+    if command in OWNER_DM_BY_GROUP:
+        for arg in args:
+            if arg.startswith("-") and arg[1:].isdigit():
+                return int(arg)
+    if command in OWNER_DM_FAN_OUT:
+        return ALL_WORKERS
+    return chat.id
+
+async def run_worker():
+    """Worker process: the dispatcher writes this shard's updates to stdin, one JSON per line.
+
+    An update is acked on stdout once the state containing its effects is
+    written, so if this process dies the dispatcher replays what was lost.
+    """
+    # Ctrl+C tới cả nhóm process; dispatcher sẽ đóng stdin để worker dừng gọn
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    
+    app = build_application()
+    restore_jobs(app)
+    acks = AckTracker(state_store)
+    reader = await open_stdin()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, reader.feed_eof)
+    in_flight = set()
+    
+    async def process(update):
+        try:
+            await app.update_processor.process_update(update, app.process_update(update))
+        finally:
+            acks.done(update.update_id)
+    
+    await app.initialize()
+    try:
+        await on_startup(app)
+        await app.start()
+        logger.info(f"Worker {WORKER_INDEX}/{WORKERS} running: {len(sessions)} groups")
+        while line := await reader.readline():
+            update = Update.de_json(json.loads(line), app.bot)
+            task = asyncio.create_task(process(update))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        
+        # stdin đóng: xử lý nốt các update đã nhận rồi dừng như run_polling
+        await asyncio.gather(*in_flight)
+        await app.stop()
+        await on_stop(app)
+    finally:
+        await app.shutdown()
+        await on_shutdown(app)
+
+async def run_dispatcher():
+    """Front process: receive updates and route them to WORKERS worker processes by chat id"""
+    migrated = GroupStateDB(STATE_DB).import_json(STATE_FILE)
+    if migrated:
+        logger.info(f"Copied {migrated} groups from {STATE_FILE} to {STATE_DB}")
+    
+    # Application không có handler, chỉ dùng updater / webhook để nhận update
+    builder = ApplicationBuilder().token(TOKEN)
+    if BOT_API_URL:
+        builder = builder.base_url(BOT_API_URL)
+    front = builder.build()
+    dispatcher = Dispatcher(
+        WORKERS, [sys.executable, os.path.abspath(__file__)], restart_delay=WORKER_RESTART_DELAY,
+        shard_key=shard_key
+    )
+    stop_event = asyncio.Event()
+    install_stop_signals(stop_event)
+    server = None
+    
+    await front.initialize()
+    try:
+        await dispatcher.start()
+        if WEBHOOK:
+            server = make_webhook_server(front)
+            if WEBHOOK_URL:
+                await front.bot.set_webhook(
+                    url=WEBHOOK_URL, secret_token=server.secret_token, allowed_updates=ALLOWED_UPDATES
+                )
+            await server.start()
+        else:
+            await front.updater.start_polling(allowed_updates=ALLOWED_UPDATES)
+        logger.info(f"Dispatcher running with {WORKERS} workers")
+        await dispatcher.run(front.update_queue, stop_event)
+    finally:
+        if server is not None:
+            await server.stop()
+        if front.updater.running:
+            await front.updater.stop()
+        await dispatcher.flush(front.update_queue)
+        await dispatcher.stop(WORKER_STOP_TIMEOUT)
+        if dispatcher.unacknowledged:
+            logger.warning(f"Dispatcher stopped with {dispatcher.unacknowledged} unacknowledged updates")
+        await front.shutdown()
+        logger.info(f"Dispatcher stopped: {dispatcher.routed} updates routed")
+
 def main():
-    # Create logs directory if not exists
-    if not os.path.exists("logs"):
-        os.makedirs("logs")
+    if WEBHOOK and WORKER_INDEX is None:
+        check_webhook_config()  # trước khi bật worker hay mở state
+    
+    if WORKERS > 1 and WORKER_INDEX is None:
+        asyncio.run(run_dispatcher())
+        return
     
     # Load state
     load_state()
+    load_seen_tweets()
+    history.open()
     
     # Update bot start time
-    session.bot_start_time = time.time()
+    sessions.bot_start_time = time.time()
     
-    # Create application
-    app = ApplicationBuilder().token(TOKEN).build()
-    
-    # Add handlers
-    app.add_handler(CommandHandler("start", start))
-    app.add_handler(CommandHandler("help", help_command))
-    app.add_handler(CommandHandler("startcollect", startcollect))
-    app.add_handler(CommandHandler("stopcollect", stopcollect))
-    app.add_handler(CommandHandler("autocollect", autocollect))
-    app.add_handler(CommandHandler("status", status))
-    app.add_handler(CommandHandler("stats", stats))
-    app.add_handler(CommandHandler("broadcast", broadcast))
-    app.add_handler(CommandHandler("export", export))
-    # Đã xóa lệnh checkperms
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, collect_link))
+    if WORKER_INDEX is not None:
+        asyncio.run(run_worker())
+        return
     
-    # Restore auto jobs after restart
-    session.jobs = []  # Clear existing jobs
-    for time_str in session.auto_times:
-        try:
-            h, m = map(int, time_str.split(":"))
-            
-            # Sử dụng closure để giữ giá trị h, m
-            def create_job_func(hour, minute):
-                async def job_func(context: ContextTypes.DEFAULT_TYPE):
-                    logger.info(f"Auto collect triggered (restored): {hour:02d}:{minute:02d}")
-                    await start_collect_core(context)
-                return job_func
-            
-            job = app.job_queue.run_daily(
-                create_job_func(h, m),
-                time=dtime(hour=h, minute=m, tzinfo=TIMEZONE)
-            )
-            session.jobs.append(job)
-            logger.info(f"Restored auto collect: {time_str}")
-        except Exception as e:
-            logger.error(f"Failed to restore auto collect {time_str}: {e}")
+    # Create application
+    app = build_application()
+    restore_jobs(app)
     
     # Start bot
     logger.info("🤖 Bot is starting...")
     print("🤖 Bot is running with enhanced features!")
     print(f"📊 Owner ID: {OWNER_ID}")
-    print(f"⏰ Auto times: {session.auto_times}")
-    print(f"🏠 Group ID: {session.group_id}")
+    print(f"🏠 Groups: {len(sessions)}")
+    for session in sessions:
+        print(f"   • {session.group_id} – auto times: {[entry.label for entry in session.schedule]}")
     print(f"⏱ Collect duration: {COLLECT_DURATION//3600} hours")
     print(f"👥 Max users: {MAX_USERS}")
     print("📝 Check logs/bot.log for details")
@@ -933,7 +1982,10 @@ def main():
     # Save initial state
     save_state()
     
-    app.run_polling(allowed_updates=Update.ALL_TYPES)
+    if WEBHOOK:
+        asyncio.run(serve_webhook(app, make_webhook_server(app), WEBHOOK_URL, ALLOWED_UPDATES))
+    else:
+        app.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
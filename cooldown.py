@@ -0,0 +1,71 @@
+import math
+import time
+
+
+class CooldownTracker:
+    """Cooldown theo user id, entry hết hạn tự bị xoá.
+
+    Mỗi user chỉ giữ một float (thời điểm hết hạn theo time.monotonic).
+    User id được bỏ vào một timing wheel theo giây hết hạn; mỗi lần tra cứu
+    sẽ quét các ô đã qua, nên bộ nhớ chỉ tỉ lệ với số user còn trong cooldown.
+    check/hit đều O(1) (khấu hao).
+    """
+
+    def __init__(self, cooldown, resolution=1.0, clock=time.monotonic):
+        self.cooldown = cooldown
+        self.resolution = resolution
+        self.clock = clock
+        self._expiry = {}
+        self._wheel = [[] for _ in range(math.ceil(cooldown / resolution) + 1)]
+        self._tick = int(clock() / resolution)
+
+    def __len__(self):
+        self._advance(self.clock())
+        return len(self._expiry)
+
+    def __contains__(self, user_id):
+        return self.remaining(user_id) > 0
+
+    def remaining(self, user_id):
+        """Seconds left before user_id may submit again, 0 if free"""
+        now = self.clock()
+        self._advance(now)
+        expiry = self._expiry.get(user_id)
+        if expiry is None or expiry <= now:
+            return 0
+        return expiry - now
+
+    def hit(self, user_id):
+        """Start the cooldown for user_id"""
+        now = self.clock()
+        self._advance(now)
+        expiry = now + self.cooldown
+        self._expiry[user_id] = expiry
+        slot = int(expiry / self.resolution) % len(self._wheel)
+        self._wheel[slot].append(user_id)
+
+    def clear(self):
+        self._expiry.clear()
+        for bucket in self._wheel:
+            bucket.clear()
+
+    def _advance(self, now):
+        tick = int(now / self.resolution)
+        if tick == self._tick:
+            return
+        if tick - self._tick >= len(self._wheel):
+            # Lâu không có ai gọi: mọi entry đều đã hết hạn
+            self.clear()
+            self._tick = tick
+            return
+
+        # Ô của tick t chứa các entry hết hạn trong [t, t + 1), quét khi đã qua hẳn
+        expiry = self._expiry
+        for t in range(self._tick, tick):
+            bucket = self._wheel[t % len(self._wheel)]
+            for user_id in bucket:
+                # User có thể đã hit lại và nằm ở ô sau
+                if expiry.get(user_id, math.inf) <= now:
+                    del expiry[user_id]
+            bucket.clear()
+        self._tick = tick
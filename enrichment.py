@@ -0,0 +1,159 @@
+import time
+import asyncio
+import logging
+import contextvars
+from collections import Counter, OrderedDict
+from typing import NamedTuple, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class TweetInfo(NamedTuple):
+    """What the lookup endpoint says about one status id"""
+    status_id: int
+    author: Optional[str]  # handle viết thường, None nếu không rõ
+    deleted: bool
+
+
+class TTLCache:
+    """LRU cache whose entries also expire ttl seconds after being stored"""
+
+    def __init__(self, maxsize, ttl, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()  # key -> (expiry, value), cũ nhất ở đầu
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[0] <= self.clock():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return item[1]
+
+    def put(self, key, value):
+        self._data[key] = (self.clock() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+
+class TweetEnricher:
+    """Resolve accepted status ids to TweetInfo in the background.
+
+    submit() never waits: the id goes onto a bounded queue (or is dropped
+    when it is full), and a pool of workers looks it up through one shared
+    keep-alive HTTP client. url_template is formatted with {status_id}.
+    Results are cached by status id, and ids already cached or in flight are
+    not fetched again. on_result(info, handle) is called for each lookup.
+    """
+
+    def __init__(self, url_template, workers=4, queue_size=1000, timeout=5.0,
+                 cache_size=10_000, cache_ttl=3600, on_result=None):
+        self.url_template = url_template
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.on_result = on_result
+        self.cache = TTLCache(cache_size, cache_ttl)
+        self.results = Counter()  # ok / deleted / error / cached / dropped
+        self._queue = None
+        self._pending = set()
+        self._tasks = []
+        self._client = None
+
+    def __len__(self):
+        """Ids queued or being fetched"""
+        return len(self._pending)
+
+    @property
+    def running(self):
+        return self._client is not None
+
+    async def start(self):
+        self._queue = asyncio.Queue(self.queue_size)
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.workers, max_keepalive_connections=self.workers),
+        )
+        # Context rỗng: worker không mang log context của handler đã tạo nó
+        self._tasks = [
+            asyncio.create_task(self._worker(), name=f"enrich-{i}", context=contextvars.Context())
+            for i in range(self.workers)
+        ]
+        logger.info(f"Tweet enrichment started: {self.workers} workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._pending.clear()
+
+    async def join(self):
+        """Wait until every submitted id has been looked up"""
+        if self._queue is not None:
+            await self._queue.join()
+
+    def get(self, status_id):
+        """Cached TweetInfo, or None if unknown or not fetched yet"""
+        return self.cache.get(status_id)
+
+    def submit(self, status_id, handle=None):
+        """Queue status_id for lookup without waiting; False if not queued"""
+        if not self.running:
+            return False
+        if status_id in self._pending or self.cache.get(status_id) is not None:
+            self.results["cached"] += 1
+            return False
+        try:
+            self._queue.put_nowait((status_id, handle))
+        except asyncio.QueueFull:
+            self.results["dropped"] += 1
+            return False
+        self._pending.add(status_id)
+        return True
+
+    async def fetch(self, status_id):
+        response = await self._client.get(self.url_template.format(status_id=status_id))
+        if response.status_code == 404:
+            return TweetInfo(status_id, None, True)
+        response.raise_for_status()
+        data = response.json()
+        # Dạng tweet-result của syndication API: {"user": {"screen_name": ...}}
+        if not data or data.get("__typename") == "TweetTombstone":
+            return TweetInfo(status_id, None, True)
+        author = (data.get("user") or {}).get("screen_name")
+        return TweetInfo(status_id, author.lower() if author else None, False)
+
+    async def _worker(self):
+        while True:
+            status_id, handle = await self._queue.get()
+            try:
+                info = await self.fetch(status_id)
+                self.cache.put(status_id, info)
+                self.results["deleted" if info.deleted else "ok"] += 1
+                if self.on_result is not None:
+                    self.on_result(info, handle)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.results["error"] += 1
+                logger.warning(f"Lookup of tweet {status_id} failed: {e!r}")
+            finally:
+                self._pending.discard(status_id)
+                self._queue.task_done()
@@ -0,0 +1,93 @@
+import io
+import csv
+import gzip
+import json
+from datetime import datetime
+
+FORMATS = ("txt", "csv", "jsonl")
+CSV_FIELDS = ("run_id", "position", "user_id", "name", "status_id", "url", "created_at")
+
+
+def _timestamp(created_at, tz):
+    return datetime.fromtimestamp(created_at, tz).isoformat(timespec="seconds")
+
+
+def iter_txt(rows, title, tz=None):
+    yield f"{title}\n" + "=" * 50 + "\n"
+    run_id = None
+    for row in rows:
+        if row["run_id"] != run_id:
+            run_id = row["run_id"]
+            yield f"\n# Collect #{run_id}\n"
+        yield f"\n{row['position']}. {row['name']}\n{row['text']}\n"
+
+
+def iter_csv(rows, title=None, tz=None):
+    # Một StringIO nhỏ dùng lại cho từng dòng, csv lo phần quote/escape
+    line = io.StringIO()
+    writer = csv.writer(line)
+    writer.writerow(CSV_FIELDS)
+    for row in rows:
+        yield line.getvalue()
+        line.seek(0)
+        line.truncate()
+        writer.writerow((
+            row["run_id"], row["position"], row["user_id"], row["name"],
+            row["status_id"], row["text"], _timestamp(row["created_at"], tz)
+        ))
+    yield line.getvalue()
+
+
+def iter_jsonl(rows, title=None, tz=None):
+    for row in rows:
+        yield json.dumps({
+            "run_id": row["run_id"],
+            "position": row["position"],
+            "user_id": row["user_id"],
+            "name": row["name"],
+            "status_id": row["status_id"],
+            "url": row["text"],
+            "created_at": _timestamp(row["created_at"], tz),
+        }, ensure_ascii=False) + "\n"
+
+
+_WRITERS = {"txt": iter_txt, "csv": iter_csv, "jsonl": iter_jsonl}
+
+
+class _Counter:
+    """Đếm link và người khi rows chảy qua, không giữ lại row nào"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.links = 0
+        self.users = set()
+
+    def __iter__(self):
+        for row in self.rows:
+            self.links += 1
+            self.users.add(row["user_id"])
+            yield row
+
+
+def write_export(rows, fmt="txt", compress=False, title="Bot Export", tz=None):
+    """Stream rows into an in-memory file; returns (buffer, link_count, user_count).
+
+    rows can be any iterable (e.g. CollectHistory.iter_links); nothing is
+    materialized besides the encoded output, which is gzipped on the fly
+    when compress is set.
+    """
+    counter = _Counter(rows)
+    buffer = io.BytesIO()
+    out = gzip.GzipFile(fileobj=buffer, mode="wb") if compress else buffer
+    for chunk in _WRITERS[fmt](counter, title, tz):
+        out.write(chunk.encode("utf-8"))
+    if fmt == "txt":
+        out.write(f"\n{'=' * 50}\nTotal links: {counter.links}\nTotal users: {len(counter.users)}\n".encode("utf-8"))
+    if compress:
+        out.close()
+    buffer.seek(0)
+    return buffer, counter.links, len(counter.users)
+
+
+def export_filename(fmt, compress, timestamp):
+    return f"export_links_{timestamp}.{fmt}" + (".gz" if compress else "")
@@ -0,0 +1,303 @@
+import time
+import queue
+import sqlite3
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_id INTEGER NOT NULL,
+    start_time REAL NOT NULL,
+    end_time REAL NOT NULL,
+    finished_at REAL,
+    user_count INTEGER NOT NULL DEFAULT 0,
+    link_count INTEGER NOT NULL DEFAULT 0,
+    seq INTEGER  -- số thứ tự lần collect trong group, từ 1
+);
+CREATE TABLE IF NOT EXISTS participants (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    user_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    joined_at REAL NOT NULL,
+    PRIMARY KEY (run_id, user_id)
+);
+CREATE TABLE IF NOT EXISTS links (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    group_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    status_id INTEGER,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+-- Tổng hợp theo người, cập nhật mỗi link được nhận; last_run_seq là runs.seq của lần gần nhất
+CREATE TABLE IF NOT EXISTS user_stats (
+    group_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    runs_joined INTEGER NOT NULL,
+    links INTEGER NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    last_run_seq INTEGER NOT NULL,
+    streak INTEGER NOT NULL,
+    best_streak INTEGER NOT NULL,
+    PRIMARY KEY (group_id, user_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_runs_group_time ON runs(group_id, start_time);
+CREATE INDEX IF NOT EXISTS idx_runs_group_seq ON runs(group_id, seq);
+CREATE INDEX IF NOT EXISTS idx_participants_user ON participants(user_id);
+CREATE INDEX IF NOT EXISTS idx_links_run ON links(run_id, position);
+CREATE INDEX IF NOT EXISTS idx_links_user ON links(user_id);
+CREATE INDEX IF NOT EXISTS idx_links_status ON links(status_id);
+CREATE INDEX IF NOT EXISTS idx_links_group_time ON links(group_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_user_stats_links ON user_stats(group_id, links);
+CREATE INDEX IF NOT EXISTS idx_user_stats_runs ON user_stats(group_id, runs_joined);
+CREATE INDEX IF NOT EXISTS idx_user_stats_streak ON user_stats(group_id, best_streak);
+"""
+
+# seq lấy trong cùng câu INSERT nên các worker dùng chung DB không bao giờ trùng số
+START_RUN = """
+INSERT INTO runs (group_id, start_time, end_time, seq)
+VALUES (?, ?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM runs WHERE group_id = ?))
+"""
+
+# Cập nhật O(1): một upsert theo khoá chính. Vế phải của SET đọc giá trị cũ của dòng
+_STREAK = """CASE
+        WHEN last_run_seq = excluded.last_run_seq THEN streak
+        WHEN last_run_seq = excluded.last_run_seq - 1 THEN streak + 1
+        ELSE 1 END"""
+RECORD_PARTICIPATION = f"""
+INSERT INTO user_stats (group_id, user_id, name, runs_joined, links, first_seen, last_seen,
+                        last_run_seq, streak, best_streak)
+VALUES (?, ?, ?, 1, 1, ?, ?, (SELECT seq FROM runs WHERE id = ?), 1, 1)
+ON CONFLICT (group_id, user_id) DO UPDATE SET
+    name = excluded.name,
+    links = links + 1,
+    last_seen = excluded.last_seen,
+    runs_joined = runs_joined + (last_run_seq != excluded.last_run_seq),
+    streak = {_STREAK},
+    best_streak = MAX(best_streak, {_STREAK}),
+    last_run_seq = excluded.last_run_seq
+"""
+
+LEADERBOARD_ORDER = {
+    "links": "links DESC, runs_joined DESC",
+    "runs": "runs_joined DESC, links DESC",
+    "streak": "best_streak DESC, runs_joined DESC",
+}
+
+_STOP = object()
+
+
+class CollectHistory:
+    """Lịch sử collect trong SQLite (WAL).
+
+    Mọi lệnh ghi đi qua một thread riêng và được gom thành một transaction,
+    nên handler chỉ cần bỏ vào queue, không phải chờ fsync.
+    """
+
+    def __init__(self, path, flush_interval=1.0, max_batch=500):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+
+    # ---------------- lifecycle ----------------
+    def open(self):
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.close()
+        self._thread = threading.Thread(target=self._writer, name="collect-history", daemon=True)
+        self._thread.start()
+        logger.info(f"Collect history opened: {self.path}")
+
+    def close(self):
+        """Flush queued writes and stop the writer thread (blocking)"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # ---------------- writer thread ----------------
+    def _writer(self):
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            # Có người đang chờ kết quả thì ghi ngay, không thì gom thêm
+            if batch[0] is not _STOP and batch[0][2] is None:
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        op = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    batch.append(op)
+                    if op is _STOP or op[2] is not None:
+                        break
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if _STOP in batch:
+                stopping = True
+                batch = [op for op in batch if op is not _STOP]
+            self._execute(conn, batch)
+        conn.close()
+
+    def _execute(self, conn, batch):
+        results = []
+        try:
+            with conn:
+                for sql, params, future in batch:
+                    cursor = conn.execute(sql, params)
+                    results.append((future, cursor.lastrowid))
+        except Exception as e:
+            logger.error(f"Failed to write collect history ({len(batch)} ops): {e}")
+            for _, _, future in batch:
+                if future is not None:
+                    future.set_exception(e)
+            return
+        for future, rowid in results:
+            if future is not None:
+                future.set_result(rowid)
+
+    def _submit(self, sql, params, wait=False):
+        if self._thread is None:
+            raise RuntimeError("collect history is not open")
+        future = Future() if wait else None
+        self._queue.put((sql, params, future))
+        return future
+
+    # ---------------- writes ----------------
+    async def start_run(self, group_id, start_time, end_time):
+        """Insert a run row, numbered after the group's previous runs, and return its id"""
+        future = self._submit(START_RUN, (group_id, start_time, end_time, group_id), wait=True)
+        return await asyncio.wrap_future(future)
+
+    def record_link(self, run_id, group_id, user_id, name, position, status_id, text, created_at):
+        """Queue a participant and its link, never blocks"""
+        self._submit(
+            "INSERT OR IGNORE INTO participants (run_id, user_id, name, joined_at) VALUES (?, ?, ?, ?)",
+            (run_id, user_id, name, created_at)
+        )
+        self._submit(
+            "INSERT INTO links (run_id, group_id, user_id, position, status_id, text, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (run_id, group_id, user_id, position, status_id, text, created_at)
+        )
+
+    def record_participation(self, run_id, group_id, user_id, name, created_at):
+        """Queue the update of the user's aggregates for an accepted link, never blocks"""
+        self._submit(RECORD_PARTICIPATION, (group_id, user_id, name, created_at, created_at, run_id))
+
+    async def sync(self):
+        """Wait until every write queued so far is committed"""
+        await asyncio.wrap_future(self._submit("SELECT 1", (), wait=True))
+
+    def finish_run(self, run_id, finished_at, user_count, link_count):
+        self._submit(
+            "UPDATE runs SET finished_at = ?, user_count = ?, link_count = ? WHERE id = ?",
+            (finished_at, user_count, link_count, run_id)
+        )
+
+    # ---------------- queries ----------------
+    def _query(self, sql, params):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    async def recent_runs(self, group_id, limit=5):
+        return await asyncio.to_thread(
+            self._query,
+            "SELECT * FROM runs WHERE group_id = ? ORDER BY start_time DESC LIMIT ?",
+            (group_id, limit)
+        )
+
+    async def leaderboard(self, group_id, order="links", limit=10):
+        """Top users of a group from the aggregates; order is a LEADERBOARD_ORDER key"""
+        return await asyncio.to_thread(
+            self._query,
+            "SELECT *, (SELECT MAX(seq) FROM runs WHERE group_id = s.group_id) AS latest_seq "
+            f"FROM user_stats s WHERE group_id = ? ORDER BY {LEADERBOARD_ORDER[order]} LIMIT ?",
+            (group_id, limit)
+        )
+
+    async def user_stats(self, group_id, user_id):
+        """The user's aggregates plus their rank by links, or None"""
+        rows = await asyncio.to_thread(
+            self._query,
+            "SELECT s.*, (SELECT COUNT(*) + 1 FROM user_stats o "
+            "             WHERE o.group_id = s.group_id AND o.links > s.links) AS rank, "
+            "       (SELECT COUNT(*) FROM user_stats o WHERE o.group_id = s.group_id) AS total, "
+            "       (SELECT MAX(seq) FROM runs WHERE group_id = s.group_id) AS latest_seq "
+            "FROM user_stats s WHERE s.group_id = ? AND s.user_id = ?",
+            (group_id, user_id)
+        )
+        return rows[0] if rows else None
+
+    def iter_links(self, group_id=None, run_from=None, run_to=None, since=None, until=None, batch_size=1000):
+        """Stream link rows ordered by run and position (blocking, run it in a thread).
+
+        Rows are fetched batch_size at a time from a private connection, so
+        memory stays flat however many links match.
+        """
+        where, params = [], []
+        if group_id is not None:
+            where.append("l.group_id = ?")
+            params.append(group_id)
+        if run_from is not None:
+            where.append("l.run_id >= ?")
+            params.append(run_from)
+        if run_to is not None:
+            where.append("l.run_id <= ?")
+            params.append(run_to)
+        if since is not None:
+            where.append("l.created_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("l.created_at < ?")
+            params.append(until)
+        sql = (
+            "SELECT l.run_id, l.position, l.user_id, p.name, l.status_id, l.text, l.created_at "
+            "FROM links l JOIN participants p ON p.run_id = l.run_id AND p.user_id = l.user_id"
+        )
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY l.run_id, l.position"
+
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(row)
+        finally:
+            conn.close()
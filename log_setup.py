@@ -0,0 +1,130 @@
+import os
+import gzip
+import json
+import time
+import queue
+import shutil
+import atexit
+import logging
+import contextvars
+import logging.handlers
+from datetime import datetime, timezone
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+CONTEXT_FIELDS = ("handler", "chat_id", "user_id")
+
+# handler/chat/user của update đang xử lý, gắn vào mọi dòng log trong lúc đó
+log_context = contextvars.ContextVar("log_context", default={})
+
+
+def bind_log_context(**fields):
+    """Set context fields for the current task; returns a token for reset_log_context"""
+    return log_context.set(fields)
+
+
+def reset_log_context(token):
+    log_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Copy the current log context onto the record before it leaves the event loop"""
+
+    def filter(self, record):
+        context = log_context.get()
+        for field in CONTEXT_FIELDS:
+            if not hasattr(record, field):
+                setattr(record, field, context.get(field))
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Một dòng JSON mỗi record, có chat_id/user_id/handler nếu biết"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def _gzip_rotator(source, dest):
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+class RotatingLogHandler(logging.handlers.RotatingFileHandler):
+    """Rotate when the file reaches max_bytes or every interval seconds.
+
+    Backups are numbered (bot.log.1.gz is the newest) and gzipped when
+    compress is set. Rotation runs in the listener thread, never on the
+    event loop.
+    """
+
+    def __init__(self, filename, max_bytes=0, backup_count=0, interval=0, compress=True):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.interval = interval
+        self.rollover_at = time.time() + interval
+        if compress:
+            self.namer = lambda name: name + ".gz"
+            self.rotator = _gzip_rotator
+
+    def shouldRollover(self, record):
+        if self.stream is None:
+            self.stream = self._open()
+        if self.interval and time.time() >= self.rollover_at:
+            if self.stream.tell() > 0:
+                return True
+            self.rollover_at = time.time() + self.interval
+        return self.maxBytes > 0 and self.stream.tell() >= self.maxBytes
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def stop(self):
+        # Gọi được nhiều lần: lúc shutdown và lúc atexit
+        if self._thread is not None:
+            super().stop()
+
+
+def setup_logging(path, level=logging.INFO, json_format=False, max_bytes=0, backup_count=0,
+                  interval=0, compress=True):
+    """Route all logging through a queue to a background thread.
+
+    Callers only merge the message and enqueue the record (tracebacks are
+    folded into the message); the listener thread formats it and writes the
+    rotating file and the console. Returns the QueueListener,
+    which is also stopped (and drained) at exit.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    formatter = JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT)
+
+    file_handler = RotatingLogHandler(path, max_bytes, backup_count, interval, compress)
+    console_handler = logging.StreamHandler()
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()  # không giới hạn: put() không bao giờ chờ
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+
+    listener = _QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,261 @@
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import contextvars
+from collections import defaultdict, deque
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Số nhỏ được gửi trước: chọn chat nào gửi tiếp, không đổi thứ tự trong một chat
+PRIORITY_RESULT = 0  # kết quả collect, ghim/bỏ ghim
+PRIORITY_NORMAL = 1  # thông báo bắt đầu/dừng, broadcast, lệnh admin
+PRIORITY_REPLY = 2   # xác nhận, cảnh báo cooldown
+
+# Giới hạn của Telegram: ~30 tin/giây toàn bot, ~1 tin/giây mỗi chat,
+# tối đa 20 tin/phút trong một group
+GLOBAL_RATE = 30
+CHAT_RATE = 1
+GROUP_RATE_PER_MINUTE = 20
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Seconds until one token is available"""
+        self._refill(now)
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _ChatQueue:
+    __slots__ = ("jobs", "buckets", "busy", "not_before")
+
+    def __init__(self, buckets):
+        self.jobs = deque()  # (priority, seq, job) theo thứ tự submit
+        self.buckets = buckets
+        self.busy = False
+        self.not_before = 0  # bị RetryAfter thì đợi tới lúc này
+
+    def delay(self, now):
+        return max(self.not_before - now, *(b.delay(now) for b in self.buckets))
+
+    def priority(self):
+        """Most urgent priority waiting in this chat, and the seq of its first job"""
+        return min(priority for priority, _, _ in self.jobs), self.jobs[0][1]
+
+
+class Outbox:
+    """Hàng đợi gửi tin duy nhất của bot.
+
+    Mỗi chat có một hàng đợi FIFO riêng và chỉ có một request đang bay, nên
+    thứ tự trong chat được giữ nguyên. Priority chỉ dùng để chọn giữa các
+    chat: chat đang chờ tin ưu tiên cao nhất được gửi trước, trong giới hạn
+    token bucket toàn cục và của từng chat. RetryAfter được tôn trọng đúng
+    số giây Telegram trả về.
+    """
+
+    def __init__(self, global_rate=GLOBAL_RATE, chat_rate=CHAT_RATE,
+                 group_rate_per_minute=GROUP_RATE_PER_MINUTE, max_retries=3):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.group_rate_per_minute = group_rate_per_minute
+        self.max_retries = max_retries
+        self._chats = {}
+        self._ready = []    # heap (priority, seq, chat_id): chat gửi được ngay
+        self._delayed = []  # heap (ready_at, chat_id): chat đang chờ bucket/RetryAfter
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._dispatcher = None
+        self._inflight = set()
+        self.calls = defaultdict(int)
+        self.failures = defaultdict(int)
+
+    def __len__(self):
+        return sum(len(q.jobs) + q.busy for q in self._chats.values())
+
+    # ---------------- public API ----------------
+    def submit(self, chat_id, method, /, *args, priority=PRIORITY_NORMAL, **kwargs):
+        """Queue an API call for chat_id; returns a future with its result.
+
+        Nobody has to await the future: failures are logged either way.
+        """
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            # Dispatcher sống lâu hơn handler gọi nó, không mang theo contextvars của handler
+            self._dispatcher = loop.create_task(self._run(), context=contextvars.Context())
+
+        future = loop.create_future()
+        future.add_done_callback(_log_failure)
+        chat = self._chat(chat_id)
+        chat.jobs.append((priority, next(self._seq), (method, args, kwargs, future, 0)))
+        if not chat.busy:
+            self._schedule(chat_id, chat)
+        return future
+
+    async def drain(self, timeout):
+        """Keep sending for up to timeout seconds, then close; returns how many calls were dropped"""
+        deadline = time.monotonic() + timeout
+        while len(self) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        dropped = len(self)
+        await self.close()
+        return dropped
+
+    async def close(self):
+        """Stop dispatching; pending jobs are cancelled"""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+            self._dispatcher = None
+        for task in list(self._inflight):
+            task.cancel()
+        await asyncio.gather(*self._inflight, return_exceptions=True)
+        for chat in self._chats.values():
+            for _, _, (_, _, _, future, _) in chat.jobs:
+                future.cancel()
+        self._chats.clear()
+        self._ready.clear()
+        self._delayed.clear()
+
+    # ---------------- dispatcher ----------------
+    def _chat(self, chat_id):
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            buckets = [TokenBucket(self.chat_rate, 1)]
+            if chat_id < 0:
+                rate = self.group_rate_per_minute / 60
+                buckets.append(TokenBucket(rate, self.group_rate_per_minute))
+            chat = self._chats[chat_id] = _ChatQueue(buckets)
+        return chat
+
+    def _schedule(self, chat_id, chat):
+        """Put a non-busy chat with pending jobs into the ready or delayed heap"""
+        if not chat.jobs:
+            return
+        now = time.monotonic()
+        delay = chat.delay(now)
+        if delay > 0:
+            heapq.heappush(self._delayed, (now + delay, chat_id))
+        else:
+            priority, seq = chat.priority()
+            heapq.heappush(self._ready, (priority, seq, chat_id))
+        self._wakeup.set()
+
+    def _sweep(self, now):
+        """Drop idle chats whose buckets are full again, keeps memory flat"""
+        idle = [
+            chat_id for chat_id, chat in self._chats.items()
+            if not chat.jobs and not chat.busy and chat.delay(now) == 0
+            and all(b.tokens >= b.capacity for b in chat.buckets)
+        ]
+        for chat_id in idle:
+            del self._chats[chat_id]
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            while self._delayed and self._delayed[0][0] <= now:
+                _, chat_id = heapq.heappop(self._delayed)
+                chat = self._chats.get(chat_id)
+                if chat is not None and not chat.busy:
+                    self._schedule(chat_id, chat)
+
+            if not self._ready:
+                self._sweep(now)
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            delay = self.global_bucket.delay(now)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            _, _, chat_id = heapq.heappop(self._ready)
+            chat = self._chats.get(chat_id)
+            if chat is None or chat.busy or not chat.jobs:
+                continue  # entry cũ
+            if chat.delay(now) > 0:
+                self._schedule(chat_id, chat)
+                continue
+
+            priority, seq, job = chat.jobs.popleft()
+            chat.busy = True
+            self.global_bucket.consume(now)
+            for bucket in chat.buckets:
+                bucket.consume(now)
+            task = asyncio.create_task(self._send(chat_id, chat, (priority, seq, job)))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, chat_id, chat, entry):
+        priority, seq, (method, args, kwargs, future, attempt) = entry
+        name = getattr(method, "__name__", "call")
+        requeue = False
+        try:
+            if future.cancelled():
+                return
+            self.calls[name] += 1
+            result = await method(*args, **kwargs)
+            if not future.done():
+                future.set_result(result)
+        except RetryAfter as e:
+            self.failures[name] += 1
+            logger.warning(f"Flood control in chat {chat_id} ({name}), retrying in {e.retry_after}s")
+            chat.not_before = time.monotonic() + e.retry_after
+            requeue = True
+        except (BadRequest, Forbidden) as e:
+            self.failures[name] += 1
+            if not future.done():
+                future.set_exception(e)
+        except NetworkError as e:
+            self.failures[name] += 1
+            if attempt + 1 < self.max_retries:
+                logger.warning(f"{name} to {chat_id} failed (attempt {attempt + 1}): {e}")
+                chat.not_before = time.monotonic() + 2 ** attempt
+                entry = (priority, seq, (method, args, kwargs, future, attempt + 1))
+                requeue = True
+            elif not future.done():
+                future.set_exception(e)
+        except Exception as e:
+            self.failures[name] += 1
+            if not future.done():
+                future.set_exception(e)
+        finally:
+            if requeue:
+                # Gửi lại trước mọi tin đến sau trong chat
+                chat.jobs.appendleft(entry)
+            chat.busy = False
+            if self._chats.get(chat_id) is chat:
+                self._schedule(chat_id, chat)
+
+
+def _log_failure(future):
+    if future.cancelled():
+        return
+    e = future.exception()
+    if e is not None:
+        logger.error(f"Outbound call failed: {e}")
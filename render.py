@@ -0,0 +1,193 @@
+import re
+import string
+import logging
+from array import array
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MAX_LENGTH = 4096
+
+
+def telegram_length(text: str) -> int:
+    """Độ dài theo cách Telegram đếm (UTF-16 code unit)"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+class SummaryPacker:
+    """Xếp các entry của kết quả collect thành các trang.
+
+    Entry được đo dần khi link đến; mỗi trang được lấp gần sát giới hạn của
+    Telegram mà không cắt đôi entry nào. Trang đầu chừa chỗ cho header, các
+    trang sau bắt đầu bằng `continuation`. Packer chỉ giữ vị trí ngắt trang,
+    không giữ chữ: lúc kết thúc, entry được dựng lại và ghép theo các vị trí đó.
+    """
+
+    def __init__(self, header_reserve, continuation="", separator="\n\n", limit=TELEGRAM_MAX_LENGTH):
+        self.header_reserve = header_reserve
+        self.continuation = continuation
+        self.separator = separator
+        self.limit = limit
+        self._sep_len = telegram_length(separator)
+        self._cont_len = telegram_length(continuation)
+        self.clear()
+
+    def __len__(self):
+        return self._count
+
+    def clear(self):
+        self._breaks = array("I")  # số thứ tự entry mở đầu mỗi trang, trừ trang đầu
+        self._current_len = 0
+        self._count = 0
+
+    def _capacity(self, page):
+        prefix = self.header_reserve if page == 0 else self._cont_len
+        return self.limit - prefix
+
+    def add(self, entry: str):
+        length = telegram_length(entry)
+        page = len(self._breaks)
+        if self._count > (self._breaks[-1] if page else 0):
+            if self._current_len + self._sep_len + length <= self._capacity(page):
+                self._current_len += self._sep_len + length
+                self._count += 1
+                return
+            self._breaks.append(self._count)
+            page += 1
+        # Một entry dài hơn cả trang (hiếm) bị cắt đuôi lúc dựng trang
+        self._current_len = min(length, self._capacity(page))
+        self._count += 1
+
+    def pages(self, header: str, entries) -> list:
+        """Return the ready-to-send pages, header prepended to the first one.
+
+        entries are the same strings that were added, in the same order.
+        """
+        if not self._count:
+            return [header]
+        bounds = [0, *self._breaks, self._count]
+        bodies = []
+        for page, (start, end) in enumerate(zip(bounds, bounds[1:])):
+            if end - start == 1:
+                entry = entries[start]
+                capacity = self._capacity(page)
+                if telegram_length(entry) > capacity:
+                    entry = entry.encode("utf-16-le")[:capacity * 2].decode("utf-16-le", "ignore")
+                bodies.append(entry)
+            else:
+                bodies.append(self.separator.join(entries[start:end]))
+        return [header + bodies[0]] + [self.continuation + body for body in bodies[1:]]
+
+
+# ================= MARKDOWN V2 =================
+MARKDOWN_V2 = "MarkdownV2"
+_SPECIAL_CHARS = r"_*[]()~`>#+-=|{}.!\\"
+_ESCAPE_TABLE = str.maketrans({c: "\\" + c for c in _SPECIAL_CHARS})
+_PLAIN_RE = re.compile(r"\\(.)|\|\||[*_~`]", re.DOTALL)
+
+
+def escape_markdown(text: str) -> str:
+    """Escape MarkdownV2 special characters in one pass"""
+    return str(text).translate(_ESCAPE_TABLE)
+
+
+class Template:
+    """Template MarkdownV2 được biên dịch một lần.
+
+    Nguồn viết như chuỗi format bình thường, in đậm bằng **...**; phần chữ
+    tĩnh được escape sẵn lúc biên dịch, giá trị truyền vào được escape lúc
+    render.
+    """
+
+    def __init__(self, source: str):
+        self.parts = []
+        for literal, field, spec, conversion in string.Formatter().parse(source):
+            if literal:
+                self.parts.append("*".join(escape_markdown(s) for s in literal.split("**")))
+            if field is not None:
+                self.parts.append((field, spec or "", conversion))
+
+    def render(self, **values) -> str:
+        out = []
+        for part in self.parts:
+            if isinstance(part, str):
+                out.append(part)
+                continue
+            field, spec, conversion = part
+            value = values[field]
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "s":
+                value = str(value)
+            out.append(escape_markdown(format(value, spec)))
+        return "".join(out)
+
+
+def find_markdown_error(text: str):
+    """Check MarkdownV2 entities locally, return a description of the first error or None"""
+    stack = []
+    i, n = 0, len(text)
+    while i < n:
+        c = text[i]
+        if c == "\\":
+            if i + 1 >= n:
+                return "dangling backslash at end"
+            i += 2
+            continue
+        if c == "`":
+            fence = "```" if text.startswith("```", i) else "`"
+            j = i + len(fence)
+            while j < n and not text.startswith(fence, j):
+                j += 2 if text[j] == "\\" else 1
+            if j >= n:
+                return f"unclosed code at {i}"
+            i = j + len(fence)
+            continue
+        if c == "[":
+            stack.append("[")
+        elif c == "]":
+            if not stack or stack[-1] != "[":
+                return f"unmatched ']' at {i}"
+            stack.pop()
+            if not text.startswith("(", i + 1):
+                return f"link without url at {i}"
+            j = i + 2
+            while j < n and text[j] != ")":
+                j += 2 if text[j] == "\\" else 1
+            if j >= n:
+                return f"unclosed link url at {i}"
+            i = j + 1
+            continue
+        elif c in "*_~|":
+            token = c
+            if c in "_|" and text.startswith(c * 2, i):
+                token = c * 2
+            elif c == "|":
+                return f"unescaped '|' at {i}"
+            if stack and stack[-1] == token:
+                stack.pop()
+            elif token in stack:
+                return f"badly nested '{token}' at {i}"
+            else:
+                stack.append(token)
+            i += len(token)
+            continue
+        elif c in _SPECIAL_CHARS:
+            return f"unescaped '{c}' at {i}"
+        i += 1
+    if stack:
+        return f"unclosed '{stack[-1]}'"
+    return None
+
+
+def to_plain(text: str) -> str:
+    """Drop MarkdownV2 markup and escapes"""
+    return _PLAIN_RE.sub(lambda m: m.group(1) or "", text)
+
+
+def prepare_markdown(text: str):
+    """Return (text, parse_mode) that Telegram accepts on the first try"""
+    error = find_markdown_error(text)
+    if error is None:
+        return text, MARKDOWN_V2
+    logger.warning(f"Invalid MarkdownV2 ({error}), sending as plain text")
+    return to_plain(text), None
@@ -0,0 +1,338 @@
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import signal
+import sqlite3
+import asyncio
+import logging
+from collections import OrderedDict
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+ACK_PREFIX = "ack"
+ALL_WORKERS = object()  # shard_key trả về giá trị này: gửi update cho mọi worker
+
+
+def shard_of(chat_id, workers):
+    """Worker index owning chat_id; stable across restarts and Python versions"""
+    if chat_id is None or workers <= 1:
+        return 0
+    return zlib.crc32(struct.pack("<q", chat_id)) % workers
+
+
+# ================= ORDERING ================
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Process updates of different chats concurrently, those of one chat in arrival order.
+
+    PTB's semaphore is taken before do_process_update, so updates waiting
+    behind their chat would hold the slots other chats need. The base
+    semaphore is made unbounded and the real limit is applied once the
+    update is first in its chat.
+    """
+
+    def __init__(self, max_concurrent_updates):
+        if max_concurrent_updates < 1:
+            raise ValueError("`max_concurrent_updates` must be a positive integer!")
+        super().__init__(sys.maxsize)
+        self.limit = max_concurrent_updates
+        self._running = asyncio.Semaphore(max_concurrent_updates)
+        self._chats = {}  # chat id -> [Lock, số update đang chờ hoặc chạy]
+
+    async def do_process_update(self, update, coroutine):
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            async with self._running:
+                await coroutine
+            return
+
+        entry = self._chats.get(chat.id)
+        if entry is None:
+            entry = self._chats[chat.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            # asyncio.Lock trả lượt theo thứ tự chờ, tức thứ tự update đến
+            async with entry[0], self._running:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chats[chat.id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
+# ================= SHARED STATE ============
+class GroupStateDB:
+    """Group state as one row per group in SQLite, shared by all workers.
+
+    Each worker only writes the groups it owns, so writers never overwrite
+    each other's groups, and a restarted (or re-sharded) worker loads its
+    groups from the same file.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS group_state ("
+        "group_id INTEGER PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+    )
+
+    def __init__(self, path):
+        self.path = path
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")  # state phải còn sau khi worker chết
+        conn.execute(self.SCHEMA)
+        return conn
+
+    def write(self, groups):
+        """Upsert [(group_id, json text)] in one transaction (blocking)"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO group_state (group_id, data, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT (group_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                    [(group_id, data, now) for group_id, data in groups]
+                )
+        finally:
+            conn.close()
+
+    def load(self, workers=1, index=0):
+        """Group dicts of shard index out of workers"""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT group_id, data FROM group_state").fetchall()
+        finally:
+            conn.close()
+        return [json.loads(data) for group_id, data in rows if shard_of(group_id, workers) == index]
+
+    def import_json(self, path):
+        """Copy groups from a single-process state file into an empty table; returns how many"""
+        conn = self._connect()
+        try:
+            empty = conn.execute("SELECT 1 FROM group_state LIMIT 1").fetchone() is None
+        finally:
+            conn.close()
+        if not empty or not os.path.exists(path):
+            return 0
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        groups = data.get("groups")
+        if groups is None:
+            groups = [data] if data.get("group_id") is not None else []
+        self.write([(group["group_id"], json.dumps(group)) for group in groups])
+        return len(groups)
+
+
+class AckTracker:
+    """Tell the dispatcher which updates are safe to forget.
+
+    An update is acked once the state write that contains its effects has
+    completed, so the dispatcher replays exactly the updates whose effects a
+    crash could have lost. The store counts snapshots taken and written and
+    calls on_written after each successful write.
+    """
+
+    def __init__(self, store, output=sys.stdout):
+        self.store = store
+        self.output = output
+        self._waiting = []  # (snapshot cần ghi xong, update_id)
+        store.on_written = self._written
+
+    def done(self, update_id):
+        # Còn thay đổi chưa chụp: cần snapshot kế tiếp; không thì snapshot đang ghi (nếu có)
+        needed = self.store.taken + (1 if self.store.dirty else 0)
+        if needed <= self.store.written:
+            self._send([update_id])
+        else:
+            self._waiting.append((needed, update_id))
+
+    def _written(self):
+        written = self.store.written
+        ready = [update_id for needed, update_id in self._waiting if needed <= written]
+        if ready:
+            self._waiting = [item for item in self._waiting if item[0] > written]
+            self._send(ready)
+
+    def _send(self, update_ids):
+        self.output.write(f"{ACK_PREFIX} {' '.join(map(str, update_ids))}\n")
+        self.output.flush()
+
+
+async def open_stdin(limit=2**20):
+    """StreamReader over this process's stdin, where a worker receives its updates"""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=limit)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    return reader
+
+
+# ================= DISPATCHER ==============
+class WorkerProcess:
+    """One worker subprocess, fed JSON updates on stdin.
+
+    Every update is kept until the worker acks it; when the worker dies it is
+    restarted and the unacked updates are written again, in order, before
+    any new one.
+    """
+
+    def __init__(self, index, argv, env, restart_delay=1.0):
+        self.index = index
+        self.argv = argv
+        self.env = env
+        self.restart_delay = restart_delay
+        self.pending = OrderedDict()  # update_id -> dòng JSON, theo thứ tự gửi
+        self.restarts = 0
+        self.proc = None
+        self._stopping = False
+        self._watcher = None
+
+    @property
+    def alive(self):
+        return self.proc is not None and self.proc.returncode is None
+
+    async def start(self):
+        await self._spawn()
+        self._watcher = asyncio.create_task(self._watch(), name=f"worker-{self.index}-watch")
+
+    async def _spawn(self):
+        self.proc = await asyncio.create_subprocess_exec(
+            *self.argv, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, env=self.env
+        )
+        self._acks = asyncio.create_task(self._read_acks(self.proc), name=f"worker-{self.index}-acks")
+        logger.info(f"Worker {self.index} started (pid {self.proc.pid}), replaying {len(self.pending)} updates")
+        for line in self.pending.values():
+            self.proc.stdin.write(line)
+
+    async def send(self, update_id, line):
+        self.pending[update_id] = line
+        if self.alive:
+            try:
+                self.proc.stdin.write(line)
+                await self.proc.stdin.drain()  # worker chậm thì dispatcher chờ
+            except ConnectionError:
+                pass  # Worker vừa chết, update sẽ được gửi lại khi khởi động lại
+
+    async def _read_acks(self, proc):
+        while True:
+            line = await proc.stdout.readline()
+            if not line:
+                return
+            kind, _, ids = line.decode().partition(" ")
+            if kind == ACK_PREFIX:
+                for update_id in ids.split():
+                    self.pending.pop(int(update_id), None)
+
+    async def _watch(self):
+        while True:
+            returncode = await self.proc.wait()
+            await self._acks
+            if self._stopping:
+                return
+            self.restarts += 1
+            logger.error(
+                f"Worker {self.index} exited with {returncode}, restarting with "
+                f"{len(self.pending)} unacknowledged updates"
+            )
+            await asyncio.sleep(self.restart_delay)
+            await self._spawn()
+
+    async def stop(self, timeout):
+        """Close stdin so the worker shuts down cleanly; kill it after timeout"""
+        self._stopping = True
+        if self.alive:
+            self.proc.stdin.close()
+            try:
+                await asyncio.wait_for(self.proc.wait(), timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"Worker {self.index} did not stop within {timeout}s, killing it")
+                self.proc.kill()
+                await self.proc.wait()
+        if self._watcher is not None:
+            await asyncio.gather(self._watcher, return_exceptions=True)
+
+
+def chat_key(update):
+    chat = update.effective_chat
+    return chat.id if chat else None
+
+
+class Dispatcher:
+    """Route updates to worker processes by a hash of the chat id.
+
+    All updates of a chat go to the same worker through one pipe, so they
+    arrive in order; the worker keeps that order per chat. shard_key(update)
+    picks the chat id to hash (default: the chat the update came from) or
+    returns ALL_WORKERS to send the update to every worker.
+    """
+
+    def __init__(self, workers, argv, env=None, restart_delay=1.0, shard_key=chat_key):
+        env = dict(os.environ if env is None else env)
+        self.workers = [
+            WorkerProcess(i, argv, {**env, "WORKERS": str(workers), "WORKER_INDEX": str(i)}, restart_delay)
+            for i in range(workers)
+        ]
+        self.shard_key = shard_key
+        self.routed = 0
+
+    async def start(self):
+        for worker in self.workers:
+            await worker.start()
+
+    async def route(self, update):
+        key = self.shard_key(update)
+        if key is ALL_WORKERS:
+            workers = self.workers
+        else:
+            workers = [self.workers[shard_of(key, len(self.workers))]]
+        line = (json.dumps(update.to_dict()) + "\n").encode()
+        for worker in workers:
+            await worker.send(update.update_id, line)
+        self.routed += 1
+
+    async def run(self, update_queue, stop_event):
+        """Route everything from update_queue until stop_event is set"""
+        while not stop_event.is_set():
+            get = asyncio.ensure_future(update_queue.get())
+            stop = asyncio.ensure_future(stop_event.wait())
+            done, _ = await asyncio.wait({get, stop}, return_when=asyncio.FIRST_COMPLETED)
+            stop.cancel()
+            if get in done:
+                await self.route(get.result())
+                update_queue.task_done()
+            else:
+                get.cancel()
+
+    async def flush(self, update_queue):
+        """Route what is left in update_queue once intake has stopped"""
+        while not update_queue.empty():
+            await self.route(update_queue.get_nowait())
+            update_queue.task_done()
+
+    @property
+    def unacknowledged(self):
+        return sum(len(worker.pending) for worker in self.workers)
+
+    async def stop(self, timeout):
+        await asyncio.gather(*(worker.stop(timeout) for worker in self.workers))
+
+
+def install_stop_signals(stop_event, signals=(signal.SIGINT, signal.SIGTERM)):
+    loop = asyncio.get_running_loop()
+    for sig in signals:
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows hoặc không phải main thread
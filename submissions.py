@@ -0,0 +1,105 @@
+import sys
+from array import array
+from typing import NamedTuple
+
+from tweets import TweetLink
+
+
+class Submission(NamedTuple):
+    """One accepted link, rebuilt from the columns when it is read"""
+    position: int  # từ 1, thứ tự trong kết quả
+    user_id: int
+    status_id: int
+    created_at: float
+    name: str
+    handle: str
+
+    @property
+    def url(self):
+        return TweetLink(self.handle, self.status_id).url
+
+    @property
+    def entry(self):
+        """Plain-text result line: "n. name" then the link"""
+        return f"{self.position}. {self.name}\n{self.url}"
+
+
+class Submissions:
+    """Links accepted in one collect, stored column-wise in arrival order.
+
+    Ids and timestamps sit in typed arrays (8 bytes each), names and handles
+    are interned strings, and nothing is formatted until a result page or
+    the board asks for it. `users` and `status_ids` are the sets behind the
+    O(1) duplicate checks.
+    """
+    __slots__ = ("users", "status_ids", "_user_ids", "_status_ids", "_created_at", "_names", "_handles")
+
+    def __init__(self):
+        self.users = set()
+        self.status_ids = set()
+        self.clear()
+
+    def __len__(self):
+        return len(self._names)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("submission index out of range")
+        return Submission(
+            index + 1, self._user_ids[index], self._status_ids[index], self._created_at[index],
+            self._names[index], self._handles[index]
+        )
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def clear(self):
+        self.users.clear()
+        self.status_ids.clear()
+        self._user_ids = array("q")
+        self._status_ids = array("q")
+        self._created_at = array("d")
+        self._names = []
+        self._handles = []
+
+    def add(self, user_id, status_id, name, handle, created_at):
+        """Append a link; returns its position (from 1)"""
+        self.users.add(user_id)
+        self.status_ids.add(status_id)
+        self._user_ids.append(user_id)
+        self._status_ids.append(status_id)
+        self._created_at.append(created_at)
+        self._names.append(sys.intern(name))
+        self._handles.append(sys.intern(handle))
+        return len(self)
+
+    def entries(self):
+        """Plain-text result lines, in order"""
+        return [
+            f"{position}. {name}\n{TweetLink(handle, status_id).url}"
+            for position, (name, handle, status_id) in enumerate(
+                zip(self._names, self._handles, self._status_ids), 1
+            )
+        ]
+
+    def recent(self, count):
+        """The last count submissions, newest first"""
+        return [self[index] for index in range(len(self) - 1, max(len(self) - count, 0) - 1, -1)]
+
+    # ---------------- state file ----------------
+    def to_dict(self):
+        return {
+            "user_ids": self._user_ids.tolist(),
+            "status_ids": self._status_ids.tolist(),
+            "created_at": self._created_at.tolist(),
+            "names": list(self._names),  # bản sao: state file được encode ở thread khác
+            "handles": list(self._handles),
+        }
+
+    def from_dict(self, data):
+        self.clear()
+        for row in zip(data["user_ids"], data["status_ids"], data["names"], data["handles"], data["created_at"]):
+            self.add(*row)
@@ -0,0 +1,77 @@
+import re
+import sys
+from typing import NamedTuple, Optional
+
+# x.com, twitter.com, www./mobile./m. subdomain, có hoặc không có scheme,
+# /status/ hoặc /statuses/, bỏ qua query string (?s=20) và phần đuôi (/photo/1)
+TWEET_REGEX = re.compile(
+    r"(?<![\w.])(?:https?:\/\/)?(?:www\.|mobile\.|m\.)?(?:x|twitter)\.com\/(\w{1,15})\/status(?:es)?\/(\d{1,20})",
+    re.IGNORECASE
+)
+MAX_STATUS_ID = 2**63 - 1  # status id là số 64 bit có dấu; dài hơn thì không phải tweet
+
+
+class TweetLink(NamedTuple):
+    """Canonical tweet reference: lowercased handle + numeric status id"""
+    handle: str
+    status_id: int
+
+    @property
+    def url(self):
+        return f"https://x.com/{self.handle}/status/{self.status_id}"
+
+
+def parse_tweet_link(text: str) -> Optional[TweetLink]:
+    """Return the first tweet link in text, normalized, or None"""
+    match = TWEET_REGEX.search(text)
+    if not match:
+        return None
+    status_id = int(match.group(2))
+    if status_id > MAX_STATUS_ID:
+        return None
+    return TweetLink(sys.intern(match.group(1).lower()), status_id)
+
+
+# ================= ENTITIES ================
+# Telegram đã tách sẵn link trong tin nhắn thành entity; xét entity trước
+# thì tin nhắn thường (không có link) không bao giờ phải chạy regex
+TWEET_HOSTS = ("x.com/", "twitter.com/")
+
+
+def entity_urls(text: str, entities) -> list:
+    """URLs of the url / text_link entities, in order"""
+    urls = []
+    encoded = None
+    for entity in entities:
+        if entity.type == "text_link":
+            urls.append(entity.url)
+        elif entity.type == "url":
+            start, end = entity.offset, entity.offset + entity.length
+            if text.isascii():
+                urls.append(text[start:end])
+                continue
+            # offset/length tính theo UTF-16 code unit
+            if encoded is None:
+                encoded = text.encode("utf-16-le")
+            urls.append(encoded[start * 2:end * 2].decode("utf-16-le"))
+    return urls
+
+
+def has_tweet_entity(text: str, entities) -> bool:
+    """Cheap prefilter: True if a url / text_link entity points to x.com or twitter.com"""
+    if not entities:
+        return False
+    for url in entity_urls(text or "", entities):
+        url = url.lower()
+        if any(host in url for host in TWEET_HOSTS):
+            return True
+    return False
+
+
+def parse_entity_tweet_link(text: str, entities) -> Optional[TweetLink]:
+    """Return the first tweet link among the message's link entities, normalized, or None"""
+    for url in entity_urls(text or "", entities):
+        tweet = parse_tweet_link(url)
+        if tweet is not None:
+            return tweet
+    return None
@@ -0,0 +1,180 @@
+import hmac
+import json
+import ipaddress
+import signal
+import asyncio
+import logging
+
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+MAX_BODY = 1 << 20  # update của Telegram nhỏ hơn nhiều
+_REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+            405: "Method Not Allowed", 413: "Payload Too Large"}
+
+
+def is_loopback(host):
+    """True if listening on host only accepts connections from this machine"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class WebhookServer:
+    """Endpoint HTTP tối giản nhận update từ Telegram.
+
+    Chạy trên asyncio streams, không cần thêm thư viện web. Mỗi POST đúng
+    path và đúng secret token được đưa thẳng vào update_queue của
+    Application; kết nối keep-alive được giữ để Telegram dùng lại.
+    """
+
+    def __init__(self, app, listen="127.0.0.1", port=8443, path="/telegram", secret_token=None):
+        self.app = app
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self._server = None
+        self.received = 0
+        self.rejected = 0
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.listen, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Webhook server listening on {self.listen}:{self.port}{self.path}")
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                keep_alive = await self._handle_request(reader, writer)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"Webhook connection error: {e}")
+        finally:
+            writer.close()
+
+    async def _handle_request(self, reader, writer):
+        """Serve one request, return whether the connection stays open"""
+        request_line = await reader.readline()
+        if not request_line:
+            return False
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            await self._respond(writer, 400, False)
+            return False
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+        # Kiểm tra path, method, secret rồi mới đọc body
+        length = headers.get("content-length") or "0"
+        body_read = False
+        if target.split("?", 1)[0] != self.path:
+            status = 404
+        elif method != "POST":
+            status = 405
+        elif self.secret_token and not hmac.compare_digest(
+            headers.get(SECRET_HEADER, "").encode(), self.secret_token.encode()
+        ):
+            status = 403
+        elif not (length.isascii() and length.isdigit()):
+            status = 400
+        elif int(length) > MAX_BODY:
+            status = 413
+        else:
+            length = int(length)
+            body = await reader.readexactly(length) if length else b""
+            body_read = True
+            status = await self._feed(body)
+
+        if status != 200:
+            self.rejected += 1
+            logger.warning(f"Webhook rejected {method} {target}: {status}")
+        # Body chưa đọc còn nằm trong kết nối: đóng thay vì giữ keep-alive
+        keep_alive = keep_alive and (body_read or length == "0")
+        await self._respond(writer, status, keep_alive)
+        return keep_alive
+
+    async def _feed(self, body):
+        try:
+            update = Update.de_json(json.loads(body), self.app.bot)
+        except Exception as e:
+            logger.warning(f"Invalid webhook payload: {e}")
+            return 400
+        if update is None:
+            return 400
+        self.received += 1
+        await self.app.update_queue.put(update)
+        return 200
+
+    @staticmethod
+    async def _respond(writer, status, keep_alive):
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+            f"Content-Length: 0\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1")
+        )
+        await writer.drain()
+
+
+async def serve_webhook(app, server, webhook_url=None, allowed_updates=None, stop_event=None):
+    """Run app with updates coming from server until SIGINT/SIGTERM or stop_event.
+
+    Mirrors the lifecycle of Application.run_polling (post_init, post_stop,
+    post_shutdown included). The webhook is registered with Telegram only when
+    webhook_url is given, so a local server can be driven by any HTTP client.
+    """
+    stop_event = stop_event or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows hoặc không phải main thread
+
+    await app.initialize()
+    try:
+        if app.post_init:
+            await app.post_init(app)
+        if webhook_url:
+            await app.bot.set_webhook(
+                url=webhook_url,
+                secret_token=server.secret_token,
+                allowed_updates=allowed_updates
+            )
+            logger.info(f"Webhook registered: {webhook_url}")
+        await server.start()
+        await app.start()
+        try:
+            await stop_event.wait()
+        finally:
+            await server.stop()
+            if app.running:
+                await app.stop()
+            if app.post_stop:
+                await app.post_stop(app)
+    finally:
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)